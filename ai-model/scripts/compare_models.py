@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Compare trained model variants (base, fine-tuned, optimized, distilled, TFLite) on the same test split
+"""
+
+import os
+import sys
+import glob
+import argparse
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from model_comparison import compare_variants, plan_jobs, predecode_split, recommend, write_comparison
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+# Default locations: train_model.py (base, finetuned), optimize_model.py (optimized) and
+# a .tflite export when one was made. Distilled students are added by default_variants.
+DEFAULT_VARIANTS = [
+    ('base', 'models/chili_disease_model.h5'),
+    ('finetuned', 'models/chili_disease_model_finetuned.h5'),
+    ('optimized', 'models/chili_disease_model_optimized.h5'),
+    ('tflite', 'models/chili_disease_model.tflite'),
+]
+STUDENT_PATTERN = 'models/students/chili_disease_student_*'
+MODEL_EXTENSIONS = ('.h5', '.keras', '.tflite')
+
+def default_variants():
+    """The DEFAULT_VARIANTS that exist plus every distilled student, named after its variant"""
+    variants = [(name, path) for name, path in DEFAULT_VARIANTS if os.path.exists(path)]
+    prefix = os.path.basename(STUDENT_PATTERN).rstrip('*')
+    for path in sorted(glob.glob(STUDENT_PATTERN)):
+        stem, extension = os.path.splitext(os.path.basename(path))
+        if extension in MODEL_EXTENSIONS:
+            variants.append((stem[len(prefix):], path))
+    return variants
+
+def parse_variants(specs):
+    """'name=path' or 'path' (named after the file) -> [(name, path)]"""
+    variants = []
+    for spec in specs:
+        name, _, path = spec.rpartition('=')
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        if any(name == existing for existing, _ in variants):
+            name = f"{name}_{len(variants)}"
+        variants.append((name, path))
+    return variants
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare model variants on one pre-decoded test split')
+    parser.add_argument('--models', nargs='+',
+                       help='Variants as name=path or path (.h5, .keras, .tflite); '
+                            'default: the standard artifacts in models/ that exist and every distilled student')
+    parser.add_argument('--test-path', default='datasetImage/test',
+                       help='Test split: image class folders or compiled shards')
+    parser.add_argument('--img-size', type=int, default=int(os.getenv('IMAGE_SIZE', 224)),
+                       help='Decode size of the shared test batch, resized per variant (default: IMAGE_SIZE)')
+    parser.add_argument('--jobs', type=int, default=0,
+                       help='Variants evaluated in parallel (default: as many as memory allows)')
+    parser.add_argument('--memory-per-job', type=int, default=1500,
+                       help='Memory budget per variant process in MB for --jobs auto (default: 1500)')
+    parser.add_argument('--batch-size', type=int, default=64,
+                       help='Batch size for the accuracy / throughput pass (default: 64)')
+    parser.add_argument('--latency-runs', type=int, default=50,
+                       help='Batch-1 inferences timed per variant (default: 50)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                       help='Recommend the fastest variant within this accuracy of the best (default: 0.01)')
+    parser.add_argument('--output', default='models/comparison',
+                       help='Output directory for the comparison table')
+
+    args = parser.parse_args()
+
+    if args.models:
+        variants = parse_variants(args.models)
+    else:
+        variants = default_variants()
+    missing = [path for _, path in variants if not os.path.exists(path)]
+    if missing:
+        print(f"Error: Model not found: {', '.join(missing)}")
+        sys.exit(1)
+    if not variants:
+        print("Error: No model artifacts found, pass them with --models")
+        sys.exit(1)
+    if not os.path.exists(args.test_path):
+        print(f"Error: Test split not found: {args.test_path}")
+        sys.exit(1)
+
+    print(f"Decoding {args.test_path} once for all variants...")
+    shard_dir = predecode_split(args.test_path, args.img_size, os.path.join(args.output, 'decoded'),
+                                 os.getenv('DECODE_RESAMPLE', 'nearest'))
+
+    jobs = plan_jobs(args.jobs, len(variants), args.memory_per_job)
+    print(f"\nComparing {len(variants)} variants, {jobs} at a time")
+    results = compare_variants(variants, shard_dir, jobs=jobs, batch_size=args.batch_size,
+                               latency_runs=args.latency_runs)
+
+    selected = recommend(results, args.max_accuracy_drop)
+    table = write_comparison(results, args.output, selected)
+    print("\n" + table)
+    print(f"\nResults: {os.path.join(args.output, 'comparison.md')} (.csv, .json)")
+    if selected:
+        if selected['backend'] == 'keras':
+            print(f"Recommended: {selected['variant']} -> MODEL_PATH={selected['path']}")
+        else:
+            print(f"Recommended: {selected['variant']} ({selected['path']}, needs a TFLite runtime to serve)")
+        print(f"  fastest variant within {args.max_accuracy_drop:.1%} of the best accuracy")
+
+if __name__ == "__main__":
+    main()
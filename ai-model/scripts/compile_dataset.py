@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Compile datasetImage splits into preprocessed, memory-mappable shards
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from dataset_shards import compile_split
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile dataset splits into uint8 .npy shards')
+    parser.add_argument('--data-root', default='datasetImage',
+                       help='Directory containing the split folders')
+    parser.add_argument('--output', default='datasetShards',
+                       help='Output directory for the compiled splits')
+    parser.add_argument('--splits', nargs='+', default=['train', 'val', 'test'],
+                       help='Splits to compile')
+    parser.add_argument('--img-size', type=int, default=int(os.getenv('IMAGE_SIZE', 224)),
+                       help='Target image size (default: IMAGE_SIZE)')
+    parser.add_argument('--resample', default=os.getenv('DECODE_RESAMPLE', 'nearest'),
+                       choices=['nearest', 'bilinear', 'bicubic', 'box', 'lanczos'],
+                       help='Resize filter, keep it equal to serving (default: DECODE_RESAMPLE)')
+    parser.add_argument('--shard-size', type=int, default=1024,
+                       help='Images per shard file')
+    parser.add_argument('--rebuild', action='store_true',
+                       help='Recompile from scratch instead of adding new images only')
+
+    args = parser.parse_args()
+
+    for split in args.splits:
+        split_dir = os.path.join(args.data_root, split)
+        if not os.path.exists(split_dir):
+            print(f"Skipping {split}: {split_dir} not found")
+            continue
+
+        start_time = time.time()
+        stats = compile_split(
+            split_dir,
+            os.path.join(args.output, split),
+            args.img_size,
+            shard_size=args.shard_size,
+            rebuild=args.rebuild,
+            resample=args.resample
+        )
+        print(f"  {split}: {stats['images']} images in {stats['shards']} shards "
+              f"(+{stats['added']} / -{stats['removed']}) in {time.time() - start_time:.1f}s")
+
+    print(f"\nShards written to: {args.output}")
+    print(f"Train with: python scripts/train_model.py --train-path {args.output}/train "
+          f"--val-path {args.output}/val")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Distill the trained Chili Disease model into compact students for edge devices
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from model import ChiliDiseaseModel
+from distillation import (STUDENT_VARIANTS, distill_student, evaluate_accuracy, measure_latency,
+                          pareto_front, select_student, student_filename, write_report)
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+def describe(variant, model, path, accuracy, extra=None):
+    """Result row: accuracy, measured latency and size of a saved model"""
+    latency_p50, latency_p95 = measure_latency(model)
+    result = {
+        'variant': variant,
+        'img_size': int(model.input_shape[1]),
+        'accuracy': float(accuracy),
+        'latency_p50_ms': latency_p50,
+        'latency_p95_ms': latency_p95,
+        'size_mb': os.path.getsize(path) / (1024 * 1024),
+        'params': int(model.count_params()),
+        'path': path,
+    }
+    result.update(extra or {})
+    print(f"  {variant}: accuracy {accuracy:.4f}, {latency_p50:.1f} ms p50, {result['size_mb']:.2f} MB")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill ChiliDiseaseModel into smaller student models')
+    parser.add_argument('--teacher', default=os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'),
+                       help='Trained teacher model (default: MODEL_PATH)')
+    parser.add_argument('--students', nargs='+', default=list(STUDENT_VARIANTS),
+                       choices=list(STUDENT_VARIANTS), help='Student variants to train (default: all)')
+    parser.add_argument('--train-path', default='datasetImage/train',
+                       help='Path to training data (image folders or compiled shards)')
+    parser.add_argument('--val-path', default='datasetImage/val',
+                       help='Path to validation data')
+    parser.add_argument('--epochs', type=int, default=30,
+                       help='Distillation epochs per student (default: 30)')
+    parser.add_argument('--temperature', type=float, default=4.0,
+                       help='Softmax temperature of the soft targets (default: 4.0)')
+    parser.add_argument('--alpha', type=float, default=0.1,
+                       help='Weight of the hard-label loss, 1 - alpha for soft targets (default: 0.1)')
+    parser.add_argument('--learning-rate', type=float, default=0.0005,
+                       help='Student learning rate (default: 0.0005)')
+    parser.add_argument('--student-weights', default='imagenet',
+                       help="Backbone initialization: 'imagenet' or 'none'")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.02,
+                       help='Select the fastest student within this accuracy of the teacher (default: 0.02)')
+    parser.add_argument('--output', default='models/students',
+                       help='Output directory for students and the Pareto report')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.teacher):
+        print(f"Error: Teacher model not found: {args.teacher}")
+        sys.exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    weights = None if args.student_weights.lower() == 'none' else args.student_weights
+
+    teacher_model = ChiliDiseaseModel()
+    teacher = teacher_model.load_model(args.teacher)
+    print(f"Teacher: {args.teacher} ({teacher_model.img_size}px, {teacher.count_params():,} params)")
+
+    # One pipeline at the teacher's input size feeds teacher and student
+    train_ds, train_count = teacher_model.build_split_dataset(args.train_path, training=True)
+    val_ds, val_count = teacher_model.build_split_dataset(args.val_path, training=False)
+    print(f"Found {train_count} training images, {val_count} validation images")
+
+    print("\nMeasuring teacher...")
+    teacher_accuracy = evaluate_accuracy(teacher, val_ds)
+    results = [describe('teacher', teacher, args.teacher, teacher_accuracy)]
+
+    for variant in args.students:
+        print(f"\nDistilling {variant}...")
+        start_time = time.time()
+        student, history = distill_student(
+            teacher, variant, train_ds, val_ds, teacher_model.num_classes,
+            epochs=args.epochs,
+            learning_rate=args.learning_rate,
+            temperature=args.temperature,
+            alpha=args.alpha,
+            dropout_rate=teacher_model.dropout_rate,
+            weights=weights
+        )
+        student_path = os.path.join(args.output, student_filename(variant))
+        student.save(student_path)
+        results.append(describe(variant, student, student_path, evaluate_accuracy(student, val_ds), {
+            'epochs': len(history.history['loss']),
+            'train_seconds': round(time.time() - start_time, 1),
+        }))
+
+    pareto_front(results)
+    selected = select_student(results, teacher_accuracy, args.max_accuracy_drop)
+    if selected:
+        # Stable path for MODEL_PATH on the edge gateways
+        extension = os.path.splitext(selected['path'])[1]
+        selected_path = os.path.join(args.output, f"chili_disease_student{extension}")
+        shutil.copyfile(selected['path'], selected_path)
+
+    report = write_report(results, args.output, selected)
+    print("\n" + report)
+    print(f"\nReport: {os.path.join(args.output, 'pareto.md')}, {os.path.join(args.output, 'pareto.png')}")
+    if selected:
+        print(f"Selected student: {selected['variant']} -> {selected_path}")
+        print(f"Use it with MODEL_PATH={selected_path}")
+    else:
+        print(f"No student within {args.max_accuracy_drop:.2%} of the teacher accuracy "
+              f"({teacher_accuracy:.4f}); pick one from the report")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Open-loop load test of the Chili Disease Detection API prediction endpoints
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import requests
+from load_testing import ENDPOINTS, EndpointClient, load_corpus, run_stage, saturation_point, write_results
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+def wait_for_server(url, timeout=180, server=None):
+    """Poll /health until the server answers, gives up early when the server process exits"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            return False
+        try:
+            if requests.get(url + '/health', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+def start_local_server(port, log_path, model_path=None):
+    """Run scripts/start_api.py on localhost as a child process, its output going to log_path
+
+    api_server loads MODEL_PATH when it is imported, before start_api.py
+    parses its arguments, so the model is passed through the environment.
+    """
+    command = [sys.executable, os.path.join(SCRIPT_DIR, 'start_api.py'), '--host', '127.0.0.1', '--port', str(port)]
+    env = dict(os.environ)
+    if model_path:
+        env['MODEL_PATH'] = model_path
+    print(f"Starting local API server on port {port} (log: {log_path})...")
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /predict, /predict/esp32 and /batch/predict')
+    parser.add_argument('--url', default=None,
+                       help='API base URL (default: http://localhost:API_PORT)')
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS),
+                       help='Endpoints to drive (default: all)')
+    parser.add_argument('--rates', nargs='+', type=float, default=[1, 2, 4, 8, 16],
+                       help='Offered request rates in requests/sec, one stage each (default: 1 2 4 8 16)')
+    parser.add_argument('--duration', type=float, default=30,
+                       help='Seconds per rate stage (default: 30)')
+    parser.add_argument('--warmup', type=float, default=5,
+                       help='Unmeasured seconds at the lowest rate before each endpoint (default: 5)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                       help='Maximum requests in flight (default: 8)')
+    parser.add_argument('--arrival', default='poisson', choices=['poisson', 'constant'],
+                       help='Arrival process (default: poisson)')
+    parser.add_argument('--images', default='datasetImage/test',
+                       help='Image corpus directory, searched recursively (default: datasetImage/test)')
+    parser.add_argument('--corpus-size', type=int, default=200,
+                       help='Images loaded into memory from the corpus (default: 200)')
+    parser.add_argument('--batch-images', type=int, default=4,
+                       help='Images per /batch/predict request (default: 4)')
+    parser.add_argument('--slo-ms', type=float, default=1000,
+                       help='p99 latency above which a stage counts as saturated (default: 1000)')
+    parser.add_argument('--start-server', action='store_true',
+                       help='Start a local API server (scripts/start_api.py) for the test')
+    parser.add_argument('--model-path', help='MODEL_PATH for --start-server')
+    parser.add_argument('--output', default=None,
+                       help='Output directory (default: loadtests/<timestamp>)')
+
+    args = parser.parse_args()
+
+    port = int(os.getenv('API_PORT', 5000))
+    url = (args.url or f"http://localhost:{port}").rstrip('/')
+    output_dir = args.output or os.path.join('loadtests', datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    corpus = []
+    if any(endpoint != 'predict_esp32' for endpoint in args.endpoints):
+        if not os.path.exists(args.images):
+            print(f"Error: Image corpus not found: {args.images}")
+            sys.exit(1)
+        corpus = load_corpus(args.images, args.corpus_size)
+        print(f"Loaded {len(corpus)} images from {args.images}")
+
+    server = None
+    if args.start_server:
+        if args.model_path and not os.path.exists(args.model_path):
+            print(f"Error: Model not found: {args.model_path}")
+            sys.exit(1)
+        os.makedirs(output_dir, exist_ok=True)
+        server_log = os.path.join(output_dir, 'server.log')
+        server = start_local_server(urlparse(url).port or 80, server_log, args.model_path)
+    try:
+        if not wait_for_server(url, timeout=180 if server else 5, server=server):
+            if server is not None:
+                print(f"Error: Local API server did not come up, see {server_log}")
+            else:
+                print(f"Error: API server not reachable at {url} (use --start-server to launch one)")
+            sys.exit(1)
+
+        results = {
+            'url': url,
+            'started': datetime.now().isoformat(),
+            'settings': {key: getattr(args, key) for key in ('rates', 'duration', 'concurrency', 'arrival',
+                                                             'images', 'batch_images', 'slo_ms')},
+            'endpoints': {},
+        }
+        for endpoint in args.endpoints:
+            client = EndpointClient(url, endpoint, corpus, args.batch_images)
+            print(f"\n{client.path}")
+            if args.warmup > 0:
+                run_stage(client, min(args.rates), args.warmup, args.concurrency, args.arrival)
+
+            stages = []
+            for rate in sorted(args.rates):
+                stage = run_stage(client, rate, args.duration, args.concurrency, args.arrival)
+                stages.append(stage)
+                p50 = f"{stage['latency_p50_ms']:.0f}" if stage['latency_p50_ms'] is not None else '-'
+                p99 = f"{stage['latency_p99_ms']:.0f}" if stage['latency_p99_ms'] is not None else '-'
+                print(f"  {rate:6.1f} req/s offered: {stage['throughput_rps']:6.1f} req/s done, "
+                      f"p50 {p50} ms, p99 {p99} ms, errors {stage['error_rate']:.1%}")
+
+            saturation = saturation_point(stages, args.slo_ms)
+            results['endpoints'][client.path] = {'stages': stages, 'saturation': saturation}
+            if saturation['saturated_at_rps'] is not None:
+                print(f"  Saturates at {saturation['saturated_at_rps']} req/s, "
+                      f"sustains {saturation['max_sustained_rps']} req/s")
+            else:
+                print(f"  Not saturated up to {max(args.rates)} req/s")
+
+        write_results(results, output_dir)
+        print(f"\nResults: {output_dir}/results.json, stages.csv, curve.png")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Prune and/or cluster the trained Chili Disease model into a compressed artifact
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from model import ChiliDiseaseModel
+from distillation import evaluate_accuracy, measure_latency
+from model_optimization import gzip_model, gzip_size, kernel_stats, optimizable_layers, optimize_model
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+def describe(name, model, path, test_ds):
+    """Accuracy on the test split, batch-1 latency and raw/gzipped size of a saved model"""
+    accuracy = evaluate_accuracy(model, test_ds)
+    latency_p50, latency_p95 = measure_latency(model)
+    result = {
+        'model': name,
+        'path': path,
+        'accuracy': float(accuracy),
+        'latency_p50_ms': latency_p50,
+        'latency_p95_ms': latency_p95,
+        'size_mb': os.path.getsize(path) / (1024 * 1024),
+        'gzip_size_mb': gzip_size(path) / (1024 * 1024),
+    }
+    result.update(kernel_stats(optimizable_layers(model)))
+    return result
+
+def write_report(original, optimized, settings, output_path):
+    """Write <output>_report.json and _report.md with the deltas against the original"""
+    deltas = {
+        'accuracy': optimized['accuracy'] - original['accuracy'],
+        'latency_p50_ms': optimized['latency_p50_ms'] - original['latency_p50_ms'],
+        'gzip_size_mb': optimized['gzip_size_mb'] - original['gzip_size_mb'],
+        'compression_ratio': original['gzip_size_mb'] / max(optimized['gzip_size_mb'], 1e-9),
+    }
+    base = os.path.splitext(output_path)[0]
+    with open(base + '_report.json', 'w') as f:
+        json.dump({'settings': settings, 'original': original, 'optimized': optimized, 'deltas': deltas},
+                  f, indent=2)
+
+    lines = [
+        '| Model | Accuracy | Latency p50 (ms) | Latency p95 (ms) | Size (MB) | Gzipped (MB) | Sparsity | Max unique weights |',
+        '|---|---|---|---|---|---|---|---|',
+    ]
+    for r in (original, optimized):
+        lines.append(f"| {r['model']} | {r['accuracy']:.4f} | {r['latency_p50_ms']:.1f} | {r['latency_p95_ms']:.1f} | "
+                     f"{r['size_mb']:.2f} | {r['gzip_size_mb']:.2f} | {r['sparsity']:.1%} | {r['max_unique_values']:,} |")
+    lines.append(f"| delta | {deltas['accuracy']:+.4f} | {deltas['latency_p50_ms']:+.1f} | | | "
+                 f"{deltas['gzip_size_mb']:+.2f} ({deltas['compression_ratio']:.1f}x smaller) | | |")
+    trained = ('all layers except BatchNormalization (backbone retrained)' if settings['train_all']
+               else 'the pruned / clustered layers only')
+    lines.append(f"\nFine-tuned: {trained}. Both sizes are without optimizer state.")
+    with open(base + '_report.md', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Prune / cluster ChiliDiseaseModel for smaller downloads')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'),
+                       help='Trained model to optimize (default: MODEL_PATH)')
+    parser.add_argument('--method', default='prune_cluster', choices=['prune', 'cluster', 'prune_cluster'],
+                       help='Magnitude pruning, weight clustering or both (default: prune_cluster)')
+    parser.add_argument('--sparsity', type=float, default=0.5,
+                       help='Final fraction of pruned kernel weights (default: 0.5)')
+    parser.add_argument('--clusters', type=int, default=16,
+                       help='Distinct weight values per kernel when clustering (default: 16)')
+    parser.add_argument('--epochs', type=int, default=2,
+                       help='Fine-tuning epochs per stage (default: 2)')
+    parser.add_argument('--learning-rate', type=float, default=0.00001,
+                       help='Fine-tuning learning rate (default: 0.00001)')
+    parser.add_argument('--train-all', action='store_true',
+                       help='Fine-tune every layer except BatchNormalization, not only the optimized ones')
+    parser.add_argument('--train-path', default='datasetImage/train',
+                       help='Path to training data (image folders or compiled shards)')
+    parser.add_argument('--test-path', default='datasetImage/test',
+                       help='Path to test data for the before/after comparison')
+    parser.add_argument('--output', default='models/chili_disease_model_optimized.h5',
+                       help='Output path of the optimized model')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Error: Model not found: {args.model}")
+        sys.exit(1)
+    if not 0 <= args.sparsity < 1:
+        print("Error: --sparsity must be in [0, 1)")
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+
+    chili_model = ChiliDiseaseModel()
+    model = chili_model.load_model(args.model)
+    # Repeated like in training, with the epoch length counted from the split (shards have no cardinality)
+    train_ds, train_count = chili_model.build_split_dataset(args.train_path, training=True, repeat=True)
+    test_ds, test_count = chili_model.build_split_dataset(args.test_path, training=False)
+    print(f"Found {train_count} training images, {test_count} test images")
+    steps_per_epoch = math.ceil(train_count / chili_model.batch_size)
+    if steps_per_epoch <= 0:
+        print(f"Error: No training images in {args.train_path}")
+        sys.exit(1)
+
+    print("\nMeasuring original model...")
+    # Sized like the optimized model, without the optimizer state a training checkpoint still holds
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stripped_path = os.path.join(tmp_dir, os.path.basename(args.model))
+        model.save(stripped_path, include_optimizer=False)
+        original = describe('original', model, stripped_path, test_ds)
+    original['path'] = args.model
+
+    optimize_model(
+        model, train_ds,
+        method=args.method,
+        sparsity=args.sparsity,
+        num_clusters=args.clusters,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        steps_per_epoch=steps_per_epoch,
+        train_all=args.train_all
+    )
+
+    # Plain Keras layers, nothing to strip: save without the optimizer state
+    model.save(args.output, include_optimizer=False)
+    gz_path, _ = gzip_model(args.output)
+
+    print("\nMeasuring optimized model...")
+    optimized = describe(args.method, model, args.output, test_ds)
+
+    settings = {key: getattr(args, key) for key in ('model', 'method', 'sparsity', 'clusters', 'epochs',
+                                                     'learning_rate', 'train_all', 'train_path', 'test_path')}
+    report = write_report(original, optimized, settings, args.output)
+    print("\n" + report)
+    print(f"\nOptimized model: {args.output} (ship {gz_path} over slow links)")
+    print(f"Report: {os.path.splitext(args.output)[0]}_report.md")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Performance regression gate: benchmark inference and cold start, compare against a stored baseline
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from benchmarks import (METRICS, collect_run, compare_runs, hardware_profile, load_baseline,
+                        run_trial, save_baseline)
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+DEFAULT_BASELINE_DIR = os.path.join(PROJECT_ROOT, 'ai-model', 'benchmarks', 'baselines')
+
+def find_image(test_path):
+    """First test image, or a synthetic one when there is no test split"""
+    if os.path.isdir(test_path):
+        for root, _, names in sorted(os.walk(test_path)):
+            for name in sorted(names):
+                if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    return os.path.join(root, name)
+    import numpy as np
+    from PIL import Image
+    path = os.path.join(tempfile.gettempdir(), 'chili_perf_gate.jpg')
+    pixels = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+def run_trials(args, image_path):
+    """Run each trial in a fresh process so cold start and peak RSS are measured per process"""
+    trials = []
+    for index in range(args.warmup_trials + args.trials):
+        command = [sys.executable, os.path.abspath(__file__), 'trial', '--model', args.model,
+                   '--image', image_path, '--spawn-time', repr(time.time())]
+        output = subprocess.run(command, capture_output=True, text=True)
+        result = None
+        for line in reversed(output.stdout.splitlines()):
+            if line.startswith('{'):
+                result = json.loads(line)
+                break
+        if output.returncode != 0 or result is None:
+            print(output.stdout[-2000:] + output.stderr[-2000:])
+            raise RuntimeError(f"Benchmark trial {index + 1} failed (exit code {output.returncode})")
+
+        if index < args.warmup_trials:
+            print(f"  warmup trial: cold start {result['cold_start_s']:.2f}s (discarded)")
+            continue
+        trials.append(result)
+        print(f"  trial {len(trials)}/{args.trials}: cold start {result['cold_start_s']:.2f}s, "
+              f"p50 {result['latency_p50_ms']:.1f} ms, {result['throughput_ips']:.1f} images/sec, "
+              f"RSS {result['peak_rss_mb']:.0f} MB")
+    return trials
+
+def parse_thresholds(specs):
+    thresholds = {}
+    for spec in specs or []:
+        metric, _, value = spec.partition('=')
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {sorted(METRICS)}")
+        thresholds[metric] = float(value)
+    return thresholds
+
+def print_comparison(comparison):
+    print(f"\n{'metric':<18} {'baseline':>10} {'current':>10} {'change':>8}  {'95% CI':<17} verdict")
+    for metric, result in comparison.items():
+        low, high = result['change_ci95']
+        print(f"{metric:<18} {result['baseline_mean']:>10.2f} {result['candidate_mean']:>10.2f} "
+              f"{result['change']:>+8.1%}  [{low:+.1%}, {high:+.1%}]  {result['verdict']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark inference and startup and gate on regressions')
+    parser.add_argument('command', choices=['record', 'check', 'trial'],
+                       help='record: store a baseline, check: compare against it (exit 1 on regression)')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'),
+                       help='Model to benchmark (default: MODEL_PATH)')
+    parser.add_argument('--test-path', default='datasetImage/test',
+                       help='Directory with a test image for the end-to-end predict benchmark')
+    parser.add_argument('--image', help='Image for the predict benchmark (default: first image of --test-path)')
+    parser.add_argument('--trials', type=int, default=5,
+                       help='Measured trials, each in a fresh process (default: 5)')
+    parser.add_argument('--warmup-trials', type=int, default=1,
+                       help='Discarded trials that warm the OS file cache (default: 1)')
+    parser.add_argument('--profile', default=None,
+                       help='Hardware profile name (default: detected from CPU, cores and RAM)')
+    parser.add_argument('--baseline-dir', default=DEFAULT_BASELINE_DIR,
+                       help='Directory of baseline JSON files, one per hardware profile')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                       help='Relative slowdown that counts as a regression (default: 0.10)')
+    parser.add_argument('--thresholds', nargs='*',
+                       help='Per-metric thresholds, e.g. latency_p95_ms=0.2 cold_start_s=0.25')
+    parser.add_argument('--require-baseline', action='store_true',
+                       help='Fail check when there is no baseline for this hardware profile')
+    parser.add_argument('--output', help='Also write the run and comparison to this JSON file')
+    parser.add_argument('--spawn-time', type=float, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.command == 'trial':
+        print(json.dumps(run_trial(args.model, args.image, args.spawn_time)))
+        return
+
+    if not os.path.exists(args.model):
+        print(f"Error: Model not found: {args.model}")
+        sys.exit(1)
+
+    profile = args.profile or hardware_profile()
+    thresholds = parse_thresholds(args.thresholds)
+    image_path = args.image or find_image(args.test_path)
+
+    print(f"Hardware profile: {profile}")
+    print(f"Benchmarking {args.model} ({args.trials} trials)...")
+    try:
+        trials = run_trials(args, image_path)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    run = collect_run(trials, {
+        'profile': profile,
+        'model': args.model,
+        'model_size_mb': os.path.getsize(args.model) / (1024 * 1024),
+        'recorded': datetime.now().isoformat(),
+    })
+
+    if args.command == 'record':
+        path = save_baseline(run, args.baseline_dir, profile)
+        print(f"\nBaseline for {profile} written to {path}")
+        for metric, summary in run['summary'].items():
+            low, high = summary['ci95']
+            print(f"  {metric:<18} {summary['mean']:10.2f}  (95% CI {low:.2f} - {high:.2f}, sd {summary['std']:.2f})")
+        return
+
+    baseline = load_baseline(args.baseline_dir, profile)
+    if baseline is None:
+        print(f"\nNo baseline for hardware profile {profile} in {args.baseline_dir}")
+        print(f"Record one with: python {os.path.relpath(__file__)} record --profile {profile}")
+        sys.exit(1 if args.require_baseline else 0)
+
+    comparison = compare_runs(baseline, run, thresholds, args.threshold)
+    print(f"\nBaseline recorded {baseline.get('recorded')} with {baseline.get('model')}")
+    print_comparison(comparison)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'run': run, 'baseline': baseline.get('recorded'), 'comparison': comparison}, f, indent=2)
+
+    regressions = [metric for metric, result in comparison.items() if result['verdict'] == 'regression']
+    if regressions:
+        print(f"\nPERFORMANCE REGRESSION: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo performance regression")
+
+if __name__ == "__main__":
+    main()
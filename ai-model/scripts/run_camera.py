@@ -5,6 +5,7 @@ Real-time Camera Detection for Chili Disease
 
 import os
 import sys
+import signal
 import argparse
 
 # Add the ai-model src directory to the path
@@ -12,14 +13,40 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from camera_manager import CameraManager
 
+def _install_signal_handlers(camera, output_video=None):
+    """Control headless detection with signals
+    
+    SIGINT/SIGTERM stop detection, SIGUSR1 toggles overlay video recording.
+    """
+    def handle_stop(signum, frame):
+        print(f"\nReceived signal {signum}, stopping detection...")
+        camera.is_running = False
+    
+    def handle_toggle_recording(signum, frame):
+        recording = camera.toggle_overlay_recording(output_video)
+        print(f"Overlay recording {'started' if recording else 'stopped'}")
+    
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, handle_toggle_recording)
+
 def main():
     parser = argparse.ArgumentParser(description='Chili Disease Real-time Detection')
-    parser.add_argument('--mode', choices=['realtime', 'capture'], default='realtime',
-                       help='Detection mode: realtime or capture')
+    parser.add_argument('--mode', choices=['realtime', 'headless', 'capture'], default='realtime',
+                       help='Detection mode: realtime, headless (no GUI) or capture')
     parser.add_argument('--camera-index', type=int, default=0,
                        help='Camera index (default: 0)')
     parser.add_argument('--model-path', 
                        help='Path to trained model')
+    parser.add_argument('--log-path',
+                       help='Headless mode: JSONL detection log (default: captures/detections.jsonl)')
+    parser.add_argument('--output-video',
+                       help='Headless mode: record the prediction overlay to this video file')
+    parser.add_argument('--interval', type=float, default=2.0,
+                       help='Headless mode: seconds between predictions (default: 2.0)')
+    parser.add_argument('--countdown', type=int, default=3,
+                       help='Capture mode: countdown seconds before capture (default: 3, 0 to disable)')
     
     args = parser.parse_args()
     
@@ -35,9 +62,17 @@ def main():
         if args.mode == 'realtime':
             print("Starting real-time detection...")
             camera.start_realtime_detection()
+        elif args.mode == 'headless':
+            print("Starting headless detection...")
+            _install_signal_handlers(camera, args.output_video)
+            camera.start_headless_detection(
+                log_path=args.log_path,
+                output_video=args.output_video,
+                prediction_interval=args.interval
+            )
         elif args.mode == 'capture':
             print("Capture and analyze mode...")
-            result = camera.capture_and_analyze()
+            result = camera.capture_and_analyze(countdown=args.countdown)
             if result:
                 print(f"Analysis completed. Results saved to: {result['image_path']}")
             else:
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter sweep for the Chili Disease Detection Model
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from sweep import SweepRunner, SWEEP_FLAGS, generate_trials
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+# Used when no --space file is given
+DEFAULT_SPACE = {
+    'learning_rate': {'log_uniform': [0.00003, 0.001]},
+    'batch_size': [16, 32],
+    'dropout': {'uniform': [0.1, 0.5]},
+    'fine_tune_at': [80, 100, 120],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a hyperparameter sweep of train_model.py')
+    parser.add_argument('--space',
+                       help=f"JSON search space over {', '.join(SWEEP_FLAGS)} (default: built-in)")
+    parser.add_argument('--method', choices=['grid', 'random'], default='random',
+                       help='Grid over listed values or random sampling (default: random)')
+    parser.add_argument('--trials', type=int, default=24,
+                       help='Number of random trials (default: 24)')
+    parser.add_argument('--concurrency', type=int, default=2,
+                       help='Trials running at once, CPU cores are split between them (default: 2)')
+    parser.add_argument('--epochs', type=int, default=15,
+                       help='Training epochs per trial (default: 15)')
+    parser.add_argument('--fine-tune', action='store_true',
+                       help='Fine-tune after training (needed for fine_tune_at to matter)')
+    parser.add_argument('--fine-tune-epochs', type=int, default=5,
+                       help='Fine-tuning epochs per trial (default: 5)')
+    parser.add_argument('--train-path', default='datasetImage/train',
+                       help='Path to training data directory')
+    parser.add_argument('--val-path', default='datasetImage/val',
+                       help='Path to validation data directory')
+    parser.add_argument('--tf-data', action='store_true',
+                       help='Use the tf.data input pipeline in every trial')
+    parser.add_argument('--prune-warmup', type=int, default=3,
+                       help='Epochs before a trial can be pruned (default: 3)')
+    parser.add_argument('--output', default=os.path.join('sweeps', datetime.now().strftime('%Y%m%d_%H%M%S')),
+                       help='Sweep output directory')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random sampling seed')
+
+    args = parser.parse_args()
+
+    params = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as f:
+            params = json.load(f)
+
+    trial_params = generate_trials(params, args.method, args.trials, args.seed)
+
+    # Trials run in their own directory, so data paths must be absolute
+    train_args = [
+        '--train-path', os.path.abspath(args.train_path),
+        '--val-path', os.path.abspath(args.val_path),
+        '--epochs', str(args.epochs),
+    ]
+    if args.fine_tune:
+        train_args += ['--fine-tune', '--fine-tune-epochs', str(args.fine_tune_epochs)]
+    if args.tf_data:
+        train_args.append('--tf-data')
+
+    runner = SweepRunner(
+        os.path.join(SCRIPT_DIR, 'train_model.py'),
+        args.output,
+        train_args,
+        concurrency=args.concurrency,
+        prune_warmup=args.prune_warmup
+    )
+
+    with open(os.path.join(args.output, 'sweep.json'), 'w') as f:
+        json.dump({'method': args.method, 'space': params, 'train_args': train_args}, f, indent=2)
+
+    print(f"Sweep: {len(trial_params)} trials, {runner.concurrency} at a time, "
+          f"{len(runner.core_slots[0])} cores each")
+    print(f"Output: {args.output}")
+
+    results = runner.run(trial_params)
+
+    print("\n" + "=" * 90)
+    print(f"{'Trial':<6} {'Status':<8} {'LR':<10} {'Batch':<6} {'Dropout':<8} {'FT at':<6} "
+          f"{'Val acc':<8} {'Epochs':<7} {'Time':<8} {'Size MB':<8}")
+    print("-" * 90)
+    for trial in results:
+        p = trial['params']
+        accuracy = f"{trial['best_metric']:.4f}" if trial['best_metric'] is not None else '-'
+        size = f"{trial['model_size_mb']:.2f}" if trial['model_size_mb'] else '-'
+        print(f"{trial['id']:<6} {trial['status']:<8} {str(p.get('learning_rate', '-'))[:9]:<10} "
+              f"{str(p.get('batch_size', '-')):<6} {str(p.get('dropout', '-')):<8} "
+              f"{str(p.get('fine_tune_at', '-')):<6} {accuracy:<8} {trial['epochs']:<7} "
+              f"{trial['wall_time']:<8.0f} {size:<8}")
+    print("=" * 90)
+    print(f"Results table: {runner.write_results()}")
+
+if __name__ == "__main__":
+    main()
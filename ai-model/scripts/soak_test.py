@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Soak test: drive many predictions through the model, the API and the camera pipeline and watch memory
+"""
+
+import os
+import io
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+
+# Add the ai-model src directory to the path (robust to script location)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+SRC_PATH = os.path.join(PROJECT_ROOT, 'ai-model', 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from soak_testing import (FakeVideoSource, MemorySampler, leak_verdict, soak, soak_camera,
+                          summarize_target, write_report)
+from dotenv import load_dotenv
+
+# Load .env from ai-model/.env (robust)
+dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
+load_dotenv(dotenv_path)
+
+TARGETS = ('model', 'api', 'camera')
+
+def find_images(path, limit=50):
+    """Up to `limit` images from `path`, or synthetic JPEGs when there are none"""
+    images = []
+    if os.path.isdir(path):
+        for root, _, names in sorted(os.walk(path)):
+            images.extend(os.path.join(root, name) for name in sorted(names)
+                          if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+    if images:
+        return images[:limit]
+
+    import numpy as np
+    from PIL import Image
+    directory = tempfile.mkdtemp(prefix='chili_soak_')
+    rng = np.random.default_rng(0)
+    for i in range(8):
+        image_path = os.path.join(directory, f"synthetic_{i}.jpg")
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(image_path)
+        images.append(image_path)
+    return images
+
+def print_progress(record):
+    print(f"  {record['iterations']:>7} iterations, {record['elapsed_s']:8.1f}s: RSS {record['rss_mb']:8.1f} MB, "
+          f"traced {record['traced_mb']:7.2f} MB, objects {record['gc_objects']}, fds {record['open_fds']}, "
+          f"temp files {record['temp_files']}", flush=True)
+
+def run_model(args, images):
+    """ChiliDiseaseModel.predict on image files, as the API and camera call it"""
+    from model import ChiliDiseaseModel
+    chili_model = ChiliDiseaseModel()
+    chili_model.load_model(args.model)
+    sampler = MemorySampler(traceback_frames=args.traceback_frames)
+    sampler.start()
+    soak(lambda i: chili_model.predict(images[i % len(images)]), args.iterations, sampler,
+         args.warmup, args.sample_every, print_progress)
+    return sampler
+
+def run_api(args, images):
+    """POST /predict through the Flask test client, in process so tracemalloc sees the server"""
+    import api_server
+    client = api_server.app.test_client()
+    corpus = []
+    for image_path in images:
+        with open(image_path, 'rb') as f:
+            corpus.append((os.path.basename(image_path), f.read()))
+
+    def step(i):
+        name, data = corpus[i % len(corpus)]
+        response = client.post('/predict', data={'image': (io.BytesIO(data), f"{i}_{name}")},
+                               content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned HTTP {response.status_code}: {response.get_data(as_text=True)}")
+
+    sampler = MemorySampler(temp_dirs=[api_server.UPLOAD_FOLDER], traceback_frames=args.traceback_frames)
+    sampler.start()
+    soak(step, args.iterations, sampler, args.warmup, args.sample_every, print_progress)
+    return sampler
+
+def run_camera(args, images):
+    """Headless detection loop on a fake video source, every frame predicted once the last one is done"""
+    from camera_manager import CameraManager
+
+    class SoakCameraManager(CameraManager):
+        def __init__(self):
+            super().__init__()
+            self.camera_process = None
+            self.predictions = 0
+
+        def initialize_camera(self):
+            self.cap = FakeVideoSource.from_images(images, self.frame_width, self.frame_height, args.fps)
+            return True
+
+        def predict_frame(self, frame, timing=None):
+            result = super().predict_frame(frame, timing)
+            self.predictions += 1
+            return result
+
+    manager = SoakCameraManager()
+    manager.low_latency = False
+    manager.detection_log_path = os.path.join(tempfile.mkdtemp(prefix='chili_soak_'), 'detections.jsonl')
+    sampler = MemorySampler(traceback_frames=args.traceback_frames)
+    sampler.start()
+    soak_camera(manager, args.iterations, sampler, args.warmup, args.sample_every, print_progress)
+    return sampler
+
+def run_target(args):
+    """Child process: soak one target and write its result JSON"""
+    os.environ['MODEL_PATH'] = args.model
+    images = find_images(args.images)
+    print(f"\n{args.target}: {args.iterations} iterations after {args.warmup} warmup, "
+          f"{len(images)} images", flush=True)
+    sampler = {'model': run_model, 'api': run_api, 'camera': run_camera}[args.target](args, images)
+    result = summarize_target(args.target, sampler, top=args.top)
+    sampler.stop()
+    with open(args.result, 'w') as f:
+        json.dump(result, f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-run memory profiling and leak detection')
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), choices=list(TARGETS),
+                       help='Pipelines to soak, each in its own process (default: all)')
+    parser.add_argument('--iterations', type=int, default=20000,
+                       help='Measured predictions per target (default: 20000)')
+    parser.add_argument('--warmup', type=int, default=200,
+                       help='Unmeasured predictions before the baseline snapshot (default: 200)')
+    parser.add_argument('--sample-every', type=int, default=500,
+                       help='Predictions between memory samples (default: 500)')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'),
+                       help='Model to load (default: MODEL_PATH)')
+    parser.add_argument('--images', default='datasetImage/test',
+                       help='Images to predict, searched recursively (default: datasetImage/test, synthetic if missing)')
+    parser.add_argument('--fps', type=float, default=30,
+                       help='Frame rate of the fake video source for the camera target (default: 30)')
+    parser.add_argument('--traceback-frames', type=int, default=10,
+                       help='Stack frames kept per traced allocation (default: 10)')
+    parser.add_argument('--top', type=int, default=15,
+                       help='Allocation sites to report per target (default: 15)')
+    parser.add_argument('--max-rss-growth', type=float, default=50,
+                       help='RSS growth in MB per 100k predictions that counts as a leak (default: 50)')
+    parser.add_argument('--max-traced-growth', type=float, default=10,
+                       help='Traced Python memory growth in MB per 100k predictions that counts as a leak (default: 10)')
+    parser.add_argument('--output', default=None,
+                       help='Output directory (default: soak/<timestamp>)')
+    parser.add_argument('--target', choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.target:
+        run_target(args)
+        return
+
+    if not os.path.exists(args.model):
+        print(f"Error: Model not found: {args.model}")
+        sys.exit(1)
+
+    output_dir = args.output or os.path.join('soak', datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(output_dir, exist_ok=True)
+    results = {
+        'started': datetime.now().isoformat(),
+        'settings': {key: getattr(args, key) for key in ('iterations', 'warmup', 'sample_every', 'model',
+                                                         'images', 'fps', 'traceback_frames')},
+        'targets': {},
+    }
+
+    failed = []
+    for target in args.targets:
+        result_path = os.path.join(output_dir, f"{target}.json")
+        command = [sys.executable, os.path.abspath(__file__), '--target', target, '--result', result_path]
+        for key in ('iterations', 'warmup', 'sample_every', 'model', 'images', 'fps', 'traceback_frames', 'top'):
+            command += [f"--{key.replace('_', '-')}", str(getattr(args, key))]
+        if subprocess.run(command).returncode != 0 or not os.path.exists(result_path):
+            print(f"Error: Soak run of {target} failed")
+            failed.append(target)
+            continue
+        with open(result_path) as f:
+            result = json.load(f)
+        os.remove(result_path)
+        result['leak_reasons'] = leak_verdict(result, args.max_rss_growth, args.max_traced_growth)
+        results['targets'][target] = result
+
+    if results['targets']:
+        write_report(results, output_dir)
+
+    print(f"\n{'target':<8} {'iterations':>10} {'RSS start':>10} {'RSS end':>9} {'MB/1k':>8} {'MB/hour':>9} "
+          f"{'traced MB/1k':>13}")
+    for name, result in results['targets'].items():
+        rss, traced = result['growth']['rss_mb'], result['growth']['traced_mb']
+        print(f"{name:<8} {result['iterations']:>10} {result['rss_start_mb']:>10.1f} {result['rss_end_mb']:>9.1f} "
+              f"{rss['per_1k_iterations'] or 0:>+8.2f} {rss['per_hour'] or 0:>+9.1f} "
+              f"{traced['per_1k_iterations'] or 0:>+13.3f}")
+        shown = []
+        for site in result['top_allocations']:
+            if site['site'] in shown:
+                continue
+            shown.append(site['site'])
+            if len(shown) > 3:
+                break
+            print(f"    +{site['size_diff_kb']:.1f} KB at {site['site']}"
+                  f"{' (still growing)' if site['growing'] else ''}")
+    if results['targets']:
+        print(f"\nReport: {output_dir}/report.json, samples.csv, top_allocations.txt, memory.png")
+
+    leaking = {name: result['leak_reasons'] for name, result in results['targets'].items() if result['leak_reasons']}
+    for name, reasons in leaking.items():
+        print(f"LEAK SUSPECTED in {name}: {'; '.join(reasons)}")
+    if leaking or failed:
+        sys.exit(1)
+    print("No leak detected")
+
+if __name__ == "__main__":
+    main()
@@ -1,105 +1,74 @@
 import os
 import sys
+import argparse
 sys.path.append('../src')
 from model import ChiliDiseaseModel
-import random
+from evaluation import evaluate_split, write_evaluation
+
+def print_report(metrics):
+    """Print accuracy, per-class precision/recall/F1 and the confusion matrix"""
+    classes = metrics['classes']
+    width = max(len(name) for name in classes + ['weighted avg'])
 
-def test_model_predictions():
-    """Test model with various samples from test dataset"""
-    
     print("=" * 60)
-    print("TESTING AI MODEL PREDICTIONS")
+    print(f"EVALUATION: {metrics['split']}")
     print("=" * 60)
-    
-    # Initialize model
+    print(f"Images: {metrics['samples']}")
+    print(f"Accuracy: {metrics['accuracy']:.2%}")
+    print(f"Mean confidence: {metrics['mean_confidence']:.1%}")
+    print(f"Throughput: {metrics['images_per_sec']:.1f} images/sec ({metrics['seconds']:.1f}s, "
+          f"batch size {metrics['batch_size']})")
+
+    print(f"\n{'class':<{width}}  precision  recall     f1  support")
+    for row in metrics['per_class']:
+        print(f"{row['class']:<{width}}  {row['precision']:9.4f}  {row['recall']:6.4f}  "
+              f"{row['f1']:6.4f}  {row['support']:7d}")
+    for name in ('macro_avg', 'weighted_avg'):
+        avg = metrics[name]
+        print(f"{name.replace('_', ' '):<{width}}  {avg['precision']:9.4f}  {avg['recall']:6.4f}  "
+              f"{avg['f1']:6.4f}  {metrics['samples']:7d}")
+
+    print("\nConfusion matrix (rows: actual, columns: predicted)")
+    cell = max(6, max(len(str(v)) for row in metrics['confusion_matrix'] for v in row) + 1)
+    print(' ' * width + ''.join(f"{i:>{cell}}" for i in range(len(classes))))
+    for index, (name, row) in enumerate(zip(classes, metrics['confusion_matrix'])):
+        print(f"{name:<{width}}" + ''.join(f"{v:>{cell}}" for v in row) + f"   ({index})")
+
+def test_model(split_path='../../datasetImage/test', model_path='../src/models/chili_disease_model.h5',
+               batch_size=64, output_dir='evaluation'):
+    """Evaluate the model on a whole split (image folders or compiled shards)"""
     model = ChiliDiseaseModel()
-    model.load_model('../src/models/chili_disease_model.h5')
-    
-    # Test each disease category
-    test_base_path = '../../datasetImage/test'
-    disease_folders = ['healthy', 'leaf curl', 'leaf spot', 'whitefly', 'yellowish']
-    
-    results = []
-    
-    for disease in disease_folders:
-        folder_path = os.path.join(test_base_path, disease)
-        if os.path.exists(folder_path):
-            # Get image files
-            images = [f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-            
-            if images:
-                # Test 2 random images from each category
-                test_images = random.sample(images, min(2, len(images)))
-                
-                print(f"\n🔍 Testing {disease.upper()} category:")
-                print("-" * 40)
-                
-                for img_name in test_images:
-                    img_path = os.path.join(folder_path, img_name)
-                    
-                    try:
-                        result = model.predict(img_path)
-                        predicted = result['prediction']
-                        confidence = result['confidence']
-                        
-                        # Convert folder name to model format for comparison
-                        actual_normalized = disease.replace(' ', '_').lower()
-                        predicted_normalized = predicted.replace(' ', '_').lower()
-                        
-                        is_correct = actual_normalized == predicted_normalized
-                        status = "✅ CORRECT" if is_correct else "❌ WRONG"
-                        
-                        print(f"  📷 {img_name}")
-                        print(f"     Expected: {disease}")
-                        print(f"     Predicted: {predicted} ({confidence:.1%})")
-                        print(f"     Status: {status}")
-                        print()
-                        
-                        results.append({
-                            'actual': disease,
-                            'predicted': predicted,
-                            'confidence': confidence,
-                            'correct': is_correct,
-                            'image': img_name
-                        })
-                        
-                    except Exception as e:
-                        print(f"  ❌ Error testing {img_name}: {str(e)}")
-    
-    # Calculate overall accuracy
-    if results:
-        correct_predictions = sum(1 for r in results if r['correct'])
-        total_predictions = len(results)
-        accuracy = (correct_predictions / total_predictions) * 100
-        
-        print("=" * 60)
-        print("SUMMARY RESULTS")
-        print("=" * 60)
-        print(f"Total Tests: {total_predictions}")
-        print(f"Correct Predictions: {correct_predictions}")
-        print(f"Wrong Predictions: {total_predictions - correct_predictions}")
-        print(f"Overall Accuracy: {accuracy:.1f}%")
-        
-        # Show confidence distribution
-        high_conf = sum(1 for r in results if r['confidence'] >= 0.8)
-        medium_conf = sum(1 for r in results if 0.5 <= r['confidence'] < 0.8)
-        low_conf = sum(1 for r in results if r['confidence'] < 0.5)
-        
-        print(f"\nConfidence Distribution:")
-        print(f"  High (≥80%): {high_conf}/{total_predictions} ({high_conf/total_predictions*100:.1f}%)")
-        print(f"  Medium (50-79%): {medium_conf}/{total_predictions} ({medium_conf/total_predictions*100:.1f}%)")
-        print(f"  Low (<50%): {low_conf}/{total_predictions} ({low_conf/total_predictions*100:.1f}%)")
-        
-        print("\n" + "=" * 60)
-        if accuracy >= 70:
-            print("🎉 MODEL PERFORMANCE: EXCELLENT!")
-        elif accuracy >= 50:
-            print("👍 MODEL PERFORMANCE: GOOD")
-        else:
-            print("⚠️  MODEL PERFORMANCE: NEEDS IMPROVEMENT")
-        print("=" * 60)
-    
-    return results
+    model.load_model(model_path)
+
+    metrics, predictions = evaluate_split(model, split_path, batch_size)
+    print_report(metrics)
+    write_evaluation(metrics, predictions, output_dir)
+    print(f"\nResults written to {output_dir}/ (metrics.json, per_class.csv, confusion_matrix.csv, predictions.csv)")
+
+    print("\n" + "=" * 60)
+    if metrics['accuracy'] >= 0.7:
+        print("MODEL PERFORMANCE: EXCELLENT")
+    elif metrics['accuracy'] >= 0.5:
+        print("MODEL PERFORMANCE: GOOD")
+    else:
+        print("MODEL PERFORMANCE: NEEDS IMPROVEMENT")
+    print("=" * 60)
+
+    return metrics
 
 if __name__ == "__main__":
-    test_model_predictions()
+    parser = argparse.ArgumentParser(description='Evaluate Chili Disease Detection Model on a full split')
+    parser.add_argument('--split', default='../../datasetImage/test',
+                        help='Split to evaluate: image class folders or a compiled shard directory')
+    parser.add_argument('--shards', help='Compiled shard split to evaluate (same as --split)')
+    parser.add_argument('--model', default='../src/models/chili_disease_model.h5', help='Path to trained model')
+    parser.add_argument('--batch-size', type=int, default=64, help='Inference batch size (default: 64)')
+    parser.add_argument('--output', default='evaluation', help='Output directory for JSON/CSV results')
+    args = parser.parse_args()
+
+    split_path = args.shards or args.split
+    if not os.path.exists(split_path):
+        print(f"Error: Split not found: {split_path}")
+        sys.exit(1)
+
+    test_model(split_path, args.model, args.batch_size, args.output)
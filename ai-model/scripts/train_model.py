@@ -17,13 +17,19 @@ if SRC_PATH not in sys.path:
     sys.path.insert(0, SRC_PATH)
 
 from model import ChiliDiseaseModel
+from dataset_shards import is_shard_dir
+from distributed import create_strategy, get_cluster_config, is_chief, worker_info, launch_local_workers
+from sweep import EpochMetricsLogger
+from telemetry import TrainingTelemetry, parse_step_range
 from dotenv import load_dotenv
 
 # Load .env from ai-model/.env (robust)
 dotenv_path = os.path.join(PROJECT_ROOT, 'ai-model', '.env')
 load_dotenv(dotenv_path)
 
-def train_model(train_path, val_path, epochs=50, fine_tune=False, fine_tune_epochs=20):
+def train_model(train_path, val_path, epochs=50, fine_tune=False, fine_tune_epochs=20, use_tf_data=False,
+                cached_features=False, augment_copies=5, strategy=None, metrics_log=None,
+                resume=False, telemetry_log=None, profile_steps=None, profile_dir='models/profile'):
     """
     Train the chili disease detection model
     
@@ -33,10 +39,31 @@ def train_model(train_path, val_path, epochs=50, fine_tune=False, fine_tune_epoc
         epochs (int): Number of training epochs
         fine_tune (bool): Whether to perform fine-tuning
         fine_tune_epochs (int): Number of fine-tuning epochs
+        use_tf_data (bool): Use the tf.data input pipeline instead of ImageDataGenerator
+        cached_features (bool): Train only the head on cached backbone features
+        augment_copies (int): Augmented feature copies per image for cached_features
+        strategy: tf.distribute strategy for multi-worker training (None = single process)
+        metrics_log (str): Append per-epoch metrics to this JSONL file
+        resume (bool): Continue an interrupted run from its last checkpoint
+        telemetry_log (str): Append per-epoch throughput, step time, input wait and memory to this JSONL file
+        profile_steps (tuple): (start, end) global steps to capture in a tf.profiler trace
+        profile_dir (str): Output directory of the profiler trace
     """
     
     print("Initializing Chili Disease Detection Model...")
     model = ChiliDiseaseModel()
+    if metrics_log:
+        model.extra_callbacks.append(EpochMetricsLogger(metrics_log))
+    if telemetry_log or profile_steps:
+        model.extra_callbacks.append(TrainingTelemetry(
+            telemetry_log or 'models/telemetry.jsonl', profile_steps, profile_dir
+        ))
+    chief = True
+    if strategy is not None:
+        model.use_strategy(strategy)
+        chief = is_chief(strategy)
+        task_type, task_id, num_workers = worker_info(strategy)
+        print(f"Distributed training: {task_type} {task_id} of {num_workers} workers")
     
     # Create models directory
     os.makedirs('ai-model/models', exist_ok=True)
@@ -45,26 +72,37 @@ def train_model(train_path, val_path, epochs=50, fine_tune=False, fine_tune_epoc
     print(f"Validation data: {val_path}")
     print(f"Epochs: {epochs}")
     print(f"Image size: {model.img_size}")
+    print(f"Learning rate: {model.learning_rate}, batch size: {model.batch_size}, "
+          f"dropout: {model.dropout_rate}, fine-tune at: {model.fine_tune_at}")
     print(f"Classes: {model.classes}")
     
     # Train model
     print("\nStarting training...")
-    history = model.train(train_path, val_path, epochs=epochs)
+    if cached_features:
+        history = model.train_head_cached(train_path, val_path, epochs=epochs,
+                                          augment_copies=augment_copies)
+    else:
+        history = model.train(train_path, val_path, epochs=epochs, use_tf_data=use_tf_data, resume=resume)
     
     # Plot training history
-    print("Plotting training history...")
-    model.plot_training_history(history)
+    if chief:
+        print("Plotting training history...")
+        model.plot_training_history(history)
     
     # Fine-tuning if requested
     if fine_tune:
         print(f"\nStarting fine-tuning for {fine_tune_epochs} epochs...")
-        fine_tune_history = model.fine_tune(train_path, val_path, epochs=fine_tune_epochs)
+        fine_tune_history = model.fine_tune(train_path, val_path, epochs=fine_tune_epochs,
+                                            use_tf_data=use_tf_data, resume=resume)
         
         # Plot fine-tuning history
-        print("Plotting fine-tuning history...")
-        model.plot_training_history(fine_tune_history)
+        if chief:
+            print("Plotting fine-tuning history...")
+            model.plot_training_history(fine_tune_history)
     
     print("Training completed!")
+    if not chief:
+        return model
     
     # Test prediction on a sample
     print("\nTesting model...")
@@ -89,6 +127,24 @@ def train_model(train_path, val_path, epochs=50, fine_tune=False, fine_tune_epoc
     
     return model
 
+def check_class_dirs(train_path, val_path):
+    """Check that both splits contain one directory per class"""
+    train_classes = [d for d in os.listdir(train_path) 
+                    if os.path.isdir(os.path.join(train_path, d))]
+    val_classes = [d for d in os.listdir(val_path) 
+                  if os.path.isdir(os.path.join(val_path, d))]
+    
+    if not train_classes:
+        print(f"Error: No class directories found in {train_path}")
+        sys.exit(1)
+    
+    if not val_classes:
+        print(f"Error: No class directories found in {val_path}")
+        sys.exit(1)
+    
+    print(f"Found {len(train_classes)} training classes: {train_classes}")
+    print(f"Found {len(val_classes)} validation classes: {val_classes}")
+
 def main():
     parser = argparse.ArgumentParser(description='Train Chili Disease Detection Model')
     parser.add_argument('--train-path', default='datasetImage/train', 
@@ -101,9 +157,67 @@ def main():
                        help='Perform fine-tuning after initial training')
     parser.add_argument('--fine-tune-epochs', type=int, default=20,
                        help='Number of fine-tuning epochs')
+    parser.add_argument('--tf-data', action='store_true',
+                       help='Use the tf.data input pipeline (parallel decode, cache, prefetch)')
+    parser.add_argument('--cached-features', action='store_true',
+                       help='Train only the classifier head on cached backbone features')
+    parser.add_argument('--augment-copies', type=int, default=5,
+                       help='Augmented variants per image for --cached-features (default: 5)')
+    parser.add_argument('--distributed', action='store_true',
+                       help='Multi-worker data-parallel training, cluster spec from TF_CONFIG')
+    parser.add_argument('--local-workers', type=int, default=0,
+                       help='Run N distributed workers as local processes (testing / one big host)')
+    parser.add_argument('--learning-rate', type=float,
+                       help='Learning rate (default: LEARNING_RATE)')
+    parser.add_argument('--batch-size', type=int,
+                       help='Batch size (default: BATCH_SIZE)')
+    parser.add_argument('--dropout', type=float,
+                       help='Dropout rate of the classifier head (default: DROPOUT_RATE or 0.2)')
+    parser.add_argument('--fine-tune-at', type=int,
+                       help='First backbone layer unfrozen by --fine-tune (default: FINE_TUNE_AT or 100)')
+    parser.add_argument('--metrics-log',
+                       help='Append per-epoch metrics to this JSONL file')
+    parser.add_argument('--telemetry-log',
+                       help='Append per-epoch images/sec, step time, input wait, peak memory and '
+                            'learning rate to this JSONL file')
+    parser.add_argument('--profile-steps',
+                       help='Capture a tf.profiler trace of global steps START,END (e.g. 10,20)')
+    parser.add_argument('--profile-dir', default='models/profile',
+                       help='Output directory of the profiler trace (default: models/profile)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted run from models/checkpoints (CHECKPOINT_DIR)')
+    parser.add_argument('--checkpoint-every', type=int,
+                       help='Epochs between full training-state checkpoints (default: CHECKPOINT_EVERY or 1)')
     
     args = parser.parse_args()
     
+    # Update environment variables if provided
+    if args.learning_rate is not None:
+        os.environ['LEARNING_RATE'] = str(args.learning_rate)
+    if args.batch_size is not None:
+        os.environ['BATCH_SIZE'] = str(args.batch_size)
+    if args.dropout is not None:
+        os.environ['DROPOUT_RATE'] = str(args.dropout)
+    if args.fine_tune_at is not None:
+        os.environ['FINE_TUNE_AT'] = str(args.fine_tune_at)
+    if args.checkpoint_every is not None:
+        os.environ['CHECKPOINT_EVERY'] = str(args.checkpoint_every)
+    
+    # Launcher: re-run this script once per worker with its own TF_CONFIG
+    if args.local_workers > 1 and get_cluster_config() is None:
+        sys.exit(launch_local_workers(args.local_workers, [os.path.abspath(__file__)] + sys.argv[1:]))
+    
+    distributed = args.distributed or args.local_workers > 1
+    if distributed and args.cached_features:
+        print("Error: --cached-features does not support distributed training")
+        sys.exit(1)
+    if distributed and get_cluster_config() is None:
+        print("Error: --distributed needs a TF_CONFIG cluster spec")
+        sys.exit(1)
+    
+    # The strategy has to exist before any other TensorFlow op runs
+    strategy = create_strategy() if distributed else None
+    
     # Check if data directories exist
     if not os.path.exists(args.train_path):
         print(f"Error: Training data directory not found: {args.train_path}")
@@ -113,22 +227,11 @@ def main():
         print(f"Error: Validation data directory not found: {args.val_path}")
         sys.exit(1)
     
-    # Check if data has the required structure
-    train_classes = [d for d in os.listdir(args.train_path) 
-                    if os.path.isdir(os.path.join(args.train_path, d))]
-    val_classes = [d for d in os.listdir(args.val_path) 
-                  if os.path.isdir(os.path.join(args.val_path, d))]
-    
-    if not train_classes:
-        print(f"Error: No class directories found in {args.train_path}")
-        sys.exit(1)
-    
-    if not val_classes:
-        print(f"Error: No class directories found in {args.val_path}")
-        sys.exit(1)
-    
-    print(f"Found {len(train_classes)} training classes: {train_classes}")
-    print(f"Found {len(val_classes)} validation classes: {val_classes}")
+    # Compiled shards (scripts/compile_dataset.py) carry their own class list
+    if is_shard_dir(args.train_path) and is_shard_dir(args.val_path):
+        print(f"Using compiled shards: {args.train_path}, {args.val_path}")
+    else:
+        check_class_dirs(args.train_path, args.val_path)
     
     # Train model
     model = train_model(
@@ -136,7 +239,16 @@ def main():
         val_path=args.val_path,
         epochs=args.epochs,
         fine_tune=args.fine_tune,
-        fine_tune_epochs=args.fine_tune_epochs
+        fine_tune_epochs=args.fine_tune_epochs,
+        use_tf_data=args.tf_data,
+        cached_features=args.cached_features,
+        augment_copies=args.augment_copies,
+        strategy=strategy,
+        metrics_log=args.metrics_log,
+        resume=args.resume,
+        telemetry_log=args.telemetry_log,
+        profile_steps=parse_step_range(args.profile_steps),
+        profile_dir=args.profile_dir
     )
     
     print(f"\nModel saved to: ai-model/models/chili_disease_model.h5")
@@ -11,13 +11,19 @@ from werkzeug.utils import secure_filename
 
 # Use absolute imports when available, fallback to relative
 try:
-    from model import ChiliDiseaseModel
+    from model import ChiliDiseaseModel, MAX_TILE_OVERLAP
     from disease_solutions import DiseaseSolutionProvider
     from camera_manager import CameraManager
+    from online_learning import OnlineHeadTrainer
+    from tta import parse_views
+    from frame_quality import GATE_MODES
 except ImportError:
-    from .model import ChiliDiseaseModel
+    from .model import ChiliDiseaseModel, MAX_TILE_OVERLAP
     from .disease_solutions import DiseaseSolutionProvider
     from .camera_manager import CameraManager
+    from .online_learning import OnlineHeadTrainer
+    from .tta import parse_views
+    from .frame_quality import GATE_MODES
 
 load_dotenv()
 
@@ -27,7 +33,8 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Initialize components
 model = ChiliDiseaseModel()
 solution_provider = DiseaseSolutionProvider()
-camera_manager = CameraManager()
+# The camera shares the API's model, so online head updates reach camera predictions too
+camera_manager = CameraManager(model)
 
 # Load model
 MODEL_PATH = os.getenv('MODEL_PATH', 'models/chili_disease_model.h5')
@@ -37,14 +44,74 @@ if os.path.exists(MODEL_PATH):
 else:
     print("Warning: Model not found")
 
+# Online head updates from labeled field captures
+online_trainer = None
+if os.getenv('ONLINE_LEARNING', 'False').lower() == 'true' and model.model is not None:
+    online_trainer = OnlineHeadTrainer(model)
+    online_trainer.start()
+    print(f"Online learning enabled (head v{online_trainer.version})")
+
 # Configuration
 UPLOAD_FOLDER = 'temp_images'
+# Detection logs and overlay videos requested over the API are only written here
+CAPTURES_FOLDER = os.getenv('CAPTURES_DIR', 'captures')
+LOG_EXTENSIONS = {'.jsonl', '.log'}
+VIDEO_EXTENSIONS = {'.avi'}
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def capture_path(name, extensions):
+    """Resolve a client-supplied bare file name under CAPTURES_FOLDER, None for anything else"""
+    if not isinstance(name, str) or secure_filename(name) != name:
+        return None
+    if os.path.splitext(name)[1].lower() not in extensions:
+        return None
+    return os.path.join(CAPTURES_FOLDER, name)
+
+# Held while checking for and starting a detection loop, so two requests cannot both start one
+headless_lock = threading.Lock()
+headless_thread = None
+
+def tta_option():
+    """Optional 'tta' form / query field: view names or a preset, None keeps TTA_VIEWS"""
+    value = request.values.get('tta')
+    return parse_views(value) if value is not None else None
+
+def quality_option():
+    """Optional 'quality' form / query field: reject, flag or off, None keeps QUALITY_GATE"""
+    value = request.values.get('quality')
+    if value is not None and value.lower() not in GATE_MODES:
+        raise ValueError(f"Invalid quality: {value}, expected one of {', '.join(GATE_MODES)}")
+    return value.lower() if value is not None else None
+
+def rejected_response(prediction):
+    """422 response for an image the quality gate rejected, with the reasons and metrics"""
+    return jsonify({
+        'success': False,
+        'error': f"Image rejected by quality check: {', '.join(prediction['quality']['reasons'])}",
+        'prediction': prediction,
+        'timestamp': datetime.now().isoformat()
+    }), 422
+
+def tile_options():
+    """Optional tile_size / overlap / min_vegetation form or query fields for tiled prediction"""
+    options = {}
+    for name, cast in (('tile_size', int), ('overlap', float), ('min_vegetation', float)):
+        value = request.values.get(name)
+        if value is not None:
+            try:
+                options[name] = cast(value)
+            except ValueError:
+                raise ValueError(f"Invalid {name}: {value}")
+    if options.get('tile_size', 1) <= 0:
+        raise ValueError("tile_size must be positive")
+    if not 0 <= options.get('overlap', 0) <= MAX_TILE_OVERLAP:
+        raise ValueError(f"overlap must be in [0, {MAX_TILE_OVERLAP}]")
+    return options
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -70,6 +137,12 @@ def predict_disease():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
         
+        try:
+            tta = tta_option()
+            quality = quality_option()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Save uploaded file
         filename = secure_filename(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -78,7 +151,13 @@ def predict_disease():
         file.save(filepath)
         
         # Predict
-        prediction = model.predict(filepath)
+        prediction = model.predict(filepath, tta=tta, quality=quality)
+        
+        # Clean up uploaded file
+        os.remove(filepath)
+        
+        if prediction.get('rejected'):
+            return rejected_response(prediction)
         
         # Get solution if disease detected
         if prediction['prediction'] != 'healthy':
@@ -86,8 +165,52 @@ def predict_disease():
             prediction['solution'] = solution
             prediction['cost_estimation'] = solution_provider.get_cost_estimation(prediction['prediction'])
         
-        # Clean up uploaded file
-        os.remove(filepath)
+        return jsonify({
+            'success': True,
+            'prediction': prediction,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/tiled', methods=['POST'])
+def predict_tiled():
+    """Predict disease across a whole-plant or bed photo, tile by tile
+    
+    Returns the verdict for the whole photo plus per-tile probabilities
+    and a coarse disease heatmap (tiles.heatmap, None for background).
+    """
+    try:
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image file provided'}), 400
+        
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type'}), 400
+        
+        try:
+            options = tile_options()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Save uploaded file
+        filename = secure_filename(file.filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        filepath = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{filename}")
+        file.save(filepath)
+        
+        try:
+            prediction = model.predict_tiled(filepath, **options)
+        finally:
+            os.remove(filepath)
+        
+        if prediction['prediction'] != 'healthy':
+            prediction['solution'] = solution_provider.get_solution(prediction['prediction'])
+            prediction['cost_estimation'] = solution_provider.get_cost_estimation(prediction['prediction'])
         
         return jsonify({
             'success': True,
@@ -108,8 +231,16 @@ def predict_esp32_image():
         if not os.path.exists(esp32_image_path):
             return jsonify({'error': 'ESP32 image not found'}), 404
         
+        try:
+            tta = tta_option()
+            quality = quality_option()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Predict
-        prediction = model.predict(esp32_image_path)
+        prediction = model.predict(esp32_image_path, tta=tta, quality=quality)
+        if prediction.get('rejected'):
+            return rejected_response(prediction)
         
         # Get solution if disease detected
         if prediction['prediction'] != 'healthy':
@@ -131,7 +262,12 @@ def predict_esp32_image():
 def capture_and_analyze():
     """Capture image from camera and analyze"""
     try:
-        result = camera_manager.capture_and_analyze()
+        # Any countdown is shown by the client, the capture itself is immediate
+        options = request.get_json(silent=True) or {}
+        result = camera_manager.capture_and_analyze(countdown=int(options.get('countdown', 0)))
+        
+        if result and result['prediction'].get('rejected'):
+            return rejected_response(result['prediction'])
         
         if result:
             return jsonify({
@@ -160,24 +296,13 @@ def camera_stream():
     """Camera stream endpoint (for real-time detection)"""
     from flask import Response
     def generate():
-        try:
-            camera_manager.initialize_camera()
-        except Exception as e:
-            yield (b'--frame\r\nContent-Type: text/plain\r\n\r\nCamera initialization failed: ' + str(e).encode() + b'\r\n')
-            return
-
         try:
             while True:
-                frame = camera_manager.capture_frame()
-                if frame is None:
+                # With CAMERA_PROCESS=true the JPEG comes encoded from the capture process
+                frame_bytes = camera_manager.get_stream_jpeg()
+                if frame_bytes is None:
                     yield (b'--frame\r\nContent-Type: text/plain\r\n\r\nCamera frame not available.\r\n')
                     break
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if not ret:
-                    yield (b'--frame\r\nContent-Type: text/plain\r\n\r\nFrame encoding failed.\r\n')
-                    break
-                frame_bytes = buffer.tobytes()
                 yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
                 time.sleep(0.1)  # Control frame rate
         finally:
@@ -187,6 +312,260 @@ def camera_stream():
                 pass
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/camera/restart', methods=['POST'])
+def restart_camera():
+    """Restart the camera capture process without restarting the API"""
+    try:
+        if not camera_manager.restart_camera():
+            return jsonify({'error': 'Camera process not running (requires CAMERA_PROCESS=true)'}), 409
+        return jsonify({
+            'success': True,
+            'status': camera_manager.get_camera_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/camera/headless/start', methods=['POST'])
+def start_headless_detection():
+    """Start headless real-time detection in the background
+
+    log_path and output_video are bare file names, written under CAPTURES_DIR.
+    """
+    global headless_thread
+    try:
+        options = request.get_json(silent=True) or {}
+        log_path = output_video = None
+        if options.get('log_path') is not None:
+            log_path = capture_path(options['log_path'], LOG_EXTENSIONS)
+            if log_path is None:
+                return jsonify({'error': f"log_path must be a bare file name ending in {sorted(LOG_EXTENSIONS)}"}), 400
+        if options.get('output_video') is not None:
+            output_video = capture_path(options['output_video'], VIDEO_EXTENSIONS)
+            if output_video is None:
+                return jsonify({'error': f"output_video must be a bare file name ending in {sorted(VIDEO_EXTENSIONS)}"}), 400
+        interval = float(options.get('interval', 2.0))
+        
+        with headless_lock:
+            # is_running is only set once the loop has opened the camera, a live thread covers the start-up
+            if camera_manager.is_running or (headless_thread is not None and headless_thread.is_alive()):
+                return jsonify({'error': 'Detection already running'}), 409
+            headless_thread = threading.Thread(
+                target=camera_manager.start_headless_detection,
+                kwargs={
+                    'log_path': log_path,
+                    'output_video': output_video,
+                    'prediction_interval': interval
+                }
+            )
+            headless_thread.daemon = True
+            headless_thread.start()
+        
+        return jsonify({
+            'success': True,
+            'status': camera_manager.get_headless_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/camera/headless/stop', methods=['POST'])
+def stop_headless_detection():
+    """Stop headless real-time detection"""
+    try:
+        camera_manager.is_running = False
+        return jsonify({
+            'success': True,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/camera/headless/status', methods=['GET'])
+def headless_status():
+    """Get headless detection status"""
+    try:
+        return jsonify(camera_manager.get_headless_status())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/camera/headless/recording', methods=['POST'])
+def headless_recording():
+    """Start or stop recording the prediction overlay to a video file"""
+    try:
+        options = request.get_json(silent=True) or {}
+        if options.get('enabled', True):
+            if options.get('output_video') is not None:
+                output_path = capture_path(options['output_video'], VIDEO_EXTENSIONS)
+                if output_path is None:
+                    return jsonify({'error': f"output_video must be a bare file name ending in {sorted(VIDEO_EXTENSIONS)}"}), 400
+            else:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                output_path = os.path.join(CAPTURES_FOLDER, f'overlay_{timestamp}.avi')
+            camera_manager.start_overlay_recording(output_path)
+        else:
+            camera_manager.stop_overlay_recording()
+        
+        return jsonify({
+            'success': True,
+            'recording': camera_manager.video_output_path
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/camera/headless/stream')
+def headless_stream():
+    """Stream the prediction overlay of a running headless detection"""
+    from flask import Response
+    if not camera_manager.is_running:
+        return jsonify({'error': 'Headless detection not running'}), 409
+    
+    def generate():
+        camera_manager.add_overlay_viewer()
+        try:
+            while camera_manager.is_running:
+                frame = camera_manager.overlay_frame
+                if frame is None:
+                    time.sleep(0.05)
+                    continue
+                ret, buffer = cv2.imencode('.jpg', frame)
+                if ret:
+                    yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                time.sleep(0.1)  # Control frame rate
+        finally:
+            camera_manager.remove_overlay_viewer()
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/captures', methods=['GET'])
+def list_captures():
+    """List archived captures for a day (?day=YYYYMMDD) or time range (?start=&end=, ISO format)"""
+    try:
+        archive = camera_manager.archive
+        if archive is None:
+            return jsonify({'error': 'Capture archive not enabled (set CAPTURE_ARCHIVE=true)'}), 404
+        
+        day = request.args.get('day')
+        if day:
+            captures = archive.list_day(day)
+        else:
+            start = request.args.get('start')
+            end = request.args.get('end')
+            captures = archive.query(
+                datetime.fromisoformat(start) if start else None,
+                datetime.fromisoformat(end) if end else None
+            )
+        
+        return jsonify({
+            'success': True,
+            'captures': captures,
+            'total': len(captures),
+            'archive': archive.get_stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/captures/<ref>/image', methods=['GET'])
+def get_capture_image(ref):
+    """Get the JPEG of an archived capture"""
+    try:
+        archive = camera_manager.archive
+        if archive is None:
+            return jsonify({'error': 'Capture archive not enabled (set CAPTURE_ARCHIVE=true)'}), 404
+        
+        image_bytes, _ = archive.read(ref.replace('archive:', '', 1))
+        from flask import Response
+        return Response(image_bytes, mimetype='image/jpeg')
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/feedback', methods=['POST'])
+def submit_feedback():
+    """Submit a labeled image for online head updates"""
+    try:
+        if online_trainer is None:
+            return jsonify({'error': 'Online learning not enabled (set ONLINE_LEARNING=true)'}), 404
+        
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image file provided'}), 400
+        
+        label = request.form.get('label', '')
+        if label not in model.classes:
+            return jsonify({'error': f"Invalid label, expected one of {model.classes}"}), 400
+        
+        file = request.files['image']
+        if file.filename == '' or not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type'}), 400
+        
+        filename = secure_filename(file.filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        filepath = os.path.join(UPLOAD_FOLDER, f"feedback_{timestamp}_{filename}")
+        file.save(filepath)
+        
+        try:
+            status = online_trainer.add_sample(filepath, label)
+        finally:
+            os.remove(filepath)
+        
+        return jsonify({
+            'success': True,
+            'online': status,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/online/status', methods=['GET'])
+def online_status():
+    """Get online learning status"""
+    if online_trainer is None:
+        return jsonify({'enabled': False})
+    status = online_trainer.get_status()
+    status['enabled'] = True
+    return jsonify(status)
+
+@app.route('/online/refit', methods=['POST'])
+def online_refit():
+    """Refit the classifier head now instead of waiting for the interval"""
+    try:
+        if online_trainer is None:
+            return jsonify({'error': 'Online learning not enabled (set ONLINE_LEARNING=true)'}), 404
+        
+        record = online_trainer.refit()
+        if record is None:
+            return jsonify({'error': 'Replay buffer is empty'}), 400
+        # A head that scores worse on the held-out set is recorded but not served
+        return jsonify({'success': True, 'published': not record.get('rejected', False), 'head': record})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/online/rollback', methods=['POST'])
+def online_rollback():
+    """Roll the classifier head back to an earlier version"""
+    try:
+        if online_trainer is None:
+            return jsonify({'error': 'Online learning not enabled (set ONLINE_LEARNING=true)'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        if 'version' not in data:
+            return jsonify({'error': 'version is required'}), 400
+        
+        record = online_trainer.rollback(int(data['version']))
+        return jsonify({'success': True, 'head': record})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/quality/status', methods=['GET'])
+def quality_status():
+    """Quality gate counters: checked, passed, flagged, rejected and rejection reasons
+
+    The camera shares the API's model, so the counters cover uploads and camera frames.
+    """
+    return jsonify(model.quality_gate.stats())
+
 @app.route('/diseases', methods=['GET'])
 def get_diseases():
     """Get list of all diseases and their information"""
@@ -242,8 +621,8 @@ def batch_predict():
                 # Predict
                 prediction = model.predict(filepath)
                 
-                # Get solution if needed
-                if prediction['prediction'] != 'healthy':
+                # Get solution if needed (rejected images keep their quality report instead)
+                if prediction['prediction'] != 'healthy' and not prediction.get('rejected'):
                     solution = solution_provider.get_solution(prediction['prediction'])
                     prediction['solution'] = solution
                 
@@ -274,7 +653,8 @@ def model_info():
             'model_path': MODEL_PATH,
             'classes': model.classes,
             'image_size': model.img_size,
-            'confidence_threshold': float(os.getenv('CONFIDENCE_THRESHOLD', 0.7))
+            'confidence_threshold': float(os.getenv('CONFIDENCE_THRESHOLD', 0.7)),
+            'head_version': online_trainer.version if online_trainer else 0
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -318,10 +698,17 @@ if __name__ == '__main__':
     print(f"Model loaded: {model.model is not None}")
     print(f"Available endpoints:")
     print(f"  POST /predict - Predict from uploaded image")
+    print(f"  POST /predict/tiled - Tiled prediction with disease heatmap for whole-plant photos")
     print(f"  POST /predict/esp32 - Predict from ESP32 image")
+    print(f"  GET  /quality/status - Frame quality gate counters")
     print(f"  POST /camera/capture - Capture and analyze from camera")
     print(f"  GET  /camera/status - Get camera status")
     print(f"  GET  /camera/stream - Real-time camera stream")
+    print(f"  POST /camera/headless/start - Start headless detection")
+    print(f"  POST /camera/headless/stop - Stop headless detection")
+    print(f"  GET  /camera/headless/stream - Headless detection overlay stream")
+    print(f"  POST /feedback - Submit labeled image for online updates")
+    print(f"  GET  /online/status - Online learning status")
     print(f"  GET  /diseases - List all diseases")
     print(f"  POST /batch/predict - Batch prediction")
     
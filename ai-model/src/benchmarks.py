@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+import platform
+import resource
+import numpy as np
+
+# metric -> True when higher is better
+METRICS = {
+    'cold_start_s': False,
+    'load_s': False,
+    'first_predict_ms': False,
+    'latency_p50_ms': False,
+    'latency_p95_ms': False,
+    'throughput_ips': True,
+    'peak_rss_mb': False,
+}
+
+
+def hardware_profile():
+    """Slug identifying the benchmark hardware: arch, CPU model, cores, RAM"""
+    cpu = platform.processor() or ''
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    cpu = line.split(':', 1)[1]
+                    break
+    except OSError:
+        pass
+    memory_gb = 0
+    try:
+        with open('/proc/meminfo') as f:
+            memory_gb = round(int(f.readline().split()[1]) / (1024 * 1024))
+    except (OSError, ValueError, IndexError):
+        pass
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    cpu = re.sub(r'\(r\)|\(tm\)|cpu|@.*', '', cpu.lower())
+    cpu = re.sub(r'[^a-z0-9]+', '-', cpu).strip('-') or 'unknown-cpu'
+    return f"{platform.machine().lower()}-{cpu}-{cores}c-{memory_gb}gb"
+
+
+def run_trial(model_path, image_path, spawn_time, latency_runs=30, throughput_batch=32, throughput_batches=5):
+    """One benchmark trial, meant to run in a fresh process
+
+    spawn_time is the parent's time.time() just before starting the
+    process, so cold_start_s covers interpreter start, imports, model load
+    and the first prediction.
+    """
+    import tensorflow as tf
+    try:
+        from model import ChiliDiseaseModel
+    except ImportError:
+        from .model import ChiliDiseaseModel
+
+    chili_model = ChiliDiseaseModel()
+    start = time.perf_counter()
+    chili_model.load_model(model_path)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chili_model.predict(image_path)
+    first_predict_ms = (time.perf_counter() - start) * 1000
+    cold_start_s = time.time() - spawn_time
+
+    # End-to-end predict (decode, resize, inference) as the API calls it
+    timings = []
+    for _ in range(latency_runs):
+        start = time.perf_counter()
+        chili_model.predict(image_path)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    size = chili_model.img_size
+    batch = tf.constant(np.random.default_rng(0).random((throughput_batch, size, size, 3), dtype=np.float32))
+    infer = tf.function(lambda x: chili_model.model(x, training=False))
+    infer(batch).numpy()
+    start = time.perf_counter()
+    for _ in range(throughput_batches):
+        infer(batch).numpy()
+    throughput_ips = throughput_batch * throughput_batches / (time.perf_counter() - start)
+
+    return {
+        'cold_start_s': cold_start_s,
+        'load_s': load_s,
+        'first_predict_ms': first_predict_ms,
+        'latency_p50_ms': float(np.percentile(timings, 50)),
+        'latency_p95_ms': float(np.percentile(timings, 95)),
+        'throughput_ips': throughput_ips,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def summarize(samples, resamples=2000, seed=0):
+    """Mean, standard deviation and bootstrap 95% confidence interval of the mean"""
+    values = np.asarray(samples, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    means = rng.choice(values, (resamples, len(values))).mean(axis=1)
+    low, high = np.percentile(means, [2.5, 97.5])
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        'ci95': [float(low), float(high)],
+        'n': len(values),
+    }
+
+
+def compare_metric(baseline, candidate, higher_is_better, threshold, resamples=2000, seed=0):
+    """Relative change of the candidate mean vs the baseline mean
+
+    The 95% interval of the change is bootstrapped from both sample sets.
+    A regression needs the change in the worse direction to exceed
+    threshold and the whole interval to be on the worse side of zero, so
+    noise alone does not fail the gate.
+    """
+    baseline = np.asarray(baseline, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    base_means = rng.choice(baseline, (resamples, len(baseline))).mean(axis=1)
+    cand_means = rng.choice(candidate, (resamples, len(candidate))).mean(axis=1)
+
+    changes = (cand_means - base_means) / np.maximum(np.abs(base_means), 1e-12)
+    change = (candidate.mean() - baseline.mean()) / max(abs(baseline.mean()), 1e-12)
+    low, high = np.percentile(changes, [2.5, 97.5])
+
+    # Oriented so that positive is worse
+    sign = -1.0 if higher_is_better else 1.0
+    worse, worse_low, worse_high = sign * change, min(sign * low, sign * high), max(sign * low, sign * high)
+    if worse > threshold and worse_low > 0:
+        verdict = 'regression'
+    elif worse < -threshold and worse_high < 0:
+        verdict = 'improvement'
+    else:
+        verdict = 'unchanged'
+    return {
+        'baseline_mean': float(baseline.mean()),
+        'candidate_mean': float(candidate.mean()),
+        'change': float(change),
+        'change_ci95': [float(low), float(high)],
+        'higher_is_better': higher_is_better,
+        'threshold': threshold,
+        'verdict': verdict,
+    }
+
+
+def compare_runs(baseline, candidate, thresholds, default_threshold=0.10):
+    """Compare every metric present in both runs, returns {metric: comparison}"""
+    results = {}
+    for metric, higher_is_better in METRICS.items():
+        if metric in baseline['samples'] and metric in candidate['samples']:
+            results[metric] = compare_metric(
+                baseline['samples'][metric], candidate['samples'][metric], higher_is_better,
+                thresholds.get(metric, default_threshold)
+            )
+    return results
+
+
+def collect_run(trials, metadata):
+    """Turn per-trial results into {samples, summary} plus run metadata"""
+    samples = {metric: [trial[metric] for trial in trials] for metric in METRICS if metric in trials[0]}
+    run = dict(metadata)
+    run['samples'] = samples
+    run['summary'] = {metric: summarize(values) for metric, values in samples.items()}
+    return run
+
+
+def baseline_path(baseline_dir, profile):
+    return os.path.join(baseline_dir, f"{profile}.json")
+
+
+def load_baseline(baseline_dir, profile):
+    path = baseline_path(baseline_dir, profile)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(run, baseline_dir, profile):
+    os.makedirs(baseline_dir, exist_ok=True)
+    path = baseline_path(baseline_dir, profile)
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
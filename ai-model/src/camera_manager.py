@@ -5,21 +5,75 @@ import os
 import time
 from datetime import datetime
 import threading
-from queue import Queue
+from collections import deque
+from queue import Queue, Empty
 from dotenv import load_dotenv
 
 # Use absolute imports when available, fallback to relative
 try:
     from model import ChiliDiseaseModel
     from disease_solutions import DiseaseSolutionProvider
+    from capture_archive import CaptureArchive
+    from shm_camera import ProcessCamera
+    from preprocessing import aligned_empty
+    from frame_quality import frame_quality_score
 except ImportError:
     from .model import ChiliDiseaseModel
     from .disease_solutions import DiseaseSolutionProvider
+    from .capture_archive import CaptureArchive
+    from .shm_camera import ProcessCamera
+    from .preprocessing import aligned_empty
+    from .frame_quality import frame_quality_score
 
 load_dotenv()
 
+class LatencyTracker:
+    """Per-stage latency distribution of captured frames
+    
+    Each frame carries a timing dict with 'capture', 'dequeue',
+    'inference_start' and 'inference_end' timestamps (time.time()).
+    """
+    
+    STAGES = {
+        'queue': ('capture', 'dequeue'),
+        'wait': ('dequeue', 'inference_start'),
+        'inference': ('inference_start', 'inference_end'),
+        'glass_to_prediction': ('capture', 'inference_end')
+    }
+    
+    def __init__(self, window=500):
+        self.samples = {stage: deque(maxlen=window) for stage in self.STAGES}
+        self.lock = threading.Lock()
+    
+    def record(self, timing):
+        """Record the stage durations of one frame"""
+        with self.lock:
+            for stage, (start, end) in self.STAGES.items():
+                if start in timing and end in timing:
+                    self.samples[stage].append((timing[end] - timing[start]) * 1000.0)
+    
+    def summary(self):
+        """Return p50/p95/p99/max latency in milliseconds per stage"""
+        with self.lock:
+            snapshot = {stage: np.array(values) for stage, values in self.samples.items()}
+        
+        report = {}
+        for stage, values in snapshot.items():
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report[stage] = {
+                'count': int(len(values)),
+                'mean_ms': round(float(values.mean()), 2),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max()), 2)
+            }
+        return report
+
 class CameraManager:
-    def __init__(self):
+    def __init__(self, model=None):
         self.camera_index = int(os.getenv('CAMERA_INDEX', 0))
         self.frame_width = int(os.getenv('FRAME_WIDTH', 640))
         self.frame_height = int(os.getenv('FRAME_HEIGHT', 480))
@@ -29,19 +83,67 @@ class CameraManager:
         self.cap = None
         self.is_running = False
         self.current_frame = None
-        self.prediction_queue = Queue()
+        
+        # Low-latency capture: tiny driver buffer, MJPG and a grab thread dropping backlog
+        self.low_latency = os.getenv('CAMERA_LOW_LATENCY', 'false').lower() == 'true'
+        self.capture_profile = {}
+        self.latency = LatencyTracker()
+        self.frame_seq = 0
+        self.frame_condition = threading.Condition()
+        
+        # Capture and JPEG encoding in a child process, frames shared via shared memory
+        self.camera_process = None
+        if os.getenv('CAMERA_PROCESS', 'false').lower() == 'true':
+            self.camera_process = ProcessCamera(
+                camera_index=self.camera_index,
+                width=self.frame_width,
+                height=self.frame_height,
+                fps=self.fps,
+                low_latency=self.low_latency
+            )
+        
+        # Warm camera: keep the device open and buffer recent frames
+        self.warm_camera = os.getenv('WARM_CAMERA', 'false').lower() == 'true'
+        self.camera_idle_timeout = float(os.getenv('CAMERA_IDLE_TIMEOUT', 60))
+        self.warmup_frames = int(os.getenv('CAMERA_WARMUP_FRAMES', 5))
+        self.preroll = deque(maxlen=int(os.getenv('PREROLL_FRAMES', 8)))
+        self.warm_running = False
+        self.warm_thread = None
+        self.warm_last_access = 0
+        self.warm_lock = threading.Lock()
+        
+        # Headless detection state
+        self.detection_log_path = os.getenv('DETECTION_LOG', 'captures/detections.jsonl')
+        self.last_prediction = None
+        self.video_output_path = None
+        self.video_writer = None
+        self.overlay_frame = None
+        self.overlay_viewers = 0
+        self.overlay_lock = threading.Lock()
+        
+        # Reused buffers: model input slots for the detection loops and the display frame
+        self.input_slots = None
+        self.input_slot = 0
+        self.display_frame = None
+        
+        # Segmented capture archive instead of one JPEG + JSON file per detection
+        self.archive = None
+        if os.getenv('CAPTURE_ARCHIVE', 'false').lower() == 'true':
+            self.archive = CaptureArchive()
         
         # Initialize AI model and solution provider
-        self.model = ChiliDiseaseModel()
         self.solution_provider = DiseaseSolutionProvider()
         
-        # Load model
-        model_path = os.getenv('MODEL_PATH', 'models/chili_disease_model.h5')
-        if os.path.exists(model_path):
-            self.model.load_model(model_path)
-            print(f"Model loaded from {model_path}")
-        else:
-            print("Warning: Model not found. Please train the model first.")
+        # A model passed in is shared with its owner (e.g. the API), so head updates reach the camera too
+        self.model = model
+        if self.model is None:
+            self.model = ChiliDiseaseModel()
+            model_path = os.getenv('MODEL_PATH', 'models/chili_disease_model.h5')
+            if os.path.exists(model_path):
+                self.model.load_model(model_path)
+                print(f"Model loaded from {model_path}")
+            else:
+                print("Warning: Model not found. Please train the model first.")
     
     def initialize_camera(self):
         """Initialize camera connection"""
@@ -50,12 +152,29 @@ class CameraManager:
             if not self.cap.isOpened():
                 raise Exception(f"Cannot open camera {self.camera_index}")
             
+            # FOURCC has to be set before the resolution on V4L2 devices
+            if self.low_latency:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            
             # Set camera properties
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
             self.cap.set(cv2.CAP_PROP_FPS, self.fps)
             
+            if self.low_latency:
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            # Read back what the driver actually accepted
+            fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+            self.capture_profile = {
+                'low_latency': self.low_latency,
+                'fourcc': ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)) if fourcc > 0 else None,
+                'buffer_size': int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE))
+            }
+            
             print(f"Camera initialized: {self.frame_width}x{self.frame_height} @ {self.fps}fps")
+            if self.low_latency:
+                print(f"Low-latency profile: {self.capture_profile}")
             return True
         except Exception as e:
             print(f"Camera initialization failed: {e}")
@@ -63,6 +182,23 @@ class CameraManager:
     
     def capture_frame(self):
         """Capture single frame"""
+        if self.camera_process is not None:
+            if not self.camera_process.start():
+                return None
+            timing, frame = self.camera_process.wait_for_frame()
+            return frame.copy() if frame is not None else None
+        
+        if self.warm_running:
+            # The background reader owns the device, use its newest frame
+            self.warm_last_access = time.time()
+            deadline = time.time() + 3.0
+            while self.warm_running and time.time() < deadline:
+                try:
+                    return self.preroll[-1][1]
+                except IndexError:
+                    time.sleep(0.01)
+            return None
+        
         if self.cap is None or not self.cap.isOpened():
             if not self.initialize_camera():
                 return None
@@ -72,10 +208,216 @@ class CameraManager:
             return frame
         return None
     
+    def start_warm_camera(self):
+        """Keep the camera open with a background reader filling the pre-roll buffer"""
+        with self.warm_lock:
+            self.warm_last_access = time.time()
+            if self.warm_running:
+                return True
+            
+            if (self.cap is None or not self.cap.isOpened()) and not self.initialize_camera():
+                return False
+            
+            self.preroll.clear()
+            self.warm_running = True
+            self.warm_thread = threading.Thread(target=self._warm_reader_worker)
+            self.warm_thread.daemon = True
+            self.warm_thread.start()
+            print(f"Warm camera started (idle timeout {self.camera_idle_timeout:.0f}s)")
+            return True
+    
+    def _warm_reader_worker(self):
+        """Worker thread that keeps reading frames into the pre-roll buffer"""
+        frames_read = 0
+        failures = 0
+        
+        while self.warm_running:
+            if time.time() - self.warm_last_access > self.camera_idle_timeout:
+                print("Camera idle, releasing device")
+                break
+            
+            ret, frame = self.cap.read()
+            if not ret:
+                failures += 1
+                if failures > 30:
+                    print("Camera frame not available, stopping warm camera")
+                    break
+                time.sleep(0.05)
+                continue
+            failures = 0
+            
+            # First frames after opening are often dark or stale
+            frames_read += 1
+            if frames_read <= self.warmup_frames:
+                continue
+            
+            with self.frame_condition:
+                self.frame_seq += 1
+                self.preroll.append(({'seq': self.frame_seq, 'capture': time.time()}, frame))
+                self.frame_condition.notify_all()
+        
+        with self.warm_lock:
+            self.warm_running = False
+            self.preroll.clear()
+            if self.cap:
+                self.cap.release()
+                self.cap = None
+        
+        # Wake up consumers waiting in wait_for_frame
+        with self.frame_condition:
+            self.frame_condition.notify_all()
+    
+    def stop_warm_camera(self):
+        """Stop the background reader and release the camera"""
+        self.warm_running = False
+        if self.warm_thread is not None:
+            self.warm_thread.join(timeout=2.0)
+            self.warm_thread = None
+    
+    def wait_for_frame(self, last_seq=0, timeout=2.0):
+        """Return (timing, frame) of the newest grabbed frame after last_seq
+        
+        Older buffered frames are skipped, so a slow consumer always gets the
+        freshest frame instead of working through a backlog.
+        """
+        self.warm_last_access = time.time()
+        with self.frame_condition:
+            if not self.frame_condition.wait_for(
+                lambda: not self.warm_running or (self.preroll and self.preroll[-1][0]['seq'] > last_seq),
+                timeout=timeout
+            ):
+                return None, None
+            if not self.preroll:
+                return None, None
+            timing, frame = self.preroll[-1]
+        
+        timing = dict(timing)
+        timing['dequeue'] = time.time()
+        return timing, frame
+    
+    def _read_frame(self, last_seq=0):
+        """Read the next frame with its timing from the grab thread or the device"""
+        if self.camera_process is not None:
+            return self.camera_process.wait_for_frame(last_seq)
+        
+        if self.warm_running:
+            return self.wait_for_frame(last_seq)
+        
+        ret, frame = self.cap.read()
+        if not ret:
+            return None, None
+        now = time.time()
+        self.frame_seq += 1
+        return {'seq': self.frame_seq, 'capture': now, 'dequeue': now}, frame
+    
+    def _prepare_input(self, frame):
+        """Resize a frame into the next of two reused model input slots
+        
+        The detection loops queue the small model input instead of the
+        frame, so shared-memory frames need no copy. Two slots are enough:
+        the queue holds one input and the inference worker at most one more.
+        """
+        size = self.model.img_size
+        if self.input_slots is None or self.input_slots.shape[1] != size:
+            self.input_slots = aligned_empty((2, size, size, 3))
+            self.input_slot = 0
+        self.input_slot ^= 1
+        return self.model.prepare_frame(frame, self.input_slots[self.input_slot])
+    
+    def _display_copy(self, frame):
+        """Copy of the frame to draw on, in a buffer reused across frames"""
+        if self.display_frame is None or self.display_frame.shape != frame.shape:
+            self.display_frame = np.empty_like(frame)
+        np.copyto(self.display_frame, frame)
+        return self.display_frame
+    
+    def _open_frame_source(self):
+        """Open the camera for a detection loop (grab thread in low-latency mode)"""
+        if self.camera_process is not None:
+            return self.camera_process.start()
+        
+        if self.low_latency:
+            return self.start_warm_camera()
+        
+        self.stop_warm_camera()
+        return self.initialize_camera()
+    
+    def get_best_recent_frame(self, max_age=1.0, wait_timeout=3.0):
+        """Return the sharpest, best exposed frame from the pre-roll buffer"""
+        timing, frame = self._best_recent_entry(max_age, wait_timeout)
+        return frame
+    
+    def _best_recent_entry(self, max_age=1.0, wait_timeout=3.0):
+        """Return (timing, frame) of the best recent pre-roll frame"""
+        if self.camera_process is not None:
+            if not self.camera_process.start():
+                return None, None
+            buffered = self.camera_process.recent_frames()
+        else:
+            if not self.start_warm_camera():
+                return None, None
+            
+            deadline = time.time() + wait_timeout
+            while not self.preroll and time.time() < deadline:
+                time.sleep(0.01)
+            
+            buffered = list(self.preroll)
+        if not buffered:
+            return None, None
+        
+        now = time.time()
+        candidates = [entry for entry in buffered if now - entry[0]['capture'] <= max_age]
+        if not candidates:
+            candidates = buffered[-1:]
+        
+        # Both sources are oldest first and hold copies, so the frame scored is the frame returned
+        timing, frame = max(candidates, key=lambda entry: frame_quality_score(entry[1]))
+        timing = dict(timing)
+        timing['dequeue'] = time.time()
+        return timing, frame
+    
+    def release_camera(self):
+        """Release the camera unless it is kept warm"""
+        if self.warm_running or self.camera_process is not None:
+            # The idle timeout releases a warm camera
+            return
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+    
+    def restart_camera(self):
+        """Restart the camera capture process (process backend only)"""
+        if self.camera_process is None:
+            return False
+        return self.camera_process.restart()
+    
+    def get_stream_jpeg(self):
+        """Return the newest frame as JPEG bytes for MJPEG streaming"""
+        if self.camera_process is not None:
+            # Encoded by the capture process, nothing to do in this process
+            if not self.camera_process.start():
+                return None
+            deadline = time.time() + 2.0
+            while time.time() < deadline:
+                jpeg = self.camera_process.latest_jpeg()
+                if jpeg is not None:
+                    return jpeg
+                time.sleep(0.01)
+            return None
+        
+        frame = self.capture_frame()
+        if frame is None:
+            return None
+        ret, buffer = cv2.imencode('.jpg', frame)
+        return buffer.tobytes() if ret else None
+    
     def save_captured_image(self, frame, filename=None):
-        """Save captured frame to file"""
+        """Save captured frame to file (or to the archive when enabled)"""
+        if self.archive is not None:
+            return self._archive_frame(frame, {'type': 'capture', 'filename': filename})
+        
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             filename = f"captured_{timestamp}.jpg"
         
         # Create directory if not exists
@@ -86,25 +428,32 @@ class CameraManager:
         cv2.imwrite(filepath, frame)
         return filepath
     
-    def predict_frame(self, frame):
-        """Predict disease from frame"""
+    def predict_frame(self, frame, timing=None):
+        """Predict disease from frame
+        
+        If a timing dict is given, inference timestamps are added to it and the
+        frame latency is recorded. Frames rejected by the quality gate (blur,
+        exposure, no foliage) skip the model and come back with rejected=True.
+        """
         try:
-            # Save frame temporarily
-            temp_path = "temp_frame.jpg"
-            cv2.imwrite(temp_path, frame)
+            if timing is not None:
+                timing['inference_start'] = time.time()
+            
+            # Predict straight from the BGR frame (or a prepared input slot)
+            result = self.model.predict_array(frame)
+            if result.get('rejected'):
+                return result
             
-            # Predict
-            result = self.model.predict(temp_path)
+            if timing is not None:
+                timing['inference_end'] = time.time()
+                self.latency.record(timing)
+                result['latency_ms'] = round((timing['inference_end'] - timing['capture']) * 1000.0, 2)
             
             # Get solution if disease detected
             if result['prediction'] != 'healthy' and result['confidence'] >= self.confidence_threshold:
                 solution = self.solution_provider.get_solution(result['prediction'])
                 result['solution'] = solution
             
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             return result
         except Exception as e:
             print(f"Prediction error: {e}")
@@ -112,47 +461,44 @@ class CameraManager:
     
     def start_realtime_detection(self):
         """Start real-time detection mode"""
-        if not self.initialize_camera():
+        if not self._open_frame_source():
             return False
         
         self.is_running = True
+        self.last_prediction = None
         print("Starting real-time detection... Press 'q' to quit, 's' to save frame")
         
-        # Start prediction thread
-        prediction_thread = threading.Thread(target=self._prediction_worker)
+        # Start prediction thread, only the most recent frame is worth predicting
+        frame_queue = Queue(maxsize=1)
+        prediction_thread = threading.Thread(target=self._inference_worker, args=(frame_queue,))
         prediction_thread.daemon = True
         prediction_thread.start()
         
-        last_prediction_time = 0
-        last_prediction = None
+        last_submit_time = 0
+        last_seq = 0
         
         while self.is_running:
-            ret, frame = self.cap.read()
-            if not ret:
+            timing, frame = self._read_frame(last_seq)
+            if frame is None:
                 break
+            last_seq = timing['seq']
             
             # Store current frame
-            self.current_frame = frame.copy()
+            self.current_frame = frame
             
-            # Add prediction to queue every 2 seconds
+            # Add frame for prediction every 2 seconds
             current_time = time.time()
-            if current_time - last_prediction_time > 2.0:
-                if not self.prediction_queue.empty():
-                    try:
-                        last_prediction = self.prediction_queue.get_nowait()
-                        last_prediction_time = current_time
-                    except:
-                        pass
-                
-                # Add current frame for prediction
-                self.prediction_queue.put(frame.copy())
+            if current_time - last_submit_time > 2.0 and frame_queue.empty():
+                frame_queue.put_nowait((timing, self._prepare_input(frame)))
+                last_submit_time = current_time
             
-            # Draw prediction results on frame
-            if last_prediction:
-                self._draw_prediction_on_frame(frame, last_prediction)
+            # Draw prediction results on a copy, the frame is also the stream / pre-roll frame
+            display = self._display_copy(frame)
+            if self.last_prediction:
+                self._draw_prediction_on_frame(display, self.last_prediction)
             
             # Display frame
-            cv2.imshow('Chili Disease Detection - Real-time', frame)
+            cv2.imshow('Chili Disease Detection - Real-time', display)
             
             # Handle key presses
             key = cv2.waitKey(1) & 0xFF
@@ -160,24 +506,182 @@ class CameraManager:
                 break
             elif key == ord('s'):
                 # Save current frame and prediction
-                self._save_detection_result(frame, last_prediction)
+                self._save_detection_result(display, self.last_prediction)
         
         self.stop_detection()
         return True
     
-    def _prediction_worker(self):
+    def start_headless_detection(self, log_path=None, output_video=None, prediction_interval=2.0):
+        """Start real-time detection without GUI (for headless servers)
+        
+        Detections are appended to a JSONL log. The prediction overlay is only
+        drawn while a video is being recorded or a stream viewer is attached.
+        """
+        if not self._open_frame_source():
+            return False
+        
+        if log_path:
+            self.detection_log_path = log_path
+        log_dir = os.path.dirname(self.detection_log_path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        
+        if output_video:
+            self.start_overlay_recording(output_video)
+        
+        self.is_running = True
+        self.last_prediction = None
+        print(f"Starting headless detection... logging to {self.detection_log_path}")
+        
+        # Only the most recent frame is worth predicting, older ones are dropped
+        frame_queue = Queue(maxsize=1)
+        inference_thread = threading.Thread(
+            target=self._inference_worker,
+            args=(frame_queue, True)
+        )
+        inference_thread.daemon = True
+        inference_thread.start()
+        
+        last_submit_time = 0
+        last_seq = 0
+        
+        try:
+            while self.is_running:
+                timing, frame = self._read_frame(last_seq)
+                if frame is None:
+                    print("Camera frame not available, stopping headless detection")
+                    break
+                last_seq = timing['seq']
+                
+                self.current_frame = frame
+                
+                current_time = time.time()
+                if current_time - last_submit_time >= prediction_interval and frame_queue.empty():
+                    frame_queue.put_nowait((timing, self._prepare_input(frame)))
+                    last_submit_time = current_time
+                
+                if self.is_overlay_requested():
+                    self._render_overlay(frame)
+        finally:
+            self.stop_detection()
+        
+        return True
+    
+    def _inference_worker(self, frame_queue, log_detections=False):
         """Worker thread for predictions"""
         while self.is_running:
-            if not self.prediction_queue.empty():
-                try:
-                    frame = self.prediction_queue.get()
-                    prediction = self.predict_frame(frame)
-                    if prediction:
-                        # Store prediction result
-                        self.prediction_queue.put(prediction)
-                except Exception as e:
-                    print(f"Prediction worker error: {e}")
-            time.sleep(0.1)
+            try:
+                timing, frame = frame_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            
+            prediction = self.predict_frame(frame, timing)
+            # Rejected frames keep the last good prediction on screen and raise no alerts
+            if prediction and not prediction.get('rejected'):
+                self.last_prediction = prediction
+                if log_detections:
+                    self._log_detection(prediction)
+    
+    def _log_detection(self, prediction):
+        """Append a detection record to the JSONL log"""
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'prediction': prediction['prediction'],
+            'confidence': prediction['confidence'],
+            'all_predictions': prediction['all_predictions'],
+            'latency_ms': prediction.get('latency_ms'),
+            'alert': (prediction['prediction'] != 'healthy' and
+                      prediction['confidence'] >= self.confidence_threshold)
+        }
+        
+        # Reopen on every write so external log rotation is picked up
+        try:
+            with open(self.detection_log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Detection log error: {e}")
+    
+    def is_overlay_requested(self):
+        """Check whether anyone is consuming the overlay frames"""
+        return self.video_output_path is not None or self.overlay_viewers > 0
+    
+    def _render_overlay(self, frame):
+        """Draw the last prediction on a copy of the frame and publish it"""
+        overlay = frame.copy()
+        self._draw_prediction_on_frame(overlay, self.last_prediction)
+        
+        with self.overlay_lock:
+            if self.video_output_path is not None:
+                if self.video_writer is None:
+                    height, width = overlay.shape[:2]
+                    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
+                    self.video_writer = cv2.VideoWriter(
+                        self.video_output_path, fourcc, self.fps, (width, height)
+                    )
+                self.video_writer.write(overlay)
+            
+            if self.overlay_viewers > 0:
+                self.overlay_frame = overlay
+    
+    def start_overlay_recording(self, output_path):
+        """Start recording the prediction overlay to a video file"""
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        with self.overlay_lock:
+            if self.video_writer is not None:
+                self.video_writer.release()
+                self.video_writer = None
+            self.video_output_path = output_path
+        print(f"Recording overlay to {output_path}")
+    
+    def stop_overlay_recording(self):
+        """Stop recording the prediction overlay"""
+        with self.overlay_lock:
+            if self.video_writer is not None:
+                self.video_writer.release()
+                self.video_writer = None
+            if self.video_output_path is not None:
+                print(f"Overlay recording saved: {self.video_output_path}")
+            self.video_output_path = None
+    
+    def toggle_overlay_recording(self, output_path=None):
+        """Toggle overlay recording on or off"""
+        if self.video_output_path is not None:
+            self.stop_overlay_recording()
+            return False
+        
+        if output_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = os.path.join("captures", f"overlay_{timestamp}.avi")
+        self.start_overlay_recording(output_path)
+        return True
+    
+    def add_overlay_viewer(self):
+        """Register a stream viewer so overlay frames get rendered"""
+        with self.overlay_lock:
+            self.overlay_viewers += 1
+    
+    def remove_overlay_viewer(self):
+        """Unregister a stream viewer"""
+        with self.overlay_lock:
+            self.overlay_viewers = max(0, self.overlay_viewers - 1)
+            if self.overlay_viewers == 0:
+                self.overlay_frame = None
+    
+    def get_headless_status(self):
+        """Get headless detection status"""
+        return {
+            'running': self.is_running,
+            'log_path': self.detection_log_path,
+            'recording': self.video_output_path,
+            'overlay_viewers': self.overlay_viewers,
+            'last_prediction': {
+                'prediction': self.last_prediction['prediction'],
+                'confidence': self.last_prediction['confidence']
+            } if self.last_prediction else None
+        }
     
     def _draw_prediction_on_frame(self, frame, prediction):
         """Draw prediction results on frame"""
@@ -207,9 +711,32 @@ class CameraManager:
         status_color = color if prediction['confidence'] >= self.confidence_threshold else (0, 255, 255)
         cv2.circle(frame, (frame.shape[1] - 30, 30), 15, status_color, -1)
     
+    def _archive_frame(self, frame, metadata):
+        """Append frame and metadata to the capture archive, return its reference"""
+        ret, buffer = cv2.imencode('.jpg', frame)
+        if not ret:
+            raise Exception("Frame encoding failed")
+        return f"archive:{self.archive.append(buffer.tobytes(), metadata)}"
+    
     def _save_detection_result(self, frame, prediction):
         """Save detection result with metadata"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        
+        if self.archive is not None:
+            # Image and metadata go into a single archive record
+            img_path = self._archive_frame(frame, {
+                'type': 'detection',
+                'timestamp': timestamp,
+                'prediction': prediction,
+                'camera_settings': {
+                    'width': self.frame_width,
+                    'height': self.frame_height,
+                    'fps': self.fps
+                }
+            })
+            if prediction and prediction['prediction'] != 'healthy':
+                print(f"Disease detected: {prediction['prediction']} ({prediction['confidence']:.2f})")
+            return img_path
         
         # Save image
         img_filename = f"detection_{timestamp}.jpg"
@@ -237,34 +764,54 @@ class CameraManager:
             print(f"Detection saved: {img_path}")
             if prediction['prediction'] != 'healthy':
                 print(f"Disease detected: {prediction['prediction']} ({prediction['confidence']:.2f})")
+        
+        return img_path
     
-    def capture_and_analyze(self):
-        """Capture single image and analyze"""
-        if not self.initialize_camera():
-            return None
+    def capture_and_analyze(self, countdown=3):
+        """Capture single image and analyze
         
-        print("Capturing image in 3 seconds...")
-        for i in range(3, 0, -1):
-            print(f"{i}...")
-            time.sleep(1)
+        With a warm camera the best recent pre-roll frame is used immediately;
+        API clients are expected to show any countdown themselves.
+        """
+        use_buffer = self.warm_camera or self.camera_process is not None
+        if not use_buffer and (self.cap is None or not self.cap.isOpened()):
+            if not self.initialize_camera():
+                return None
+        
+        if countdown:
+            print(f"Capturing image in {countdown} seconds...")
+            for i in range(countdown, 0, -1):
+                print(f"{i}...")
+                time.sleep(1)
         
         # Capture frame
-        frame = self.capture_frame()
+        if use_buffer:
+            timing, frame = self._best_recent_entry()
+        else:
+            timing, frame = self._read_frame()
         if frame is None:
             print("Failed to capture image")
             return None
         
         print("Image captured! Analyzing...")
         
-        # Save captured image
-        img_path = self.save_captured_image(frame)
+        # Save captured image (the archive stores it with the detection record)
+        img_path = None if self.archive is not None else self.save_captured_image(frame)
         
         # Analyze
-        prediction = self.predict_frame(frame)
+        prediction = self.predict_frame(frame, timing)
+        
+        if prediction and prediction.get('rejected'):
+            print(f"Image rejected ({', '.join(prediction['quality']['reasons'])}), please capture again")
+            return {
+                'image_path': img_path,
+                'prediction': prediction
+            }
         
         if prediction:
             # Save analysis result
-            self._save_detection_result(frame, prediction)
+            detection_path = self._save_detection_result(frame, prediction)
+            img_path = img_path or detection_path
             
             # Display results
             print(f"\nAnalysis Results:")
@@ -288,25 +835,50 @@ class CameraManager:
     def stop_detection(self):
         """Stop detection and release resources"""
         self.is_running = False
+        self.stop_warm_camera()
+        if self.camera_process is not None:
+            self.camera_process.stop()
         
         if self.cap:
             self.cap.release()
+            self.cap = None
         
-        cv2.destroyAllWindows()
+        self.stop_overlay_recording()
+        
+        if self.archive is not None:
+            self.archive.flush()
+        
+        try:
+            cv2.destroyAllWindows()
+        except cv2.error:
+            # Headless OpenCV builds have no GUI backend
+            pass
         print("Detection stopped")
     
     def get_camera_status(self):
         """Get camera status"""
         try:
+            if self.camera_process is not None:
+                status = self.camera_process.get_status()
+                status['latency'] = self.latency.summary()
+                status['quality_gate'] = self.model.quality_gate.stats()
+                return status
+            
             if self.cap and self.cap.isOpened():
                 return {
                     'status': 'connected',
                     'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
                     'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                    'fps': int(self.cap.get(cv2.CAP_PROP_FPS))
+                    'fps': int(self.cap.get(cv2.CAP_PROP_FPS)),
+                    'warm': self.warm_running,
+                    'preroll_frames': len(self.preroll),
+                    'capture_profile': self.capture_profile,
+                    'latency': self.latency.summary(),
+                    'quality_gate': self.model.quality_gate.stats()
                 }
             else:
-                return {'status': 'disconnected'}
+                return {'status': 'disconnected', 'latency': self.latency.summary(),
+                        'quality_gate': self.model.quality_gate.stats()}
         except:
             return {'status': 'error'}
 
@@ -0,0 +1,480 @@
+import json
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Record layout in a segment data file: header + JPEG bytes + compact JSON metadata
+RECORD_MAGIC = b'CAPR'
+RECORD_HEADER = struct.Struct('<4sqII')  # magic, timestamp_us, image_len, meta_len
+
+# Fixed-size index entry, one per record: timestamp_us, offset, image_len, meta_len
+INDEX_ENTRY = struct.Struct('<qQII')
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class CaptureArchive:
+    """Append-only segmented archive untuk gambar capture dan metadata deteksi
+
+    Records are appended to rotating segment files (one or more per day) with a
+    fixed-size offset index next to each segment. A small manifest lists the
+    segments and their time ranges, so time-range lookups never scan the
+    directory. Records are referenced as ``<segment>:<timestamp_us>``.
+    """
+
+    def __init__(self, root=None, max_segment_mb=None, fsync_every=None,
+                 retention_days=None, retention_mb=None):
+        self.root = root or os.getenv('CAPTURE_ARCHIVE_DIR', 'captures/archive')
+        self.max_segment_bytes = int(
+            max_segment_mb if max_segment_mb is not None else os.getenv('ARCHIVE_SEGMENT_MB', 64)
+        ) * 1024 * 1024
+        self.fsync_every = int(
+            fsync_every if fsync_every is not None else os.getenv('ARCHIVE_FSYNC_EVERY', 16)
+        )
+        self.fsync_interval = float(os.getenv('ARCHIVE_FSYNC_INTERVAL', 5.0))
+        days = retention_days if retention_days is not None else os.getenv('ARCHIVE_RETENTION_DAYS')
+        self.retention_days = float(days) if days else None
+        size_mb = retention_mb if retention_mb is not None else os.getenv('ARCHIVE_RETENTION_MB')
+        self.retention_bytes = int(float(size_mb) * 1024 * 1024) if size_mb else None
+
+        self.lock = threading.Lock()
+        self.segments = []
+        self.active = None
+        self.data_file = None
+        self.index_file = None
+        self.last_timestamp_us = 0
+        self.pending_records = 0
+        self.last_fsync_time = time.time()
+        # Background flusher, so ARCHIVE_FSYNC_INTERVAL also holds when appends stop
+        self.flusher = None
+        self.flusher_stop = threading.Event()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load_manifest()
+        self._recover_active_segment()
+
+    # ------------------------------------------------------------------
+    # Manifest and recovery
+    # ------------------------------------------------------------------
+
+    def _path(self, name, ext):
+        return os.path.join(self.root, f"{name}.{ext}")
+
+    def _load_manifest(self):
+        """Load segment list from manifest (rebuilt from index files if missing)"""
+        manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.segments = json.load(f).get('segments', [])
+            return
+
+        # One-time rebuild, e.g. after the manifest was deleted by hand
+        names = sorted(f[:-4] for f in os.listdir(self.root) if f.endswith('.idx'))
+        for name in names:
+            entries = self._read_index(name)
+            self.segments.append({
+                'name': name,
+                'day': name.split('_')[1],
+                'start_us': entries[0][0] if entries else 0,
+                'end_us': entries[-1][0] if entries else 0,
+                'records': len(entries),
+                'bytes': os.path.getsize(self._path(name, 'dat'))
+            })
+        self._write_manifest()
+
+    def _write_manifest(self):
+        """Atomically rewrite the manifest"""
+        manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'segments': self.segments}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+
+    def _recover_active_segment(self):
+        """Truncate a torn write at the tail of the last segment"""
+        if not self.segments:
+            return
+
+        segment = self.segments[-1]
+        name = segment['name']
+        data_path = self._path(name, 'dat')
+        index_path = self._path(name, 'idx')
+        if not os.path.exists(data_path) or not os.path.exists(index_path):
+            self.segments.pop()
+            self._write_manifest()
+            return
+
+        data_size = os.path.getsize(data_path)
+        entries = self._read_index(name)
+
+        # Drop index entries whose record did not fully reach the data file
+        valid = len(entries)
+        while valid > 0:
+            ts, offset, image_len, meta_len = entries[valid - 1]
+            if offset + RECORD_HEADER.size + image_len + meta_len <= data_size:
+                break
+            valid -= 1
+        entries = entries[:valid]
+
+        end_offset = 0
+        if entries:
+            ts, offset, image_len, meta_len = entries[-1]
+            end_offset = offset + RECORD_HEADER.size + image_len + meta_len
+
+        with open(index_path, 'r+b') as f:
+            f.truncate(valid * INDEX_ENTRY.size)
+        with open(data_path, 'r+b') as f:
+            f.truncate(end_offset)
+
+        segment['records'] = valid
+        segment['bytes'] = end_offset
+        if entries:
+            segment['start_us'] = entries[0][0]
+            segment['end_us'] = entries[-1][0]
+            self.last_timestamp_us = entries[-1][0]
+        self._write_manifest()
+
+    def _read_index(self, name):
+        """Read all index entries of a segment"""
+        index_path = self._path(name, 'idx')
+        if not os.path.exists(index_path):
+            return []
+        with open(index_path, 'rb') as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        return list(INDEX_ENTRY.iter_unpack(raw[:usable]))
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _open_segment(self, day):
+        """Open a new segment for the given day (YYYYMMDD)"""
+        self._close_files()
+
+        seq = sum(1 for s in self.segments if s['day'] == day)
+        name = f"seg_{day}_{seq:04d}"
+        while os.path.exists(self._path(name, 'dat')):
+            seq += 1
+            name = f"seg_{day}_{seq:04d}"
+
+        self.segments.append({
+            'name': name,
+            'day': day,
+            'start_us': 0,
+            'end_us': 0,
+            'records': 0,
+            'bytes': 0
+        })
+        self.active = self.segments[-1]
+        self.data_file = open(self._path(name, 'dat'), 'ab')
+        self.index_file = open(self._path(name, 'idx'), 'ab')
+
+        # Segment rollover is a natural point to enforce retention
+        if self.retention_days is not None or self.retention_bytes is not None:
+            self._apply_retention(time.time())
+        self._write_manifest()
+
+    def _resume_segment(self, segment):
+        """Reopen the last segment for appending"""
+        self.active = segment
+        self.data_file = open(self._path(segment['name'], 'dat'), 'ab')
+        self.index_file = open(self._path(segment['name'], 'idx'), 'ab')
+
+    def _close_files(self):
+        if self.data_file is not None:
+            self._fsync()
+            self.data_file.close()
+            self.index_file.close()
+        self.data_file = None
+        self.index_file = None
+        self.active = None
+
+    def append(self, image_bytes, metadata, timestamp=None):
+        """Append one capture (JPEG bytes + metadata dict), return its reference"""
+        timestamp = time.time() if timestamp is None else timestamp
+        meta_bytes = json.dumps(metadata, separators=(',', ':'), default=str).encode('utf-8')
+        record_size = RECORD_HEADER.size + len(image_bytes) + len(meta_bytes)
+
+        with self.lock:
+            # Strictly increasing timestamps keep references unique and the index sorted
+            timestamp_us = max(int(timestamp * 1_000_000), self.last_timestamp_us + 1)
+            day = datetime.fromtimestamp(timestamp_us / 1_000_000).strftime('%Y%m%d')
+
+            if self.active is None and self.segments and self.segments[-1]['day'] == day:
+                self._resume_segment(self.segments[-1])
+
+            if (self.active is None or self.active['day'] != day or
+                    (self.active['records'] > 0 and
+                     self.active['bytes'] + record_size > self.max_segment_bytes)):
+                self._open_segment(day)
+
+            offset = self.active['bytes']
+            self.data_file.write(RECORD_HEADER.pack(
+                RECORD_MAGIC, timestamp_us, len(image_bytes), len(meta_bytes)
+            ))
+            self.data_file.write(image_bytes)
+            self.data_file.write(meta_bytes)
+            self.index_file.write(INDEX_ENTRY.pack(
+                timestamp_us, offset, len(image_bytes), len(meta_bytes)
+            ))
+
+            if self.active['records'] == 0:
+                self.active['start_us'] = timestamp_us
+            self.active['end_us'] = timestamp_us
+            self.active['records'] += 1
+            self.active['bytes'] += record_size
+            self.last_timestamp_us = timestamp_us
+
+            self.pending_records += 1
+            if (self.pending_records >= self.fsync_every or
+                    time.time() - self.last_fsync_time >= self.fsync_interval):
+                self._fsync()
+            elif self.flusher is None and self.fsync_interval > 0:
+                self._start_flusher()
+
+            return f"{self.active['name']}:{timestamp_us}"
+
+    def _fsync(self):
+        """Flush pending records to disk and persist the manifest"""
+        if self.data_file is None:
+            return
+        self.data_file.flush()
+        os.fsync(self.data_file.fileno())
+        self.index_file.flush()
+        os.fsync(self.index_file.fileno())
+        self._write_manifest()
+        self.pending_records = 0
+        self.last_fsync_time = time.time()
+
+    def flush(self):
+        """Force pending records to disk"""
+        with self.lock:
+            self._fsync()
+
+    def _start_flusher(self):
+        self.flusher_stop.clear()
+        self.flusher = threading.Thread(target=self._flusher_worker)
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _flusher_worker(self):
+        """Fsync records left pending for fsync_interval, e.g. after the last frame of a session"""
+        delay = self.fsync_interval
+        while not self.flusher_stop.wait(timeout=delay):
+            with self.lock:
+                if self.pending_records and time.time() - self.last_fsync_time >= self.fsync_interval:
+                    self._fsync()
+                # Wake again when pending records are due
+                delay = self.fsync_interval
+                if self.pending_records:
+                    delay = max(self.last_fsync_time + self.fsync_interval - time.time(), 0.05)
+
+    def close(self):
+        """Flush and close the active segment"""
+        flusher, self.flusher = self.flusher, None
+        if flusher is not None:
+            self.flusher_stop.set()
+            flusher.join(timeout=5.0)
+        with self.lock:
+            self._close_files()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _flush_for_read(self, name):
+        """Make buffered writes of the active segment visible to readers"""
+        if self.active is not None and self.active['name'] == name:
+            self.data_file.flush()
+            self.index_file.flush()
+
+    def query(self, start=None, end=None, include_images=False):
+        """Return captures with start <= timestamp < end (epoch seconds or datetime)"""
+        start_us = self._to_us(start) if start is not None else None
+        end_us = self._to_us(end) if end is not None else None
+
+        results = []
+        with self.lock:
+            for segment in self.segments:
+                if segment['records'] == 0:
+                    continue
+                if end_us is not None and segment['start_us'] >= end_us:
+                    continue
+                if start_us is not None and segment['end_us'] < start_us:
+                    continue
+
+                self._flush_for_read(segment['name'])
+                entries = self._read_index(segment['name'])
+                timestamps = [entry[0] for entry in entries]
+                lo = bisect_left(timestamps, start_us) if start_us is not None else 0
+                hi = bisect_left(timestamps, end_us) if end_us is not None else len(entries)
+                if lo >= hi:
+                    continue
+
+                with open(self._path(segment['name'], 'dat'), 'rb') as f:
+                    for timestamp_us, offset, image_len, meta_len in entries[lo:hi]:
+                        image_bytes, metadata = self._read_record(f, offset, image_len, meta_len,
+                                                                  include_images)
+                        result = {
+                            'ref': f"{segment['name']}:{timestamp_us}",
+                            'timestamp': datetime.fromtimestamp(timestamp_us / 1_000_000).isoformat(),
+                            'metadata': metadata
+                        }
+                        if include_images:
+                            result['image'] = image_bytes
+                        results.append(result)
+        return results
+
+    def list_day(self, day, include_images=False):
+        """Return all captures of one day (date, datetime or 'YYYYMMDD')"""
+        if isinstance(day, str):
+            day = datetime.strptime(day, '%Y%m%d')
+        start = datetime(day.year, day.month, day.day)
+        return self.query(start, start + timedelta(days=1), include_images=include_images)
+
+    def read(self, ref):
+        """Read one capture by reference, return (image_bytes, metadata)"""
+        name, timestamp_us = ref.rsplit(':', 1)
+        timestamp_us = int(timestamp_us)
+
+        with self.lock:
+            if not any(s['name'] == name for s in self.segments):
+                raise KeyError(f"Unknown archive segment: {name}")
+
+            self._flush_for_read(name)
+            entries = self._read_index(name)
+            timestamps = [entry[0] for entry in entries]
+            pos = bisect_left(timestamps, timestamp_us)
+            if pos >= len(entries) or timestamps[pos] != timestamp_us:
+                raise KeyError(f"Capture not found: {ref}")
+
+            _, offset, image_len, meta_len = entries[pos]
+            with open(self._path(name, 'dat'), 'rb') as f:
+                return self._read_record(f, offset, image_len, meta_len)
+
+    def _read_record(self, f, offset, image_len, meta_len, include_image=True):
+        """Image bytes (None unless include_image) and metadata of the record at offset"""
+        f.seek(offset)
+        magic, _, stored_image_len, stored_meta_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+        if magic != RECORD_MAGIC or stored_image_len != image_len or stored_meta_len != meta_len:
+            raise ValueError(f"Corrupt archive record at offset {offset}")
+        if include_image:
+            image_bytes = f.read(image_len)
+        else:
+            # Metadata-only listings skip the JPEG instead of reading it
+            image_bytes = None
+            f.seek(image_len, os.SEEK_CUR)
+        metadata = json.loads(f.read(meta_len).decode('utf-8'))
+        return image_bytes, metadata
+
+    @staticmethod
+    def _to_us(value):
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        return int(value * 1_000_000)
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def apply_retention(self, now=None):
+        """Drop or compact segments beyond the age and size limits"""
+        now = time.time() if now is None else now
+        with self.lock:
+            stats = self._apply_retention(now)
+            self._write_manifest()
+        return stats
+
+    def _apply_retention(self, now):
+        stats = {'segments_removed': 0, 'segments_compacted': 0, 'bytes_freed': 0}
+        active_name = self.active['name'] if self.active else None
+
+        if self.retention_days is not None:
+            cutoff_us = int((now - self.retention_days * 86400) * 1_000_000)
+            for segment in list(self.segments):
+                if segment['name'] == active_name or segment['records'] == 0:
+                    continue
+                if segment['end_us'] < cutoff_us:
+                    stats['bytes_freed'] += self._remove_segment(segment)
+                    stats['segments_removed'] += 1
+                elif segment['start_us'] < cutoff_us:
+                    stats['bytes_freed'] += self._compact_segment(segment, cutoff_us)
+                    stats['segments_compacted'] += 1
+
+        if self.retention_bytes is not None:
+            total = sum(s['bytes'] for s in self.segments)
+            for segment in list(self.segments):
+                if total <= self.retention_bytes:
+                    break
+                if segment['name'] == active_name:
+                    continue
+                freed = self._remove_segment(segment)
+                total -= freed
+                stats['bytes_freed'] += freed
+                stats['segments_removed'] += 1
+
+        return stats
+
+    def _remove_segment(self, segment):
+        """Delete a whole segment, return freed bytes"""
+        self.segments.remove(segment)
+        for ext in ('dat', 'idx'):
+            path = self._path(segment['name'], ext)
+            if os.path.exists(path):
+                os.remove(path)
+        return segment['bytes']
+
+    def _compact_segment(self, segment, cutoff_us):
+        """Rewrite a segment keeping only records at or after cutoff_us"""
+        name = segment['name']
+        entries = self._read_index(name)
+        timestamps = [entry[0] for entry in entries]
+        keep_from = bisect_left(timestamps, cutoff_us)
+        kept = entries[keep_from:]
+        if not kept:
+            return self._remove_segment(segment)
+
+        data_tmp = self._path(name, 'dat.tmp')
+        index_tmp = self._path(name, 'idx.tmp')
+        new_offset = 0
+        with open(self._path(name, 'dat'), 'rb') as src, \
+                open(data_tmp, 'wb') as data_out, open(index_tmp, 'wb') as index_out:
+            # Surviving records are contiguous at the tail, copy them sequentially
+            src.seek(kept[0][1])
+            for timestamp_us, offset, image_len, meta_len in kept:
+                record_size = RECORD_HEADER.size + image_len + meta_len
+                data_out.write(src.read(record_size))
+                index_out.write(INDEX_ENTRY.pack(timestamp_us, new_offset, image_len, meta_len))
+                new_offset += record_size
+            for f in (data_out, index_out):
+                f.flush()
+                os.fsync(f.fileno())
+
+        os.replace(data_tmp, self._path(name, 'dat'))
+        os.replace(index_tmp, self._path(name, 'idx'))
+
+        freed = segment['bytes'] - new_offset
+        segment['start_us'] = kept[0][0]
+        segment['records'] = len(kept)
+        segment['bytes'] = new_offset
+        return freed
+
+    def get_stats(self):
+        """Get archive statistics"""
+        with self.lock:
+            return {
+                'root': self.root,
+                'segments': len(self.segments),
+                'records': sum(s['records'] for s in self.segments),
+                'bytes': sum(s['bytes'] for s in self.segments),
+                'days': sorted({s['day'] for s in self.segments})
+            }
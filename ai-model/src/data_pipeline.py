@@ -0,0 +1,181 @@
+import os
+import time
+import tensorflow as tf
+from tensorflow.keras import layers
+from tensorflow.keras.callbacks import Callback
+
+try:
+    from preprocessing import TF_RESIZE_METHODS
+except ImportError:
+    from .preprocessing import TF_RESIZE_METHODS
+
+AUTOTUNE = tf.data.AUTOTUNE
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_image_files(directory):
+    """List image paths and integer labels, one class per sub-folder
+
+    Class folders are sorted alphabetically, the same order
+    flow_from_directory uses, so labels match ChiliDiseaseModel.classes.
+    """
+    class_dirs = sorted(
+        d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))
+    )
+    paths, labels = [], []
+    for label, class_dir in enumerate(class_dirs):
+        class_path = os.path.join(directory, class_dir)
+        for filename in sorted(os.listdir(class_path)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_path, filename))
+                labels.append(label)
+    return paths, labels, class_dirs
+
+
+def build_augmenter(seed=42):
+    """Batch-level augmentation matching the ImageDataGenerator settings
+
+    rotation 20 deg, width/height shift 0.2, zoom 0.2, horizontal flip and
+    brightness 0.8-1.2. The 0.1 degree shear of the generator path is
+    negligible and left out.
+    """
+    return tf.keras.Sequential([
+        layers.RandomFlip('horizontal', seed=seed),
+        layers.RandomRotation(20 / 360, fill_mode='nearest', seed=seed),
+        layers.RandomTranslation(0.2, 0.2, fill_mode='nearest', seed=seed),
+        layers.RandomZoom(0.2, fill_mode='nearest', seed=seed),
+    ], name='augmentation')
+
+
+def _random_brightness(images, generator, low=0.8, high=1.2):
+    """Multiply each image by a random factor like brightness_range does"""
+    factors = generator.uniform([tf.shape(images)[0], 1, 1, 1], low, high)
+    return tf.clip_by_value(images * factors, 0.0, 255.0)
+
+
+def decode_and_resize(path, img_size, resample='nearest'):
+    """Read, decode and resize one image to uint8 (img_size, img_size, 3)
+
+    `resample` is one of the DECODE_RESAMPLE filters, so training sees
+    the same resize as serving (nearest, like ImageDataGenerator).
+    """
+    data = tf.io.read_file(path)
+    image = tf.io.decode_image(data, channels=3, expand_animations=False)
+    image = tf.image.resize(image, (img_size, img_size), method=TF_RESIZE_METHODS[resample],
+                            antialias=resample != 'nearest')
+    return tf.cast(tf.round(tf.cast(image, tf.float32)), tf.uint8)
+
+
+def build_dataset(directory, img_size, batch_size, num_classes, training=False,
+                  cache=True, shuffle_buffer=1000, seed=42, num_shards=1, shard_index=0,
+                  repeat=False, start_epoch=0, augmenter=None, resample='nearest'):
+    """Build a tf.data pipeline for one split
+
+    Files are read and decoded in parallel, decoded uint8 images are cached,
+    augmentation runs vectorized on whole batches and batches are prefetched.
+    With num_shards > 1 only every num_shards-th file is read, so each
+    distributed worker decodes its own part of the split. The shuffle
+    order of each epoch depends only on the epoch number, so a resumed run
+    (start_epoch) continues the sequence instead of replaying epoch 0.
+    Returns (dataset, number of images in this shard).
+    """
+    paths, labels, _ = list_image_files(directory)
+    paths, labels = paths[shard_index::num_shards], labels[shard_index::num_shards]
+    num_images = len(paths)
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(
+        lambda path, label: (decode_and_resize(path, img_size, resample), label),
+        num_parallel_calls=AUTOTUNE,
+        # Still decoded in parallel; a fixed order keeps the cached (and so the shuffled) order reproducible
+        deterministic=True
+    )
+
+    if cache:
+        # A path caches to disk (TF_DATA_CACHE), otherwise in memory
+        cache_path = os.getenv('TF_DATA_CACHE', '')
+        if cache_path:
+            split = os.path.basename(os.path.normpath(directory))
+            suffix = f"_{shard_index}of{num_shards}" if num_shards > 1 else ''
+            ds = ds.cache(f"{cache_path}_{split}_{img_size}_{resample}{suffix}")
+        else:
+            ds = ds.cache()
+
+    if training:
+        epoch = {'count': start_epoch}
+        buffer_size = max(1, min(shuffle_buffer, num_images))
+        images = ds
+
+        def epoch_numbers():
+            # One number per pass over the data, or an endless sequence when repeating
+            while True:
+                epoch['count'] += 1
+                yield epoch['count']
+                if not repeat:
+                    return
+
+        # The cache is shared by all passes, only the shuffle seed changes
+        ds = tf.data.Dataset.from_generator(
+            epoch_numbers, output_signature=tf.TensorSpec(shape=(), dtype=tf.int64)
+        ).flat_map(lambda number: images.shuffle(buffer_size, seed=seed + number, reshuffle_each_iteration=False))
+        # flat_map hides the size, Keras needs it to end an epoch without a steps_per_epoch
+        ds = ds.apply(tf.data.experimental.assert_cardinality(
+            tf.data.INFINITE_CARDINALITY if repeat else num_images))
+    elif repeat:
+        ds = ds.repeat()
+
+    ds = ds.batch(batch_size)
+    return finalize_batches(ds, num_classes, training, seed, augmenter), num_images
+
+
+def finalize_batches(ds, num_classes, training=False, seed=42, augmenter=None):
+    """Augment (training only), normalize and prefetch uint8 (images, labels) batches
+
+    Pass a built augmenter to keep its seed-generator state, e.g. to checkpoint it.
+    """
+    if training:
+        augmenter = augmenter or build_augmenter(seed)
+        # Brightness factors come from the global generator, whose state TrainingCheckpoint saves
+        generator = tf.random.get_global_generator()
+
+        def augment(images, batch_labels):
+            images = tf.cast(images, tf.float32)
+            images = augmenter(images, training=True)
+            images = _random_brightness(images, generator)
+            return images, batch_labels
+
+        ds = ds.map(augment, num_parallel_calls=AUTOTUNE)
+
+    def finalize(images, batch_labels):
+        images = tf.cast(images, tf.float32) / 255.0
+        return images, tf.one_hot(batch_labels, num_classes)
+
+    ds = ds.map(finalize, num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+class ThroughputCallback(Callback):
+    """Report training images/sec per epoch (validation time excluded)"""
+
+    def __init__(self, samples_per_epoch):
+        super().__init__()
+        self.samples_per_epoch = samples_per_epoch
+        self.epoch_start = None
+        self.train_end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+        self.train_end = None
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.train_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.epoch_start is None or self.train_end is None:
+            return
+        train_time = self.train_end - self.epoch_start
+        images_per_sec = self.samples_per_epoch / train_time if train_time > 0 else 0.0
+        print(f"Epoch {epoch + 1}: {images_per_sec:.1f} images/sec ({train_time:.1f}s)")
+        if logs is not None:
+            # Ends up in history.history next to accuracy and loss
+            logs['images_per_sec'] = images_per_sec
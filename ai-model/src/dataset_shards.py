@@ -0,0 +1,201 @@
+import os
+import json
+import hashlib
+import numpy as np
+import tensorflow as tf
+
+# Use absolute imports when available, fallback to relative
+try:
+    from data_pipeline import list_image_files, decode_and_resize
+except ImportError:
+    from .data_pipeline import list_image_files, decode_and_resize
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def is_shard_dir(path):
+    """Check whether a directory holds compiled dataset shards"""
+    return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def file_hash(path):
+    """SHA-1 of the file contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compile_split(split_dir, output_dir, img_size, shard_size=1024, rebuild=False, resample='nearest'):
+    """Decode and resize one split once into uint8 .npy shards
+
+    Each shard is an (N, img_size, img_size, 3) uint8 array plus an int32
+    label array. The manifest maps source file hashes to their shard slot,
+    so later runs only decode images that were added; removed images are
+    dropped from the manifest and skipped by the loader. Images are resized
+    with `resample` (a DECODE_RESAMPLE filter); changing it rebuilds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    manifest = None
+    if os.path.exists(manifest_path) and not rebuild:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['img_size'] != img_size:
+            print(f"Image size changed ({manifest['img_size']} -> {img_size}), rebuilding")
+            manifest = None
+        elif manifest.get('resample', 'bilinear') != resample:
+            print(f"Resize filter changed ({manifest.get('resample', 'bilinear')} -> {resample}), rebuilding")
+            manifest = None
+
+    paths, labels, class_dirs = list_image_files(split_dir)
+
+    if manifest is None:
+        for filename in os.listdir(output_dir):
+            if filename.startswith('shard_') and filename.endswith('.npy'):
+                os.remove(os.path.join(output_dir, filename))
+        manifest = {'img_size': img_size, 'resample': resample, 'classes': class_dirs, 'shards': [], 'entries': {}}
+    elif manifest['classes'] != class_dirs:
+        raise ValueError(f"Class folders changed: {manifest['classes']} -> {class_dirs}, use rebuild")
+
+    # Hash sources to find new and removed images
+    current = {}
+    for path, label in zip(paths, labels):
+        current.setdefault(file_hash(path), (path, label))
+
+    removed = [h for h in manifest['entries'] if h not in current]
+    for h in removed:
+        del manifest['entries'][h]
+
+    new_items = [(h, path, label) for h, (path, label) in current.items()
+                 if h not in manifest['entries']]
+
+    print(f"{split_dir}: {len(current)} images, {len(new_items)} new, {len(removed)} removed")
+
+    for start in range(0, len(new_items), shard_size):
+        chunk = new_items[start:start + shard_size]
+        shard_id = len(manifest['shards'])
+        images_file = f"shard_{shard_id:04d}.npy"
+        labels_file = f"shard_{shard_id:04d}_labels.npy"
+
+        images = np.lib.format.open_memmap(
+            os.path.join(output_dir, images_file), mode='w+', dtype=np.uint8,
+            shape=(len(chunk), img_size, img_size, 3)
+        )
+
+        # Parallel decode, written sequentially into the memory-mapped shard
+        decode_ds = tf.data.Dataset.from_tensor_slices([path for _, path, _ in chunk])
+        decode_ds = decode_ds.map(
+            lambda path: decode_and_resize(path, img_size, resample),
+            num_parallel_calls=tf.data.AUTOTUNE
+        ).batch(64).prefetch(tf.data.AUTOTUNE)
+
+        offset = 0
+        for batch in decode_ds:
+            batch = batch.numpy()
+            images[offset:offset + len(batch)] = batch
+            offset += len(batch)
+        images.flush()
+        del images
+
+        np.save(os.path.join(output_dir, labels_file),
+                np.array([label for _, _, label in chunk], dtype=np.int32))
+
+        manifest['shards'].append({'images': images_file, 'labels': labels_file, 'count': len(chunk)})
+        for index, (h, path, label) in enumerate(chunk):
+            manifest['entries'][h] = {
+                'path': os.path.relpath(path, split_dir),
+                'label': label,
+                'shard': shard_id,
+                'index': index
+            }
+
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    return {
+        'images': len(manifest['entries']),
+        'added': len(new_items),
+        'removed': len(removed),
+        'shards': len(manifest['shards'])
+    }
+
+
+class ShardedSplit:
+    """Read-only view of a compiled split backed by memory-mapped shards
+
+    Pages are shared through the OS page cache, so several training or
+    evaluation processes can read the same split without extra RAM.
+    """
+
+    def __init__(self, shard_dir):
+        with open(os.path.join(shard_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+
+        self.shard_dir = shard_dir
+        self.img_size = manifest['img_size']
+        # Shards compiled before the filter was recorded were resized bilinearly
+        self.resample = manifest.get('resample', 'bilinear')
+        self.classes = manifest['classes']
+        self.shards = [
+            np.load(os.path.join(shard_dir, shard['images']), mmap_mode='r')
+            for shard in manifest['shards']
+        ]
+
+        # Sorted (shard, index) pairs of live entries keep reads sequential
+        live = sorted((e['shard'], e['index'], e['label'], e['path'])
+                      for e in manifest['entries'].values())
+        self.shard_ids = np.array([item[0] for item in live], dtype=np.int32)
+        self.indices = np.array([item[1] for item in live], dtype=np.int64)
+        self.labels = np.array([item[2] for item in live], dtype=np.int32)
+        self.paths = [item[3] for item in live]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def get_images(self, positions):
+        """Gather uint8 images for sorted entry positions"""
+        positions = np.asarray(positions)
+        batch = np.empty((len(positions), self.img_size, self.img_size, 3), dtype=np.uint8)
+        for shard_id in np.unique(self.shard_ids[positions]):
+            mask = self.shard_ids[positions] == shard_id
+            batch[mask] = self.shards[shard_id][self.indices[positions[mask]]]
+        return batch
+
+    def iter_batches(self, batch_size, shuffle=False, seed=42, num_shards=1, shard_index=0):
+        """Yield (uint8 images, labels) batches, optionally of one worker's shard"""
+        order = np.arange(len(self))[shard_index::num_shards]
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            if shuffle:
+                positions = np.sort(positions)
+            yield self.get_images(positions), self.labels[positions]
+
+    def to_dataset(self, batch_size, shuffle=False, num_shards=1, shard_index=0, start_epoch=0):
+        """tf.data dataset of uint8 (images, labels) batches read from the shards
+
+        The shuffle order of each epoch depends only on the epoch number, so
+        a resumed run (start_epoch) sees the same order as an uninterrupted one.
+        """
+        size = self.img_size
+        epoch = {'count': start_epoch}
+
+        def generator():
+            # A new shuffle order each epoch
+            epoch['count'] += 1
+            yield from self.iter_batches(batch_size, shuffle=shuffle, seed=epoch['count'],
+                                         num_shards=num_shards, shard_index=shard_index)
+
+        return tf.data.Dataset.from_generator(
+            generator,
+            output_signature=(
+                tf.TensorSpec(shape=(None, size, size, 3), dtype=tf.uint8),
+                tf.TensorSpec(shape=(None,), dtype=tf.int32)
+            )
+        )
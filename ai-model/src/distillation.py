@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications import MobileNetV2, MobileNetV3Small
+from tensorflow.keras.layers import (Activation, Concatenate, Dense, Dropout, GlobalAveragePooling2D,
+                                     Input, Lambda, Resizing)
+from tensorflow.keras.models import Model
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+
+# name -> (backbone, alpha, input size)
+STUDENT_VARIANTS = {
+    'mnv2_035_224': ('mobilenet_v2', 0.35, 224),
+    'mnv2_035_128': ('mobilenet_v2', 0.35, 128),
+    'mnv2_050_160': ('mobilenet_v2', 0.5, 160),
+    'mnv3s_100_224': ('mobilenet_v3_small', 1.0, 224),
+    'mnv3s_075_160': ('mobilenet_v3_small', 0.75, 160),
+}
+
+
+def student_filename(variant):
+    """File name of a saved student
+
+    MobileNetV3 students use the .keras format, their hard-swish ops do not
+    round-trip through legacy .h5 files.
+    """
+    extension = '.keras' if STUDENT_VARIANTS[variant][0] == 'mobilenet_v3_small' else '.h5'
+    return f"chili_disease_student_{variant}{extension}"
+
+
+def build_student(variant, num_classes, dropout_rate=0.2, weights='imagenet'):
+    """Student classifier returning (logits model, softmax model)
+
+    Both share all layers; the logits model is used for distillation and
+    the softmax model is what gets saved. Students take the same 0-1 input
+    as ChiliDiseaseModel, so they work with the normal predict path.
+    """
+    backbone_name, alpha, img_size = STUDENT_VARIANTS[variant]
+    input_shape = (img_size, img_size, 3)
+
+    if backbone_name == 'mobilenet_v2':
+        backbone = MobileNetV2(weights=weights, include_top=False, input_shape=input_shape, alpha=alpha)
+    else:
+        backbone = MobileNetV3Small(weights=weights, include_top=False, input_shape=input_shape,
+                                    alpha=alpha, include_preprocessing=False)
+
+    x = GlobalAveragePooling2D()(backbone.output)
+    x = Dropout(dropout_rate)(x)
+    logits = Dense(num_classes, name='logits')(x)
+
+    logits_model = Model(inputs=backbone.input, outputs=logits, name=f"student_{variant}")
+    predictions = Activation('softmax', name='predictions')(logits)
+    student = Model(inputs=backbone.input, outputs=predictions, name=variant)
+    return logits_model, student
+
+
+def distillation_loss(num_classes, temperature=4.0, alpha=0.1):
+    """Hard-label cross-entropy plus KL divergence to the teacher soft targets
+
+    y_pred is [student logits | teacher log-probabilities]; alpha weights the
+    hard labels, the soft term is scaled by temperature^2 to keep gradient
+    magnitudes independent of the temperature.
+    """
+    def loss(y_true, y_pred):
+        student_logits = y_pred[:, :num_classes]
+        teacher_log_probs = y_pred[:, num_classes:]
+
+        hard = tf.keras.losses.categorical_crossentropy(y_true, student_logits, from_logits=True)
+
+        soft_targets = tf.nn.softmax(teacher_log_probs / temperature)
+        soft_log_student = tf.nn.log_softmax(student_logits / temperature)
+        soft = tf.reduce_sum(
+            soft_targets * (tf.math.log(soft_targets + 1e-8) - soft_log_student), axis=-1
+        ) * temperature ** 2
+
+        return alpha * hard + (1.0 - alpha) * soft
+    return loss
+
+
+def student_accuracy(num_classes):
+    def accuracy(y_true, y_pred):
+        return tf.keras.metrics.categorical_accuracy(y_true, y_pred[:, :num_classes])
+    accuracy.__name__ = 'student_accuracy'
+    return accuracy
+
+
+def build_distiller(teacher, logits_model, num_classes, learning_rate, temperature, alpha):
+    """Train-time model: frozen teacher and student side by side on one input
+
+    Batches come at the teacher's input size and are resized for the
+    student inside the model, so one input pipeline feeds both.
+    """
+    teacher.trainable = False
+    teacher_size = teacher.input_shape[1]
+    student_size = logits_model.input_shape[1]
+
+    image = Input(shape=(teacher_size, teacher_size, 3))
+    teacher_probs = teacher(image, training=False)
+    teacher_log_probs = Lambda(lambda p: tf.math.log(p + 1e-8), name='teacher_log_probs')(teacher_probs)
+
+    student_input = Resizing(student_size, student_size)(image) if student_size != teacher_size else image
+    student_logits = logits_model(student_input)
+
+    outputs = Concatenate(name='distill_outputs')([student_logits, teacher_log_probs])
+    distiller = Model(inputs=image, outputs=outputs)
+    distiller.compile(
+        optimizer=Adam(learning_rate=learning_rate),
+        loss=distillation_loss(num_classes, temperature, alpha),
+        metrics=[student_accuracy(num_classes)]
+    )
+    return distiller
+
+
+def evaluate_accuracy(model, dataset):
+    """Top-1 accuracy of a softmax model on (images, one-hot) batches, resized to its input"""
+    size = model.input_shape[1]
+    correct, total = 0, 0
+    for images, labels in dataset:
+        if images.shape[1] != size:
+            images = tf.image.resize(images, (size, size))
+        predictions = model.predict_on_batch(images)
+        correct += int(np.sum(np.argmax(predictions, axis=1) == np.argmax(labels.numpy(), axis=1)))
+        total += len(labels)
+    return correct / max(total, 1)
+
+
+def measure_latency(model, runs=50, warmup=5):
+    """Batch-1 CPU latency in ms (p50, p95) of a Keras model"""
+    size = model.input_shape[1]
+    image = np.random.rand(1, size, size, 3).astype(np.float32)
+    predict = tf.function(lambda x: model(x, training=False))
+    for _ in range(warmup):
+        predict(image)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(image).numpy()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+
+
+def pareto_front(results):
+    """Mark results that no other result beats on accuracy, latency and size at once"""
+    for result in results:
+        result['pareto'] = not any(
+            other is not result
+            and other['accuracy'] >= result['accuracy']
+            and other['latency_p50_ms'] <= result['latency_p50_ms']
+            and other['size_mb'] <= result['size_mb']
+            and (other['accuracy'] > result['accuracy']
+                 or other['latency_p50_ms'] < result['latency_p50_ms']
+                 or other['size_mb'] < result['size_mb'])
+            for other in results
+        )
+    return results
+
+
+def select_student(results, teacher_accuracy, max_accuracy_drop=0.02):
+    """Fastest Pareto student within max_accuracy_drop of the teacher"""
+    candidates = [r for r in results if r['pareto'] and r['variant'] != 'teacher'
+                  and r['accuracy'] >= teacher_accuracy - max_accuracy_drop]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda r: r['latency_p50_ms'])
+
+
+def write_report(results, output_dir, selected=None):
+    """Write pareto.json, pareto.md and pareto.png (accuracy vs latency)"""
+    with open(os.path.join(output_dir, 'pareto.json'), 'w') as f:
+        json.dump({'results': results, 'selected': selected['variant'] if selected else None}, f, indent=2)
+
+    lines = [
+        '| Model | Input | Accuracy | Latency p50 (ms) | Latency p95 (ms) | Size (MB) | Params | Pareto |',
+        '|---|---|---|---|---|---|---|---|',
+    ]
+    for r in sorted(results, key=lambda r: r['latency_p50_ms']):
+        marker = 'yes' if r['pareto'] else ''
+        if selected and r['variant'] == selected['variant']:
+            marker += ' (selected)'
+        lines.append(f"| {r['variant']} | {r['img_size']} | {r['accuracy']:.4f} | {r['latency_p50_ms']:.1f} | "
+                     f"{r['latency_p95_ms']:.1f} | {r['size_mb']:.2f} | {r['params']:,} | {marker} |")
+    with open(os.path.join(output_dir, 'pareto.md'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for r in results:
+        ax.scatter(r['latency_p50_ms'], r['accuracy'], s=20 + r['size_mb'] * 10,
+                   c='tab:green' if r['pareto'] else 'tab:gray')
+        ax.annotate(r['variant'], (r['latency_p50_ms'], r['accuracy']), fontsize=8)
+    ax.set_xlabel('CPU latency p50, batch 1 (ms)')
+    ax.set_ylabel('Validation accuracy')
+    ax.set_title('Student accuracy vs latency (marker size = model size)')
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'pareto.png'))
+    plt.close(fig)
+    return '\n'.join(lines)
+
+
+def distill_student(teacher, variant, train_ds, val_ds, num_classes, epochs=30, learning_rate=0.0005,
+                    temperature=4.0, alpha=0.1, dropout_rate=0.2, weights='imagenet'):
+    """Train one student on the teacher's soft targets, returns (student, history)"""
+    logits_model, student = build_student(variant, num_classes, dropout_rate, weights)
+    distiller = build_distiller(teacher, logits_model, num_classes, learning_rate, temperature, alpha)
+
+    history = distiller.fit(
+        train_ds,
+        epochs=epochs,
+        validation_data=val_ds,
+        callbacks=[
+            EarlyStopping(
+                monitor='val_student_accuracy',
+                mode='max',
+                patience=6,
+                restore_best_weights=True,
+                verbose=1
+            ),
+            ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.3,
+                patience=3,
+                min_lr=0.00001,
+                verbose=1
+            )
+        ],
+        verbose=2
+    )
+    return student, history
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import subprocess
+import tensorflow as tf
+
+
+def get_cluster_config():
+    """Parse the TF_CONFIG cluster spec, None when not set"""
+    tf_config = os.getenv('TF_CONFIG', '')
+    if not tf_config:
+        return None
+    config = json.loads(tf_config)
+    if not config.get('cluster'):
+        return None
+    return config
+
+
+def build_tf_config(workers, index):
+    """TF_CONFIG for worker `index` of a list of host:port workers"""
+    return json.dumps({
+        'cluster': {'worker': list(workers)},
+        'task': {'type': 'worker', 'index': index}
+    })
+
+
+def create_strategy():
+    """MultiWorkerMirroredStrategy configured from TF_CONFIG
+
+    Synchronous data parallelism with ring all-reduce, which is what the
+    collectives use on CPU-only hosts. Must be called before any other
+    TensorFlow op runs in the process.
+    """
+    options = tf.distribute.experimental.CommunicationOptions(
+        implementation=tf.distribute.experimental.CommunicationImplementation.RING
+    )
+    return tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+
+
+def worker_info(strategy):
+    """(task_type, task_id, num_workers) of this process"""
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    if resolver is None or not resolver.cluster_spec().as_dict():
+        return None, 0, 1
+    cluster = resolver.cluster_spec().as_dict()
+    num_workers = len(cluster.get('worker', [])) + len(cluster.get('chief', []))
+    return resolver.task_type, resolver.task_id or 0, num_workers
+
+
+def is_chief(strategy):
+    """The chief (or worker 0 when there is no chief) owns checkpoints and plots"""
+    task_type, task_id, _ = worker_info(strategy)
+    return task_type in (None, 'chief') or (task_type == 'worker' and task_id == 0)
+
+
+def worker_save_path(path, strategy):
+    """Path a worker saves to
+
+    Every worker has to take part in saving, but only the chief writes to
+    the real path; the others write to a temporary directory that is
+    removed again with cleanup_worker_path.
+    """
+    if is_chief(strategy):
+        return path
+    _, task_id, _ = worker_info(strategy)
+    temp_dir = os.path.join(tempfile.gettempdir(), f"chili_worker_{task_id}")
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, os.path.basename(path))
+
+
+def cleanup_worker_path(path, strategy):
+    if not is_chief(strategy):
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def launch_local_workers(num_workers, argv):
+    """Run argv as num_workers local processes forming one cluster
+
+    Each process gets its own TF_CONFIG and an equal share of the CPU
+    threads so the workers do not oversubscribe the cores. Returns the
+    highest exit code.
+    """
+    workers = [f"localhost:{_free_port()}" for _ in range(num_workers)]
+    threads = str(max(1, (os.cpu_count() or 1) // num_workers))
+
+    processes = []
+    for index in range(num_workers):
+        env = os.environ.copy()
+        env['TF_CONFIG'] = build_tf_config(workers, index)
+        env['TF_NUM_INTRAOP_THREADS'] = threads
+        env['OMP_NUM_THREADS'] = threads
+        print(f"Starting worker {index} on {workers[index]}")
+        processes.append(subprocess.Popen([sys.executable] + list(argv), env=env))
+
+    return_code = 0
+    try:
+        for process in processes:
+            return_code = max(return_code, process.wait())
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        return_code = 1
+    return return_code
@@ -0,0 +1,153 @@
+import os
+import csv
+import json
+import time
+import numpy as np
+import tensorflow as tf
+
+try:
+    from data_pipeline import list_image_files
+    from dataset_shards import is_shard_dir, ShardedSplit
+except ImportError:
+    from .data_pipeline import list_image_files
+    from .dataset_shards import is_shard_dir, ShardedSplit
+
+
+def split_files(path):
+    """(relative image paths, class names) of a split in dataset order"""
+    if is_shard_dir(path):
+        split = ShardedSplit(path)
+        return list(split.paths), list(split.classes)
+    paths, _, classes = list_image_files(path)
+    return [os.path.relpath(p, path) for p in paths], classes
+
+
+def confusion_matrix(y_true, y_pred, num_classes):
+    """Rows are the actual class, columns the predicted class"""
+    counts = np.bincount(
+        np.asarray(y_true, dtype=np.int64) * num_classes + np.asarray(y_pred, dtype=np.int64),
+        minlength=num_classes * num_classes
+    )
+    return counts.reshape(num_classes, num_classes)
+
+
+def classification_metrics(matrix, classes):
+    """Accuracy, per-class precision/recall/F1 and macro/weighted averages of a confusion matrix"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    true_positives = np.diag(matrix)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    total = support.sum()
+    weights = support / total if total else np.zeros_like(support)
+    return {
+        'accuracy': float(true_positives.sum() / total) if total else 0.0,
+        'samples': int(total),
+        'per_class': [
+            {
+                'class': name,
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(support[i]),
+            }
+            for i, name in enumerate(classes)
+        ],
+        'macro_avg': {
+            'precision': float(precision.mean()),
+            'recall': float(recall.mean()),
+            'f1': float(f1.mean()),
+        },
+        'weighted_avg': {
+            'precision': float((precision * weights).sum()),
+            'recall': float((recall * weights).sum()),
+            'f1': float((f1 * weights).sum()),
+        },
+        'confusion_matrix': matrix.astype(np.int64).tolist(),
+    }
+
+
+def predict_split(chili_model, path, batch_size=64):
+    """Stream a split through batched inference
+
+    Images are decoded in parallel by the tf.data pipeline (or read from
+    compiled shards) without caching, so a large holdout is read once.
+    Returns (y_true, y_pred, confidence, seconds).
+    """
+    dataset, _ = chili_model.build_split_dataset(path, training=False, batch_size=batch_size, cache=False)
+    model = chili_model.model
+    predict_batch = tf.function(lambda images: model(images, training=False), reduce_retracing=True)
+
+    y_true, y_pred, confidence = [], [], []
+    start_time = time.perf_counter()
+    for images, labels in dataset:
+        probabilities = predict_batch(images).numpy()
+        y_true.append(np.argmax(labels.numpy(), axis=1))
+        y_pred.append(np.argmax(probabilities, axis=1))
+        confidence.append(probabilities.max(axis=1))
+    seconds = time.perf_counter() - start_time
+
+    if not y_true:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([]), seconds
+    return np.concatenate(y_true), np.concatenate(y_pred), np.concatenate(confidence), seconds
+
+
+def evaluate_split(chili_model, path, batch_size=64):
+    """Evaluate a loaded ChiliDiseaseModel on a whole split
+
+    Returns (metrics, predictions): metrics has accuracy, per-class
+    precision/recall/F1, the confusion matrix and throughput; predictions
+    holds per-image paths, labels and confidences.
+    """
+    paths, classes = split_files(path)
+    if len(classes) != chili_model.num_classes:
+        raise ValueError(f"{path} has {len(classes)} classes, the model predicts {chili_model.num_classes}")
+
+    y_true, y_pred, confidence, seconds = predict_split(chili_model, path, batch_size)
+    metrics = classification_metrics(confusion_matrix(y_true, y_pred, len(classes)), classes)
+    metrics.update({
+        'split': path,
+        'classes': classes,
+        'batch_size': batch_size,
+        'seconds': round(seconds, 3),
+        'images_per_sec': len(y_true) / seconds if seconds > 0 else 0.0,
+        'mean_confidence': float(confidence.mean()) if len(confidence) else 0.0,
+    })
+    predictions = {'paths': paths, 'y_true': y_true, 'y_pred': y_pred, 'confidence': confidence}
+    return metrics, predictions
+
+
+def write_evaluation(metrics, predictions, output_dir):
+    """Write metrics.json, per_class.csv, confusion_matrix.csv and predictions.csv"""
+    os.makedirs(output_dir, exist_ok=True)
+    classes = metrics['classes']
+
+    with open(os.path.join(output_dir, 'metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    with open(os.path.join(output_dir, 'per_class.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['class', 'precision', 'recall', 'f1', 'support'])
+        for row in metrics['per_class']:
+            writer.writerow([row['class'], f"{row['precision']:.4f}", f"{row['recall']:.4f}",
+                             f"{row['f1']:.4f}", row['support']])
+
+    with open(os.path.join(output_dir, 'confusion_matrix.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['actual \\ predicted'] + classes)
+        for name, row in zip(classes, metrics['confusion_matrix']):
+            writer.writerow([name] + row)
+
+    with open(os.path.join(output_dir, 'predictions.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'actual', 'predicted', 'confidence', 'correct'])
+        for path, actual, predicted, confidence in zip(predictions['paths'], predictions['y_true'],
+                                                       predictions['y_pred'], predictions['confidence']):
+            writer.writerow([path, classes[actual], classes[predicted], f"{confidence:.4f}",
+                             int(actual == predicted)])
+    return output_dir
@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Use absolute imports when available, fallback to relative
+try:
+    from data_pipeline import list_image_files
+    from dataset_shards import is_shard_dir, MANIFEST_NAME
+except ImportError:
+    from .data_pipeline import list_image_files
+    from .dataset_shards import is_shard_dir, MANIFEST_NAME
+
+
+def dataset_fingerprint(path):
+    """Hash that changes when images of a split are added, removed or modified"""
+    digest = hashlib.sha1()
+    if is_shard_dir(path):
+        with open(os.path.join(path, MANIFEST_NAME), 'rb') as f:
+            digest.update(f.read())
+    else:
+        paths, labels, _ = list_image_files(path)
+        for image_path, label in zip(paths, labels):
+            stat = os.stat(image_path)
+            digest.update(f"{image_path}|{label}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def backbone_fingerprint(model):
+    """Hash of all weights of a feature extractor
+
+    Identifies the backbone that produced cached features: the ImageNet
+    MobileNetV2 of train_head_cached and a model after fine_tune share the
+    1280-d output but not the weights.
+    """
+    digest = hashlib.sha1()
+    for weight in model.get_weights():
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def extract_features(backbone, dataset):
+    """Run the backbone over a dataset of (images, one-hot labels) batches"""
+    features, labels = [], []
+    for images, batch_labels in dataset:
+        features.append(backbone.predict_on_batch(images).astype(np.float16))
+        labels.append(np.argmax(batch_labels.numpy(), axis=1).astype(np.int32))
+    if not features:
+        return np.zeros((0, backbone.output_shape[-1]), dtype=np.float16), np.zeros((0,), dtype=np.int32)
+    return np.concatenate(features), np.concatenate(labels)
+
+
+def cached_features(cache_dir, split_path, variant, img_size, extract_fn, backbone):
+    """Load pooled backbone features from cache or extract and store them
+
+    The cache file is keyed by the split fingerprint, the image size, the
+    variant (e.g. number of augmented copies) and the backbone fingerprint,
+    so it is rebuilt automatically when the data or the backbone changes.
+    Features are stored as float16.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    split_name = os.path.basename(os.path.normpath(split_path))
+    key = f"{split_name}_{img_size}_{variant}_{dataset_fingerprint(split_path)}_{backbone}"
+    cache_path = os.path.join(cache_dir, f"{key}.npz")
+
+    if os.path.exists(cache_path):
+        data = np.load(cache_path)
+        print(f"Loaded cached features: {cache_path} ({len(data['labels'])} samples)")
+        return data['features'], data['labels']
+
+    features, labels = extract_fn()
+    np.savez(cache_path, features=features, labels=labels)
+    with open(os.path.join(cache_dir, f"{key}.json"), 'w') as f:
+        json.dump({'split': split_path, 'variant': variant, 'img_size': img_size, 'backbone': backbone,
+                   'samples': int(len(labels)), 'feature_dim': int(features.shape[1])}, f, indent=2)
+    print(f"Cached features: {cache_path} ({len(labels)} samples)")
+    return features, labels
+
+
+def find_cached_features(cache_dir, split_name, img_size, backbone):
+    """Newest cached features of a split (by directory name) from a backbone (fingerprint), or None
+
+    For consumers of the cache that do not have the split itself at hand,
+    e.g. online head updates on the serving machine. Features of any other
+    backbone are never returned, even with the same feature size.
+    """
+    if not os.path.isdir(cache_dir):
+        return None
+    candidates = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        meta_path = os.path.join(cache_dir, name)
+        cache_path = meta_path[:-len('.json')] + '.npz'
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (os.path.basename(os.path.normpath(meta['split'])) != split_name or meta['img_size'] != img_size
+                or meta.get('backbone') != backbone or not os.path.exists(cache_path)):
+            continue
+        candidates.append((os.path.getmtime(cache_path), cache_path))
+    if not candidates:
+        return None
+    data = np.load(max(candidates)[1])
+    return data['features'], data['labels']
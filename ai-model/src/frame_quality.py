@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import Counter
+import cv2
+import numpy as np
+
+try:
+    from tiling import vegetation_mask
+except ImportError:
+    from .tiling import vegetation_mask
+
+GATE_MODES = ('reject', 'flag', 'off')
+
+# Metrics are computed at this size, so thresholds do not depend on IMAGE_SIZE or the camera resolution
+ANALYSIS_SIZE = 112
+
+
+def frame_quality_score(frame):
+    """Score a frame by sharpness (Laplacian variance) weighted by exposure"""
+    small = cv2.resize(frame, (160, 120), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    exposure_penalty = abs(float(gray.mean()) - 128.0) / 128.0
+    return sharpness * (1.0 - exposure_penalty)
+
+
+def quality_metrics(image, bgr=True):
+    """Blur, exposure and foliage metrics of an (H, W, 3) uint8 image
+
+    Meant for the model input (IMAGE_SIZE square), which is already small:
+    it is shrunk to ANALYSIS_SIZE and measured there in well under 1 ms.
+    """
+    if image.shape[:2] != (ANALYSIS_SIZE, ANALYSIS_SIZE):
+        image = cv2.resize(image, (ANALYSIS_SIZE, ANALYSIS_SIZE), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY if bgr else cv2.COLOR_RGB2GRAY)
+    histogram = np.bincount(gray.ravel(), minlength=256) / gray.size
+    levels = np.arange(256)
+    brightness = float(histogram @ levels)
+    return {
+        'sharpness': float(cv2.Laplacian(gray, cv2.CV_32F).var()),
+        'brightness': brightness,
+        'contrast': float(np.sqrt(histogram @ (levels - brightness) ** 2)),
+        'dark_fraction': float(histogram[:16].sum()),
+        'bright_fraction': float(histogram[240:].sum()),
+        # Every other pixel is enough for a share of green
+        'vegetation': float(vegetation_mask(image[::2, ::2], bgr).mean()),
+    }
+
+
+class QualityGate:
+    """Rejects or flags unusable frames before inference and counts why
+
+    QUALITY_GATE=reject skips the model for frames that fail a check,
+    flag runs it anyway and marks the result, off skips the checks.
+    Reasons: blurry, underexposed, overexposed, low_contrast, no_foliage.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or os.getenv('QUALITY_GATE', 'reject').lower()
+        if self.mode not in GATE_MODES:
+            raise ValueError(f"Unknown QUALITY_GATE: {self.mode}, expected one of {GATE_MODES}")
+        self.min_sharpness = float(os.getenv('QUALITY_MIN_SHARPNESS', 100))
+        self.min_brightness = float(os.getenv('QUALITY_MIN_BRIGHTNESS', 30))
+        self.max_brightness = float(os.getenv('QUALITY_MAX_BRIGHTNESS', 230))
+        self.max_clipped = float(os.getenv('QUALITY_MAX_CLIPPED', 0.7))
+        self.min_contrast = float(os.getenv('QUALITY_MIN_CONTRAST', 12))
+        self.min_vegetation = float(os.getenv('QUALITY_MIN_VEGETATION', 0.02))
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.reasons = Counter()
+
+    def reasons_for(self, metrics):
+        reasons = []
+        if metrics['sharpness'] < self.min_sharpness:
+            reasons.append('blurry')
+        if metrics['brightness'] < self.min_brightness or metrics['dark_fraction'] > self.max_clipped:
+            reasons.append('underexposed')
+        if metrics['brightness'] > self.max_brightness or metrics['bright_fraction'] > self.max_clipped:
+            reasons.append('overexposed')
+        if metrics['contrast'] < self.min_contrast:
+            reasons.append('low_contrast')
+        if metrics['vegetation'] < self.min_vegetation:
+            reasons.append('no_foliage')
+        return reasons
+
+    def check(self, image, bgr=True, mode=None):
+        """Quality report of a model input, None when the gate is off
+
+        mode overrides QUALITY_GATE for this call. The report's 'action'
+        is 'pass', 'flag' or 'reject'.
+        """
+        mode = (mode or self.mode).lower()
+        if mode not in GATE_MODES:
+            raise ValueError(f"Unknown quality gate mode: {mode}, expected one of {GATE_MODES}")
+        if mode == 'off':
+            return None
+        metrics = quality_metrics(image, bgr)
+        reasons = self.reasons_for(metrics)
+        action = mode if reasons else 'pass'
+        with self.lock:
+            self.counts['checked'] += 1
+            self.counts[{'pass': 'passed', 'flag': 'flagged', 'reject': 'rejected'}[action]] += 1
+            self.reasons.update(reasons)
+        return {
+            'ok': not reasons,
+            'action': action,
+            'reasons': reasons,
+            'metrics': {name: round(value, 4) for name, value in metrics.items()},
+        }
+
+    def stats(self):
+        with self.lock:
+            counts = {name: self.counts[name] for name in ('checked', 'passed', 'flagged', 'rejected')}
+            counts['reasons'] = dict(self.reasons)
+        counts['mode'] = self.mode
+        return counts
@@ -0,0 +1,235 @@
+import os
+import csv
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Latency histogram buckets in ms, log-spaced from 1 ms to 2 minutes
+BUCKETS_MS = np.unique(np.round(np.logspace(0, np.log10(120000), 60), 1))
+
+ENDPOINTS = ('predict', 'predict_esp32', 'batch_predict')
+
+
+def load_corpus(path, limit=200, seed=42):
+    """Read up to `limit` images (name, bytes) into memory so disk reads do not skew the client"""
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    files.sort()
+    random.Random(seed).shuffle(files)
+    corpus = []
+    for file_path in files[:limit]:
+        with open(file_path, 'rb') as f:
+            corpus.append((os.path.basename(file_path), f.read()))
+    return corpus
+
+
+class EndpointClient:
+    """Builds and sends one request to an API endpoint, one keep-alive session per thread"""
+
+    def __init__(self, base_url, endpoint, corpus, batch_images=4, timeout=60):
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint: {endpoint}, expected one of {ENDPOINTS}")
+        if endpoint != 'predict_esp32' and not corpus:
+            raise ValueError(f"/{endpoint.replace('_', '/')} needs an image corpus")
+        self.base_url = base_url.rstrip('/')
+        self.endpoint = endpoint
+        self.corpus = corpus
+        self.batch_images = batch_images
+        self.timeout = timeout
+        self.local = threading.local()
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return '/' + self.endpoint.replace('_', '/')
+
+    def _session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _next_images(self, count):
+        with self.lock:
+            start = self.counter
+            self.counter += count
+        # Unique upload names: the server names its temp files by name + timestamp
+        return [(f"{start + i}_{self.corpus[(start + i) % len(self.corpus)][0]}",
+                 self.corpus[(start + i) % len(self.corpus)][1]) for i in range(count)]
+
+    def send(self):
+        """Send one request, returns the HTTP status code"""
+        url = self.base_url + self.path
+        if self.endpoint == 'predict':
+            name, data = self._next_images(1)[0]
+            files = {'image': (name, data, 'image/jpeg')}
+        elif self.endpoint == 'batch_predict':
+            files = [('images', (name, data, 'image/jpeg')) for name, data in self._next_images(self.batch_images)]
+        else:
+            files = None
+        response = self._session().post(url, files=files, timeout=self.timeout)
+        return response.status_code
+
+
+def run_stage(client, rate, duration, concurrency, arrival='poisson', max_backlog=None, seed=42):
+    """Drive one endpoint at a fixed open-loop arrival rate
+
+    Requests are scheduled at their arrival times whether or not earlier
+    ones have finished, and latency is measured from the scheduled time,
+    so queueing inside the client counts (no coordinated omission).
+    Arrivals that find more than max_backlog requests waiting are dropped
+    and counted as errors.
+    """
+    rng = random.Random(seed)
+    max_backlog = max_backlog if max_backlog is not None else concurrency * 10
+    latencies, service_times, errors = [], [], {}
+    lock = threading.Lock()
+    in_flight = [0]
+
+    def fire(scheduled):
+        started = time.perf_counter()
+        try:
+            status = client.send()
+            error = None if status < 400 else f"HTTP {status}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        with lock:
+            in_flight[0] -= 1
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append((finished - scheduled) * 1000)
+                service_times.append((finished - started) * 1000)
+
+    sent = 0
+    start = time.perf_counter()
+    next_arrival = start
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while next_arrival - start < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with lock:
+                backlog = in_flight[0]
+                if backlog < max_backlog + concurrency:
+                    in_flight[0] += 1
+                else:
+                    errors['client backlog'] = errors.get('client backlog', 0) + 1
+                    backlog = None
+            if backlog is not None:
+                pool.submit(fire, next_arrival)
+                sent += 1
+            gap = rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+            next_arrival += gap
+    # Includes draining the requests still in flight when arrivals stopped
+    elapsed = time.perf_counter() - start
+
+    return summarize(client.path, rate, elapsed, sent, latencies, service_times, errors)
+
+
+def summarize(path, rate, elapsed, sent, latencies, service_times, errors):
+    latencies = np.array(latencies)
+    completed = len(latencies)
+    failed = sum(errors.values())
+    histogram, _ = np.histogram(latencies, bins=np.concatenate([[0], BUCKETS_MS, [np.inf]]))
+
+    def percentile(values, q):
+        return float(np.percentile(values, q)) if len(values) else None
+
+    return {
+        'endpoint': path,
+        'offered_rps': rate,
+        'duration_s': round(elapsed, 2),
+        'sent': sent,
+        'completed': completed,
+        'errors': errors,
+        'error_rate': failed / max(sent + errors.get('client backlog', 0), 1),
+        'throughput_rps': completed / elapsed if elapsed > 0 else 0.0,
+        'latency_p50_ms': percentile(latencies, 50),
+        'latency_p90_ms': percentile(latencies, 90),
+        'latency_p99_ms': percentile(latencies, 99),
+        'latency_max_ms': float(latencies.max()) if completed else None,
+        'service_p50_ms': percentile(service_times, 50),
+        'histogram': {
+            'bucket_upper_ms': [float(b) for b in BUCKETS_MS] + ['inf'],
+            'counts': histogram.tolist(),
+        },
+    }
+
+
+def saturation_point(stages, slo_ms=1000.0, max_error_rate=0.01, min_throughput_ratio=0.9):
+    """Highest offered rate the endpoint sustains and the first rate where it saturates
+
+    A stage is saturated when completed throughput falls below
+    min_throughput_ratio of the offered rate, p99 latency exceeds slo_ms or
+    the error rate exceeds max_error_rate.
+    """
+    sustained, saturated = None, None
+    for stage in sorted(stages, key=lambda s: s['offered_rps']):
+        p99 = stage['latency_p99_ms']
+        ok = (stage['throughput_rps'] >= min_throughput_ratio * stage['offered_rps']
+              and p99 is not None and p99 <= slo_ms
+              and stage['error_rate'] <= max_error_rate)
+        if ok and saturated is None:
+            sustained = stage
+        elif not ok and saturated is None:
+            saturated = stage
+    return {
+        'max_sustained_rps': sustained['offered_rps'] if sustained else None,
+        'max_sustained_throughput_rps': sustained['throughput_rps'] if sustained else None,
+        'saturated_at_rps': saturated['offered_rps'] if saturated else None,
+        'peak_throughput_rps': max((s['throughput_rps'] for s in stages), default=0.0),
+    }
+
+
+def write_results(results, output_dir):
+    """Write results.json, stages.csv and curve.png (throughput and latency vs offered rate)"""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+    columns = ['endpoint', 'offered_rps', 'throughput_rps', 'latency_p50_ms', 'latency_p90_ms',
+               'latency_p99_ms', 'latency_max_ms', 'service_p50_ms', 'sent', 'completed', 'error_rate']
+    with open(os.path.join(output_dir, 'stages.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + ['errors'])
+        for endpoint in results['endpoints'].values():
+            for stage in endpoint['stages']:
+                writer.writerow([stage[c] for c in columns] + [json.dumps(stage['errors'])])
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+    for path, endpoint in results['endpoints'].items():
+        offered = [s['offered_rps'] for s in endpoint['stages']]
+        ax1.plot(offered, [s['throughput_rps'] for s in endpoint['stages']], marker='o', label=path)
+        ax2.plot(offered, [s['latency_p50_ms'] or np.nan for s in endpoint['stages']], marker='o',
+                 label=f"{path} p50")
+        ax2.plot(offered, [s['latency_p99_ms'] or np.nan for s in endpoint['stages']], marker='x',
+                 linestyle='--', label=f"{path} p99")
+        saturated = endpoint['saturation']['saturated_at_rps']
+        if saturated:
+            ax1.axvline(saturated, color='tab:red', alpha=0.3)
+    max_rate = max((s['offered_rps'] for e in results['endpoints'].values() for s in e['stages']), default=1)
+    ax1.plot([0, max_rate], [0, max_rate], color='gray', linestyle=':', label='offered')
+    ax1.set_title('Throughput')
+    ax1.set_xlabel('Offered load (requests/sec)')
+    ax1.set_ylabel('Completed requests/sec')
+    ax1.legend(fontsize=8)
+    ax2.set_title('Latency')
+    ax2.set_xlabel('Offered load (requests/sec)')
+    ax2.set_ylabel('Latency (ms)')
+    ax2.set_yscale('log')
+    ax2.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'curve.png'))
+    plt.close(fig)
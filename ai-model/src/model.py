@@ -1,56 +1,171 @@
 import os
+import math
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 
+# Use absolute imports when available, fallback to relative
+try:
+    from data_pipeline import build_augmenter, build_dataset, finalize_batches, list_image_files, ThroughputCallback
+    from dataset_shards import is_shard_dir, ShardedSplit
+    from feature_cache import backbone_fingerprint, cached_features, extract_features
+    from distributed import worker_info, worker_save_path, cleanup_worker_path
+    from training_state import TrainingCheckpoint
+    from tta import aggregate, make_views, parse_views
+    from preprocessing import InputBuffers, load_image, resize_into, serving_function
+    from tiling import aggregate_tiles, disease_probability, load_for_tiles, tile_grid, vegetation_fractions
+    from frame_quality import QualityGate
+except ImportError:
+    from .data_pipeline import build_augmenter, build_dataset, finalize_batches, list_image_files, ThroughputCallback
+    from .dataset_shards import is_shard_dir, ShardedSplit
+    from .feature_cache import backbone_fingerprint, cached_features, extract_features
+    from .distributed import worker_info, worker_save_path, cleanup_worker_path
+    from .training_state import TrainingCheckpoint
+    from .tta import aggregate, make_views, parse_views
+    from .preprocessing import InputBuffers, load_image, resize_into, serving_function
+    from .tiling import aggregate_tiles, disease_probability, load_for_tiles, tile_grid, vegetation_fractions
+    from .frame_quality import QualityGate
+
 load_dotenv()
 
+# Upper bound for the tile overlap of predict_tiled (requests and TILE_OVERLAP)
+MAX_TILE_OVERLAP = 0.9
+
 class ChiliDiseaseModel:
     def __init__(self):
         self.img_size = int(os.getenv('IMAGE_SIZE', 224))
         self.batch_size = int(os.getenv('BATCH_SIZE', 16))  # Reduced for better training with small dataset
         self.learning_rate = float(os.getenv('LEARNING_RATE', 0.0001))  # Lower learning rate
+        self.dropout_rate = float(os.getenv('DROPOUT_RATE', 0.2))
+        self.fine_tune_at = int(os.getenv('FINE_TUNE_AT', 100))  # First backbone layer unfrozen by fine_tune
         self.classes = ['healthy', 'leaf_curl', 'leaf_spot', 'whitefly', 'yellowish']  # Match folder names
         self.num_classes = len(self.classes)
         self.model = None
+        self.train_samples = None
+        self.extra_callbacks = []  # Appended to the callbacks of every fit (e.g. metrics loggers)
+        
+        # Resumable training state, written every CHECKPOINT_EVERY epochs
+        self.checkpoint_dir = os.getenv('CHECKPOINT_DIR', 'models/checkpoints')
+        self.checkpoint_every = int(os.getenv('CHECKPOINT_EVERY', 1))
+        self.start_epoch = 0
+        # Augmentation layers of the tf.data pipeline, kept so their seed state is checkpointed
+        self.augmenter = None
+        
+        # Distributed training (see use_strategy), the default strategy is a no-op
+        self.strategy = tf.distribute.get_strategy()
+        self.distributed = False
+        self.steps_per_epoch = None
+        self.validation_steps = None
+        
+        # Test-time augmentation for predict: view names or a preset (flips, five_crop, standard, full)
+        self.tta_views = parse_views(os.getenv('TTA_VIEWS', ''))
+        self.tta_aggregate = os.getenv('TTA_AGGREGATE', 'mean')
+        self.tta_crop_fraction = float(os.getenv('TTA_CROP_FRACTION', 0.875))
+        
+        # Decode JPEGs at a reduced DCT scale close to the input size, then resize
+        self.reduced_decode = os.getenv('REDUCED_DECODE', 'true').lower() == 'true'
+        self.decode_resample = os.getenv('DECODE_RESAMPLE', 'nearest')
+        
+        # Tiled inference for whole-plant photos (predict_tiled), TILE_SIZE is in original image pixels
+        self.tile_size = int(os.getenv('TILE_SIZE', 512))
+        self.tile_overlap = float(os.getenv('TILE_OVERLAP', 0.25))
+        self.tile_max = int(os.getenv('TILE_MAX', 48))
+        self.tile_min_vegetation = float(os.getenv('TILE_MIN_VEGETATION', 0.3))
+        self.tile_threshold = float(os.getenv('TILE_THRESHOLD', 0.6))
+        
+        # Blur / exposure / foliage checks on the model input before inference (QUALITY_GATE)
+        self.quality_gate = QualityGate()
+        
+        # Inference state: per-thread preallocated uint8 inputs and the graph that normalizes them
+        self.input_buffers = None
+        self.serving = None
+        
+    def use_strategy(self, strategy):
+        """Train data-parallel with a tf.distribute strategy
+        
+        BATCH_SIZE stays the per-replica batch size, so the global batch is
+        BATCH_SIZE x number of replicas across all workers.
+        """
+        self.strategy = strategy
+        self.distributed = True
         
     def create_model(self):
         """Membuat model menggunakan Transfer Learning dengan MobileNetV2"""
-        base_model = MobileNetV2(
+        with self.strategy.scope():
+            base_model = MobileNetV2(
+                weights='imagenet',
+                include_top=False,
+                input_shape=(self.img_size, self.img_size, 3)
+            )
+            
+            # Freeze base model layers
+            base_model.trainable = False
+            
+            # Add custom layers
+            x = base_model.output
+            x = GlobalAveragePooling2D()(x)
+            x = Dropout(self.dropout_rate)(x)
+            predictions = Dense(self.num_classes, activation='softmax')(x)
+            
+            self.model = Model(inputs=base_model.input, outputs=predictions)
+            
+            # Compile model
+            self.model.compile(
+                optimizer=Adam(learning_rate=self.learning_rate),
+                loss='categorical_crossentropy',
+                metrics=['accuracy']
+            )
+        
+        return self.model
+    
+    def create_backbone(self):
+        """Backbone MobileNetV2 beku dengan global average pooling (fitur 1280-d)"""
+        backbone = MobileNetV2(
             weights='imagenet',
             include_top=False,
-            input_shape=(self.img_size, self.img_size, 3)
+            input_shape=(self.img_size, self.img_size, 3),
+            pooling='avg'
         )
-        
-        # Freeze base model layers
-        base_model.trainable = False
-        
-        # Add custom layers
-        x = base_model.output
-        x = GlobalAveragePooling2D()(x)
-        x = Dropout(0.2)(x)
+        backbone.trainable = False
+        return backbone
+    
+    def create_head(self, feature_dim):
+        """Classifier head (Dropout + Dense) on pooled backbone features"""
+        inputs = Input(shape=(feature_dim,))
+        x = Dropout(self.dropout_rate)(inputs)
         predictions = Dense(self.num_classes, activation='softmax')(x)
         
-        self.model = Model(inputs=base_model.input, outputs=predictions)
-        
-        # Compile model
-        self.model.compile(
+        head = Model(inputs=inputs, outputs=predictions)
+        head.compile(
             optimizer=Adam(learning_rate=self.learning_rate),
             loss='categorical_crossentropy',
             metrics=['accuracy']
         )
-        
+        return head
+    
+    def attach_head(self, head):
+        """Build the full model and copy the trained head weights into it"""
+        self.create_model()
+        self.model.layers[-1].set_weights(head.layers[-1].get_weights())
         return self.model
     
-    def prepare_data(self, train_path, val_path):
+    def prepare_data(self, train_path, val_path, use_tf_data=False):
         """Mempersiapkan data untuk training"""
+        # ImageDataGenerator cannot be sharded across workers
+        if self.distributed:
+            return self.prepare_distributed_data(train_path, val_path)
+        
+        # Compiled shards can only be read through tf.data
+        if use_tf_data or is_shard_dir(train_path):
+            return self.prepare_tf_data(train_path, val_path)
+        
         train_datagen = ImageDataGenerator(
             rescale=1./255,
             rotation_range=20,
@@ -104,22 +219,160 @@ class ChiliDiseaseModel:
         print(f"Found {val_generator.samples} validation images")
         print(f"Classes: {list(train_generator.class_indices.keys())}")
         
+        self.train_samples = train_generator.samples
         return train_generator, val_generator
     
-    def train(self, train_path, val_path, epochs=30):
+    def prepare_tf_data(self, train_path, val_path):
+        """Mempersiapkan data training dengan pipeline tf.data (parallel decode, cache, prefetch)"""
+        train_ds, train_count = self.build_split_dataset(train_path, training=True)
+        val_ds, val_count = self.build_split_dataset(val_path, training=False)
+        
+        print(f"Found {train_count} training images (tf.data)")
+        print(f"Found {val_count} validation images (tf.data)")
+        
+        self.train_samples = train_count
+        return train_ds, val_ds
+    
+    def prepare_distributed_data(self, train_path, val_path):
+        """Per-worker sharded tf.data input for distributed training
+        
+        Each worker decodes only its own shard of the files. Both splits
+        repeat and are bounded by steps, so every worker runs the same
+        number of steps; a worker running out of data early would leave the
+        others blocked in the gradient all-reduce. Steps cover the largest
+        shard, so every worker reads (and caches) its whole shard per epoch.
+        """
+        global_batch_size = self.batch_size * self.strategy.num_replicas_in_sync
+        _, _, num_workers = worker_info(self.strategy)
+        worker_batch_size = global_batch_size // num_workers
+        train_count = self.split_size(train_path)
+        val_count = self.split_size(val_path)
+        self.steps_per_epoch = math.ceil(math.ceil(train_count / num_workers) / worker_batch_size)
+        self.validation_steps = math.ceil(math.ceil(val_count / num_workers) / worker_batch_size)
+        
+        def dataset_fn(path, training):
+            def fn(input_context):
+                ds, _ = self.build_split_dataset(
+                    path,
+                    training=training,
+                    batch_size=input_context.get_per_replica_batch_size(global_batch_size),
+                    num_shards=input_context.num_input_pipelines,
+                    shard_index=input_context.input_pipeline_id,
+                    repeat=True
+                )
+                return ds
+            return fn
+        
+        train_ds = self.strategy.distribute_datasets_from_function(dataset_fn(train_path, True))
+        val_ds = self.strategy.distribute_datasets_from_function(dataset_fn(val_path, False))
+        
+        print(f"Found {train_count} training images, {val_count} validation images (distributed)")
+        print(f"Replicas: {self.strategy.num_replicas_in_sync}, global batch size: {global_batch_size}")
+        print(f"Steps per epoch: {self.steps_per_epoch}, validation steps: {self.validation_steps}")
+        
+        self.train_samples = self.steps_per_epoch * global_batch_size
+        return train_ds, val_ds
+    
+    def split_size(self, path):
+        """Number of images in a split"""
+        if is_shard_dir(path):
+            return len(ShardedSplit(path))
+        return len(list_image_files(path)[0])
+    
+    def build_split_dataset(self, path, training=False, batch_size=None, num_shards=1, shard_index=0,
+                            repeat=False, cache=True):
+        """Dataset for one split, from compiled shards or from image folders
+        
+        cache=False skips caching decoded images, for single-pass reads
+        such as evaluating a large holdout.
+        """
+        batch_size = batch_size or self.batch_size
+        if is_shard_dir(path):
+            split = ShardedSplit(path)
+            if split.img_size != self.img_size:
+                raise ValueError(f"Shards in {path} are {split.img_size}px, model expects {self.img_size}px")
+            if split.resample != self.decode_resample:
+                raise ValueError(f"Shards in {path} were resized with {split.resample}, serving uses "
+                                 f"{self.decode_resample} (DECODE_RESAMPLE), recompile them")
+            ds = split.to_dataset(batch_size, shuffle=training, num_shards=num_shards, shard_index=shard_index,
+                                  start_epoch=self.start_epoch)
+            if repeat:
+                ds = ds.repeat()
+            augmenter = self.training_augmenter() if training else None
+            return finalize_batches(ds, self.num_classes, training, augmenter=augmenter), len(split)
+        
+        return build_dataset(path, self.img_size, batch_size, self.num_classes, training=training,
+                             cache=cache, num_shards=num_shards, shard_index=shard_index, repeat=repeat,
+                             start_epoch=self.start_epoch,
+                             augmenter=self.training_augmenter() if training else None,
+                             resample=self.decode_resample)
+    
+    def training_augmenter(self):
+        """The augmentation layers shared by the training datasets, built once"""
+        if self.augmenter is None:
+            self.augmenter = build_augmenter()
+            self.augmenter.build((None, self.img_size, self.img_size, 3))
+        return self.augmenter
+    
+    def input_state(self):
+        """Variables holding input pipeline randomness (augmentation seed generators)"""
+        return [] if self.augmenter is None else list(self.augmenter.variables)
+    
+    def training_checkpoint(self, phase, resume=False):
+        """Full-state checkpoint of one training phase (train / fine_tune)
+        
+        Without resume the previous checkpoint of the phase is removed.
+        Workers other than the chief read the shared checkpoint but write
+        their own copy to a temporary directory.
+        """
+        checkpoint_dir = os.path.join(self.checkpoint_dir, phase)
+        checkpoint = TrainingCheckpoint(
+            checkpoint_dir,
+            every_epochs=self.checkpoint_every,
+            save_dir=worker_save_path(checkpoint_dir, self.strategy)
+        )
+        if not resume:
+            checkpoint.clear()
+        state = checkpoint.load_state() if resume else None
+        self.start_epoch = state['epoch'] if state and not state.get('completed') else 0
+        return checkpoint
+    
+    def instrument_input(self, train_data):
+        """Let telemetry callbacks wrap the training dataset (single-process tf.data only)"""
+        if self.distributed:
+            return train_data
+        for callback in self.extra_callbacks:
+            if hasattr(callback, 'instrument'):
+                train_data = callback.instrument(train_data)
+        return train_data
+    
+    def train(self, train_path, val_path, epochs=30, use_tf_data=False, resume=False):
         """Training model"""
+        checkpoint = self.training_checkpoint('train', resume)
+        completed = checkpoint.completed_history()
+        if completed is not None:
+            print("Training phase already completed, loading models/chili_disease_model.h5")
+            self.load_model('models/chili_disease_model.h5')
+            return completed
+        
         if self.model is None:
             self.create_model()
         
         # Create models directory if it doesn't exist
         os.makedirs('models', exist_ok=True)
         
-        train_gen, val_gen = self.prepare_data(train_path, val_path)
+        train_gen, val_gen = self.prepare_data(train_path, val_path, use_tf_data)
+        train_gen = self.instrument_input(train_gen)
+        
+        # Only the chief writes the real checkpoint. EarlyStopping and
+        # ReduceLROnPlateau see the all-reduced val_loss, so every worker
+        # stops and lowers the learning rate at the same epoch.
+        checkpoint_path = worker_save_path('models/chili_disease_model.h5', self.strategy)
         
         # Callbacks
-        callbacks = [
+        stateful_callbacks = [
             ModelCheckpoint(
-                'models/chili_disease_model.h5',
+                checkpoint_path,
                 save_best_only=True,
                 monitor='val_accuracy',
                 mode='max',
@@ -139,95 +392,385 @@ class ChiliDiseaseModel:
                 verbose=1
             )
         ]
+        initial_epoch = checkpoint.attach(self.model, train_gen, stateful_callbacks, self.input_state())
+        callbacks = stateful_callbacks + [ThroughputCallback(self.train_samples)] + \
+            self.extra_callbacks + [checkpoint]
         
         print(f"Starting training for {epochs} epochs...")
         print(f"Batch size: {self.batch_size}")
         print(f"Learning rate: {self.learning_rate}")
+        print(f"Input pipeline: {'tf.data' if use_tf_data or self.distributed else 'ImageDataGenerator'}")
         
         # Train model
         history = self.model.fit(
             train_gen,
             epochs=epochs,
+            initial_epoch=initial_epoch,
+            steps_per_epoch=self.steps_per_epoch,
             validation_data=val_gen,
+            validation_steps=self.validation_steps,
             callbacks=callbacks,
             verbose=1
         )
         
+        # Include the epochs from before a resume
+        history.history = checkpoint.history
+        cleanup_worker_path(checkpoint_path, self.strategy)
         return history
     
-    def fine_tune(self, train_path, val_path, epochs=20):
-        """Fine-tuning model dengan unfreeze beberapa layer"""
-        if self.model is None:
-            self.load_model('models/chili_disease_model.h5')
+    def train_head_cached(self, train_path, val_path, epochs=100, augment_copies=5,
+                          cache_dir='models/feature_cache', save_path='models/chili_disease_model.h5'):
+        """Training head saja di atas fitur backbone yang di-cache
+        
+        Pooled MobileNetV2 features are computed once for the original images
+        plus augment_copies augmented variants and cached on disk. Only the
+        Dropout + Dense head is trained on them, then stitched back onto the
+        backbone and saved as the usual .h5.
+        """
+        backbone = self.create_backbone()
+        feature_dim = backbone.output_shape[-1]
+        fingerprint = backbone_fingerprint(backbone)
+        
+        def extract_train():
+            original_ds, _ = self.build_split_dataset(train_path, training=False)
+            features, labels = extract_features(backbone, original_ds)
+            # Every pass over the training dataset draws new random augmentations
+            augmented_ds, _ = self.build_split_dataset(train_path, training=True)
+            for copy in range(augment_copies):
+                print(f"Extracting augmented features {copy + 1}/{augment_copies}...")
+                aug_features, aug_labels = extract_features(backbone, augmented_ds)
+                features = np.concatenate([features, aug_features])
+                labels = np.concatenate([labels, aug_labels])
+            return features, labels
+        
+        def extract_val():
+            val_ds, _ = self.build_split_dataset(val_path, training=False)
+            return extract_features(backbone, val_ds)
+        
+        train_x, train_y = cached_features(
+            cache_dir, train_path, f"aug{augment_copies}", self.img_size, extract_train, fingerprint
+        )
+        val_x, val_y = cached_features(cache_dir, val_path, "orig", self.img_size, extract_val, fingerprint)
         
-        # Unfreeze top layers of base model
-        base_model = self.model.layers[0]
-        base_model.trainable = True
+        print(f"Training head on {len(train_y)} cached feature vectors ({feature_dim}-d)")
         
-        # Fine-tune from this layer onwards
-        fine_tune_at = 100
+        head = self.create_head(feature_dim)
+        history = head.fit(
+            train_x.astype(np.float32),
+            tf.keras.utils.to_categorical(train_y, self.num_classes),
+            validation_data=(
+                val_x.astype(np.float32),
+                tf.keras.utils.to_categorical(val_y, self.num_classes)
+            ),
+            batch_size=max(self.batch_size, 64),
+            epochs=epochs,
+            callbacks=[
+                EarlyStopping(
+                    monitor='val_loss',
+                    patience=8,
+                    restore_best_weights=True,
+                    verbose=1
+                ),
+                ReduceLROnPlateau(
+                    monitor='val_loss',
+                    factor=0.3,
+                    patience=4,
+                    min_lr=0.00001,
+                    verbose=1
+                )
+            ] + self.extra_callbacks,
+            verbose=2
+        )
         
-        for layer in base_model.layers[:fine_tune_at]:
-            layer.trainable = False
+        self.attach_head(head)
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        self.model.save(save_path)
+        print(f"Model with cached-feature head saved to {save_path}")
         
-        # Recompile with lower learning rate
-        self.model.compile(
-            optimizer=Adam(learning_rate=self.learning_rate/10),
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        return history
+    
+    def fine_tune(self, train_path, val_path, epochs=20, use_tf_data=False, resume=False):
+        """Fine-tuning model dengan unfreeze beberapa layer"""
+        checkpoint = self.training_checkpoint('fine_tune', resume)
+        completed = checkpoint.completed_history()
+        if completed is not None:
+            print("Fine-tuning phase already completed, loading models/chili_disease_model_finetuned.h5")
+            self.load_model('models/chili_disease_model_finetuned.h5')
+            return completed
         
-        train_gen, val_gen = self.prepare_data(train_path, val_path)
+        if self.model is None:
+            model_path = 'models/chili_disease_model.h5'
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"No trained model to fine-tune: {model_path}")
+            print(f"Loading {model_path} for fine-tuning")
+            self.load_model(model_path)
+        
+        with self.strategy.scope():
+            # The backbone layers are inlined in the model (built from
+            # base_model.input), everything before the pooling/dropout/dense
+            # head belongs to MobileNetV2
+            base_layers = self.model.layers[:-3]
+            
+            # Fine-tune from self.fine_tune_at onwards
+            for index, layer in enumerate(base_layers):
+                layer.trainable = index >= self.fine_tune_at
+            
+            # Recompile with lower learning rate
+            self.model.compile(
+                optimizer=Adam(learning_rate=self.learning_rate/10),
+                loss='categorical_crossentropy',
+                metrics=['accuracy']
+            )
+        
+        train_gen, val_gen = self.prepare_data(train_path, val_path, use_tf_data)
+        train_gen = self.instrument_input(train_gen)
+        checkpoint_path = worker_save_path('models/chili_disease_model_finetuned.h5', self.strategy)
+        
+        model_checkpoint = ModelCheckpoint(
+            checkpoint_path,
+            save_best_only=True,
+            monitor='val_accuracy',
+            mode='max'
+        )
+        initial_epoch = checkpoint.attach(self.model, train_gen, [model_checkpoint], self.input_state())
         
         history = self.model.fit(
             train_gen,
             epochs=epochs,
+            initial_epoch=initial_epoch,
+            steps_per_epoch=self.steps_per_epoch,
             validation_data=val_gen,
+            validation_steps=self.validation_steps,
             callbacks=[
-                ModelCheckpoint(
-                    'models/chili_disease_model_finetuned.h5',
-                    save_best_only=True,
-                    monitor='val_accuracy',
-                    mode='max'
-                )
-            ]
+                model_checkpoint,
+                ThroughputCallback(self.train_samples)
+            ] + self.extra_callbacks + [checkpoint]
         )
         
+        history.history = checkpoint.history
+        cleanup_worker_path(checkpoint_path, self.strategy)
         return history
     
     def load_model(self, model_path):
         """Load trained model"""
-        self.model = tf.keras.models.load_model(model_path)
+        with self.strategy.scope():
+            self.model = tf.keras.models.load_model(model_path)
+        # Distilled students can use a smaller input than IMAGE_SIZE
+        self.img_size = self.model.input_shape[1]
         return self.model
     
-    def predict(self, image_path):
-        """Prediksi single image"""
+    def load_image_array(self, image_path):
+        """Load image sebagai batch (1, size, size, 3) ternormalisasi 0-1"""
+        img = load_image(image_path, self.img_size, self.reduced_decode, self.decode_resample)
+        img_array = tf.keras.preprocessing.image.img_to_array(img)
+        return tf.expand_dims(img_array, 0) / 255.0
+    
+    def serving_fn(self):
+        """Inference function of the current model (rebuilt when the model is swapped)"""
+        if self.serving is None or self.serving[0] is not self.model:
+            self.serving = (self.model, serving_function(self.model))
+        return self.serving[1]
+
+    def swap_model(self, model):
+        """Serve another model (e.g. a new head on the same backbone) from the next request on
+
+        Its serving function is traced for single frames in both channel
+        orders and for the TTA batch before the swap, so the first request
+        after it does not pay for tracing.
+        """
+        serve = serving_function(model)
+        batch = np.zeros((1, self.img_size, self.img_size, 3), dtype=np.uint8)
+        for bgr in (True, False):
+            serve(batch, bgr)
+            if self.tta_views:
+                serve(make_views(batch, self.tta_views, self.tta_crop_fraction), bgr)
+        self.model = model
+        self.serving = (model, serve)
+        return model
+
+    def input_buffer(self, batch_size=1):
+        """This thread's reusable (batch_size, size, size, 3) uint8 input array"""
+        if self.input_buffers is None or self.input_buffers.size != self.img_size:
+            self.input_buffers = InputBuffers(self.img_size)
+        return self.input_buffers.get(batch_size)
+    
+    def prepare_frame(self, frame, out=None):
+        """Resize an (H, W, 3) uint8 frame into `out` or this thread's input buffer"""
+        if out is None:
+            out = self.input_buffer(1)[0]
+        return resize_into(frame, out, self.decode_resample)
+    
+    def predict(self, image_path, tta=None, quality=None):
+        """Prediksi single image
+        
+        tta overrides TTA_VIEWS for this call: a list of views or a preset
+        name, False for no augmentation. All views go through the model as
+        one batch and their class probabilities are averaged. quality
+        overrides QUALITY_GATE (reject, flag or off).
+        """
+        img = load_image(image_path, self.img_size, self.reduced_decode, self.decode_resample)
+        return self.predict_array(np.asarray(img), bgr=False, tta=tta, quality=quality)
+    
+    def predict_array(self, image, bgr=True, tta=None, quality=None):
+        """Predict from an (H, W, 3) uint8 image in memory, BGR (OpenCV) by default
+        
+        Frames that are not size x size yet are resized into a preallocated
+        buffer. Channel order and scaling are handled in the graph. Frames
+        the quality gate rejects come back as prediction 'rejected' with
+        rejected=True and the reasons under 'quality', without running the
+        model.
+        """
         if self.model is None:
             self.load_model(os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'))
         
-        img = tf.keras.preprocessing.image.load_img(
-            image_path, 
-            target_size=(self.img_size, self.img_size)
-        )
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        img_array = tf.expand_dims(img_array, 0) / 255.0
+        views = self.tta_views if tta is None else parse_views(tta)
+        if image.shape[:2] != (self.img_size, self.img_size):
+            image = self.prepare_frame(image)
+        
+        report = self.quality_gate.check(image, bgr, quality)
+        if report is not None and report['action'] == 'reject':
+            return {
+                'prediction': 'rejected',
+                'confidence': 0.0,
+                'all_predictions': {},
+                'rejected': True,
+                'quality': report
+            }
         
-        predictions = self.model.predict(img_array)
-        predicted_class = self.classes[np.argmax(predictions[0])]
-        confidence = float(np.max(predictions[0]))
+        batch = image[np.newaxis]
         
-        return {
-            'prediction': predicted_class,
-            'confidence': confidence,
+        if views:
+            view_predictions = self.serving_fn()(make_views(batch, views, self.tta_crop_fraction), bgr).numpy()
+            probabilities = aggregate(view_predictions, self.tta_aggregate)
+        else:
+            probabilities = self.serving_fn()(batch, bgr).numpy()[0]
+        predicted_index = int(np.argmax(probabilities))
+        
+        result = {
+            'prediction': self.classes[predicted_index],
+            'confidence': float(probabilities[predicted_index]),
             'all_predictions': {
-                self.classes[i]: float(predictions[0][i]) 
+                self.classes[i]: float(probabilities[i]) 
                 for i in range(len(self.classes))
             }
         }
+        if views:
+            result['tta'] = {
+                'views': views,
+                'aggregate': self.tta_aggregate,
+                # Share of views whose own top class matches the aggregated one
+                'agreement': float(np.mean(np.argmax(view_predictions, axis=1) == predicted_index))
+            }
+        if report is not None:
+            result['quality'] = report
+        return result
+    
+    def predict_tiled(self, image_path, tile_size=None, overlap=None, min_vegetation=None):
+        """Prediksi whole-plant / canopy photo per tile
+        
+        The image is cut into overlapping tiles of tile_size original
+        pixels (TILE_SIZE), tiles with less than min_vegetation green
+        pixels are skipped and the rest go through the model as one batch.
+        The result has the usual prediction fields for the whole image plus
+        a 'tiles' entry with per-tile probabilities and a disease heatmap.
+        """
+        tile_size = tile_size or self.tile_size
+        image, scale = load_for_tiles(image_path, tile_size, self.img_size, self.reduced_decode)
+        result = self.predict_tiled_array(image, bgr=False, tile_size=tile_size * scale,
+                                          overlap=overlap, min_vegetation=min_vegetation)
+        # Report tile boxes in original image pixels
+        for tile in result['tiles']['items']:
+            tile['box'] = [round(v / scale) for v in tile['box']]
+        result['tiles']['tile_size'] = round(result['tiles']['tile_size'] / scale)
+        result['tiles']['image_size'] = [round(image.shape[1] / scale), round(image.shape[0] / scale)]
+        return result
     
-    def plot_training_history(self, history):
-        """Plot training history"""
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+    def predict_tiled_array(self, image, bgr=True, tile_size=None, overlap=None, min_vegetation=None):
+        """Tiled prediction of an (H, W, 3) uint8 image in memory, tile_size in its pixels"""
+        if self.model is None:
+            self.load_model(os.getenv('MODEL_PATH', 'models/chili_disease_model.h5'))
+        
+        tile_size = tile_size or self.tile_size
+        # Past MAX_TILE_OVERLAP the stride shrinks towards one pixel and the grid explodes
+        overlap = min(max(self.tile_overlap if overlap is None else overlap, 0.0), MAX_TILE_OVERLAP)
+        min_vegetation = self.tile_min_vegetation if min_vegetation is None else min_vegetation
+        height, width = image.shape[:2]
+        
+        # Larger tiles until the grid fits in one batch of TILE_MAX. Tiles stop
+        # growing at the short side, from there on less overlap widens the stride
+        grid = tile_grid(width, height, tile_size, overlap)
+        while len(grid) * len(grid[0]) > self.tile_max and tile_size < min(width, height):
+            tile_size = min(tile_size * 1.25, min(width, height))
+            grid = tile_grid(width, height, tile_size, overlap)
+        while len(grid) * len(grid[0]) > self.tile_max and overlap > 0:
+            overlap = max(round(overlap - 0.05, 2), 0.0)
+            grid = tile_grid(width, height, tile_size, overlap)
+        tiles = [tile for row in grid for tile in row]
+        
+        vegetation = vegetation_fractions(image, tiles, bgr)
+        selected = [i for i, fraction in enumerate(vegetation) if fraction >= min_vegetation]
+        # Nothing looks like a plant (odd lighting, mask misses): classify everything rather than nothing
+        fallback = not selected
+        if fallback:
+            selected = list(range(len(tiles)))
+        
+        # One pass unless even non-overlapping short-side tiles exceed TILE_MAX (long panoramas)
+        probabilities = []
+        for start in range(0, len(selected), self.tile_max):
+            chunk = selected[start:start + self.tile_max]
+            batch = self.input_buffer(self.tile_max)[:len(chunk)]
+            for slot, i in enumerate(chunk):
+                x, y, size = tiles[i]
+                resize_into(image[y:y + size, x:x + size], batch[slot], self.decode_resample)
+            probabilities.append(self.serving_fn()(batch, bgr).numpy())
+        probabilities = np.concatenate(probabilities)
+        
+        result = aggregate_tiles(probabilities, [vegetation[i] for i in selected], self.classes,
+                                 self.tile_threshold)
+        disease = disease_probability(probabilities, self.classes)
+        items = []
+        heatmap = [[None] * len(grid[0]) for _ in grid]
+        for i, (x, y, size) in enumerate(tiles):
+            row, col = divmod(i, len(grid[0]))
+            items.append({'row': row, 'col': col, 'box': [x, y, size, size],
+                          'vegetation': round(vegetation[i], 3)})
+        for slot, i in enumerate(selected):
+            tile_probabilities = probabilities[slot]
+            top = int(np.argmax(tile_probabilities))
+            items[i].update({
+                'prediction': self.classes[top],
+                'confidence': float(tile_probabilities[top]),
+                'disease_probability': float(disease[slot]),
+                'probabilities': {name: float(p) for name, p in zip(self.classes, tile_probabilities)},
+            })
+            heatmap[items[i]['row']][items[i]['col']] = round(float(disease[slot]), 4)
+        
+        result['tiles'] = {
+            'rows': len(grid),
+            'cols': len(grid[0]),
+            'tile_size': tiles[0][2],
+            'overlap': overlap,
+            'classified': len(selected),
+            'skipped': len(tiles) - len(selected),
+            'vegetation_fallback': fallback,
+            'threshold': self.tile_threshold,
+            # Disease probability (1 - healthy) per tile, None where the tile was skipped as background
+            'heatmap': heatmap,
+            'items': items,
+        }
+        return result
+    
+    def plot_training_history(self, history, show_throughput=True):
+        """Plot training history
+        
+        With show_throughput, a third panel shows training images/sec per
+        epoch when the history has it (ThroughputCallback adds it).
+        """
+        throughput = history.history.get('images_per_sec') if show_throughput else None
+        if throughput:
+            fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(18, 4))
+        else:
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
         
         ax1.plot(history.history['accuracy'])
         ax1.plot(history.history['val_accuracy'])
@@ -243,6 +786,12 @@ class ChiliDiseaseModel:
         ax2.set_ylabel('Loss')
         ax2.legend(['Train', 'Validation'])
         
+        if throughput:
+            ax3.plot(throughput)
+            ax3.set_title('Training Throughput')
+            ax3.set_xlabel('Epoch')
+            ax3.set_ylabel('Images/sec')
+        
         plt.tight_layout()
         plt.savefig('models/training_history.png')
         plt.show()
@@ -0,0 +1,277 @@
+import os
+import csv
+import json
+import time
+import queue
+import resource
+import multiprocessing
+import numpy as np
+
+try:
+    from dataset_shards import compile_split, is_shard_dir, ShardedSplit
+    from evaluation import classification_metrics, confusion_matrix
+except ImportError:
+    from .dataset_shards import compile_split, is_shard_dir, ShardedSplit
+    from .evaluation import classification_metrics, confusion_matrix
+
+
+def predecode_split(split_path, img_size, cache_dir, resample='nearest'):
+    """Decode a test split once into memory-mapped shards shared by all variants
+
+    Compiled shard directories are used as they are. Image folders are
+    compiled into cache_dir (only new images are decoded on later runs),
+    so every variant process reads the same pages from the OS page cache.
+    """
+    if is_shard_dir(split_path):
+        return split_path
+    output_dir = os.path.join(cache_dir, f"{os.path.basename(os.path.normpath(split_path))}_{img_size}")
+    compile_split(split_path, output_dir, img_size, resample=resample)
+    return output_dir
+
+
+def model_size_mb(path):
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, name))
+                    for root, _, files in os.walk(path) for name in files)
+    else:
+        total = os.path.getsize(path)
+    return total / (1024 * 1024)
+
+
+def variant_backend(path):
+    return 'tflite' if path.endswith('.tflite') else 'keras'
+
+
+class KerasRunner:
+    """Batched inference with a Keras .h5 / .keras model"""
+
+    def __init__(self, path, threads):
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+        self.tf = tf
+        self.model = tf.keras.models.load_model(path, compile=False)
+        self.img_size = self.model.input_shape[1]
+        self.predict_batch = tf.function(lambda x: self.model(x, training=False), reduce_retracing=True)
+
+    def predict(self, images):
+        return self.predict_batch(self.tf.convert_to_tensor(images)).numpy()
+
+
+class TFLiteRunner:
+    """Batched inference with a .tflite model, (de)quantizing integer inputs/outputs"""
+
+    def __init__(self, path, threads):
+        import tensorflow as tf
+        self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.img_size = int(self.input['shape'][1])
+        self.batch = int(self.input['shape'][0])
+
+    def predict(self, images):
+        if len(images) != self.batch:
+            self.interpreter.resize_tensor_input(self.input['index'], [len(images)] + list(images.shape[1:]))
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch = len(images)
+
+        scale, zero_point = self.input['quantization']
+        if self.input['dtype'] != np.float32 and scale:
+            images = np.round(images / scale + zero_point)
+        self.interpreter.set_tensor(self.input['index'], images.astype(self.input['dtype']))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output['index'])
+
+        scale, zero_point = self.output['quantization']
+        if self.output['dtype'] != np.float32 and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def _resize(images, img_size):
+    """Normalize uint8 batches to 0-1 floats at the variant's input size"""
+    images = images.astype(np.float32) / 255.0
+    if images.shape[1] != img_size:
+        import tensorflow as tf
+        images = tf.image.resize(images, (img_size, img_size)).numpy()
+    return images
+
+
+def evaluate_variant(name, path, shard_dir, batch_size=64, latency_runs=50, cores=None):
+    """Accuracy, per-class recall, batch-1 latency, throughput and peak RSS of one model"""
+    threads = len(cores) if cores else (os.cpu_count() or 1)
+    backend = variant_backend(path)
+    runner = TFLiteRunner(path, threads) if backend == 'tflite' else KerasRunner(path, threads)
+    split = ShardedSplit(shard_dir)
+
+    # Warm up (graph tracing / tensor allocation) before timing
+    runner.predict(_resize(split.get_images(np.arange(min(batch_size, len(split)))), runner.img_size))
+
+    predictions = []
+    start_time = time.perf_counter()
+    for start in range(0, len(split), batch_size):
+        positions = np.arange(start, min(start + batch_size, len(split)))
+        predictions.append(np.argmax(runner.predict(_resize(split.get_images(positions), runner.img_size)), axis=1))
+    seconds = time.perf_counter() - start_time
+    y_pred = np.concatenate(predictions) if predictions else np.array([], dtype=np.int64)
+
+    single = _resize(split.get_images(np.arange(1)), runner.img_size)
+    for _ in range(5):
+        runner.predict(single)
+    timings = []
+    for _ in range(latency_runs):
+        start = time.perf_counter()
+        runner.predict(single)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    metrics = classification_metrics(confusion_matrix(split.labels, y_pred, len(split.classes)), split.classes)
+    return {
+        'variant': name,
+        'path': path,
+        'backend': backend,
+        'img_size': runner.img_size,
+        'accuracy': metrics['accuracy'],
+        'recall': {row['class']: row['recall'] for row in metrics['per_class']},
+        'macro_f1': metrics['macro_avg']['f1'],
+        'latency_p50_ms': float(np.percentile(timings, 50)),
+        'latency_p95_ms': float(np.percentile(timings, 95)),
+        'images_per_sec': len(split) / seconds if seconds > 0 else 0.0,
+        'size_mb': model_size_mb(path),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'threads': threads,
+    }
+
+
+def _variant_process(name, path, shard_dir, batch_size, latency_runs, cores, results):
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    try:
+        results.put(evaluate_variant(name, path, shard_dir, batch_size, latency_runs, cores))
+    except Exception as e:
+        results.put({'variant': name, 'path': path, 'error': str(e)})
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, None where it is not available"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def plan_jobs(requested, num_variants, memory_per_job_mb):
+    """Parallel variant processes: requested, else as many as memory allows"""
+    if requested:
+        return max(1, min(requested, num_variants))
+    memory = available_memory_mb()
+    by_memory = int(memory // memory_per_job_mb) if memory else 1
+    return max(1, min(by_memory, num_variants, os.cpu_count() or 1))
+
+
+def compare_variants(variants, shard_dir, jobs=1, batch_size=64, latency_runs=50):
+    """Evaluate (name, path) variants, `jobs` at a time in separate processes
+
+    Each process gets its own disjoint set of CPU cores, so concurrent
+    variants do not skew each other's latency. Processes are started with
+    spawn so every variant begins with a fresh TensorFlow runtime and its
+    own peak RSS.
+    """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+        else list(range(os.cpu_count() or 1))
+    jobs = max(1, min(jobs, len(cores)))
+    per_job = len(cores) // jobs
+    core_slots = [cores[i * per_job:(i + 1) * per_job] for i in range(jobs)]
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    pending = list(variants)
+    running = {}  # slot -> (name, process)
+    collected = []
+
+    while pending or running:
+        for slot in range(jobs):
+            if slot not in running and pending:
+                name, path = pending.pop(0)
+                process = context.Process(
+                    target=_variant_process,
+                    args=(name, path, shard_dir, batch_size, latency_runs, core_slots[slot], results)
+                )
+                process.start()
+                running[slot] = (name, process)
+                print(f"Evaluating {name} on cores {core_slots[slot][0]}-{core_slots[slot][-1]}")
+
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            result = None
+        if result is not None:
+            collected.append(result)
+            if 'error' in result:
+                print(f"  {result['variant']}: failed ({result['error']})")
+            else:
+                print(f"  {result['variant']}: accuracy {result['accuracy']:.4f}, "
+                      f"{result['latency_p50_ms']:.1f} ms p50, {result['images_per_sec']:.1f} images/sec")
+
+        for slot, (name, process) in list(running.items()):
+            if not process.is_alive() and any(r['variant'] == name for r in collected):
+                process.join()
+                del running[slot]
+            elif not process.is_alive() and process.exitcode not in (None, 0):
+                collected.append({'variant': name, 'error': f"exit code {process.exitcode}"})
+                del running[slot]
+
+    order = [name for name, _ in variants]
+    return sorted(collected, key=lambda r: order.index(r['variant']))
+
+
+def recommend(results, max_accuracy_drop=0.01):
+    """Fastest variant within max_accuracy_drop of the most accurate one"""
+    valid = [r for r in results if 'error' not in r]
+    if not valid:
+        return None
+    best_accuracy = max(r['accuracy'] for r in valid)
+    candidates = [r for r in valid if r['accuracy'] >= best_accuracy - max_accuracy_drop]
+    return min(candidates, key=lambda r: r['latency_p50_ms'])
+
+
+def write_comparison(results, output_dir, selected=None):
+    """Write comparison.json, comparison.csv and comparison.md, returns the table"""
+    os.makedirs(output_dir, exist_ok=True)
+    valid = [r for r in results if 'error' not in r]
+    classes = list(valid[0]['recall']) if valid else []
+
+    with open(os.path.join(output_dir, 'comparison.json'), 'w') as f:
+        json.dump({'results': results, 'selected': selected['variant'] if selected else None}, f, indent=2)
+
+    columns = ['variant', 'backend', 'img_size', 'accuracy', 'macro_f1'] + [f"recall_{c}" for c in classes] + \
+        ['latency_p50_ms', 'latency_p95_ms', 'images_per_sec', 'size_mb', 'peak_rss_mb']
+    with open(os.path.join(output_dir, 'comparison.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + ['error'])
+        for r in results:
+            row = {**r, **{f"recall_{c}": v for c, v in r.get('recall', {}).items()}}
+            writer.writerow([row.get(c, '') for c in columns] + [r.get('error', '')])
+
+    header = ['Variant', 'Backend', 'Input', 'Accuracy'] + [f"Recall {c}" for c in classes] + \
+        ['p50 (ms)', 'p95 (ms)', 'Images/sec', 'Size (MB)', 'Peak RSS (MB)']
+    lines = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+    for r in results:
+        if 'error' in r:
+            lines.append(f"| {r['variant']} | failed: {r['error']} |")
+            continue
+        name = r['variant'] + (' (selected)' if selected and r['variant'] == selected['variant'] else '')
+        cells = [name, r['backend'], str(r['img_size']), f"{r['accuracy']:.4f}"] + \
+            [f"{r['recall'][c]:.3f}" for c in classes] + \
+            [f"{r['latency_p50_ms']:.1f}", f"{r['latency_p95_ms']:.1f}", f"{r['images_per_sec']:.1f}",
+             f"{r['size_mb']:.2f}", f"{r['peak_rss_mb']:.0f}"]
+        lines.append('| ' + ' | '.join(cells) + ' |')
+    with open(os.path.join(output_dir, 'comparison.md'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return '\n'.join(lines)
@@ -0,0 +1,215 @@
+import os
+import gzip
+import zlib
+import shutil
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+from tensorflow.keras.layers import BatchNormalization, Conv2D, Dense
+from tensorflow.keras.optimizers import Adam
+
+
+def optimizable_layers(model, min_params=1024):
+    """Conv2D / Dense layers whose kernels are worth pruning or clustering
+
+    Depthwise convolutions and small kernels hold few weights but are
+    sensitive to compression, so they are left alone.
+    """
+    return [layer for layer in model.layers
+            if isinstance(layer, (Conv2D, Dense)) and int(np.prod(layer.kernel.shape)) >= min_params]
+
+
+def polynomial_sparsity(step, final_sparsity, end_step, initial_sparsity=0.0, power=3):
+    """Sparsity at a step: fast pruning early, slowing towards final_sparsity"""
+    progress = min(1.0, step / max(1, end_step))
+    return final_sparsity + (initial_sparsity - final_sparsity) * (1 - progress) ** power
+
+
+class MagnitudePruning(Callback):
+    """Gradual magnitude pruning of layer kernels during fine-tuning
+
+    Every `frequency` steps the smallest-magnitude weights of each kernel
+    are masked up to the scheduled sparsity; the mask is re-applied after
+    every batch so pruned weights stay zero. Works on plain Keras layers,
+    so there are no wrappers to strip afterwards.
+    """
+
+    def __init__(self, layers, final_sparsity, total_steps):
+        super().__init__()
+        self.layers = layers
+        self.final_sparsity = final_sparsity
+        # Reach the final sparsity at 70% of the run, the rest recovers accuracy
+        self.end_step = max(1, int(total_steps * 0.7))
+        self.frequency = max(1, self.end_step // 10)
+        self.masks = [tf.ones(layer.kernel.shape) for layer in layers]
+        self.step = 0
+
+    def update_masks(self, sparsity):
+        if sparsity <= 0:
+            return
+        for index, layer in enumerate(self.layers):
+            weights = np.abs(layer.kernel.numpy())
+            threshold = np.quantile(weights, sparsity)
+            self.masks[index] = tf.constant((weights > threshold).astype(np.float32))
+
+    def apply_masks(self):
+        for layer, mask in zip(self.layers, self.masks):
+            layer.kernel.assign(layer.kernel * mask)
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.step % self.frequency == 0 and self.step <= self.end_step:
+            self.update_masks(polynomial_sparsity(self.step, self.final_sparsity, self.end_step))
+        self.apply_masks()
+        self.step += 1
+
+    def on_train_end(self, logs=None):
+        self.update_masks(self.final_sparsity)
+        self.apply_masks()
+
+
+def kmeans_1d(values, num_clusters, iterations=20):
+    """Cluster scalar weights, centroids initialized linearly between min and max"""
+    centroids = np.linspace(values.min(), values.max(), num_clusters)
+    for _ in range(iterations):
+        assignments = np.argmin(np.abs(values[:, None] - centroids[None, :]), axis=1)
+        for cluster in range(num_clusters):
+            members = values[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean()
+    assignments = np.argmin(np.abs(values[:, None] - centroids[None, :]), axis=1)
+    return centroids, assignments
+
+
+class WeightClustering(Callback):
+    """Weight sharing: each kernel keeps only num_clusters distinct values
+
+    Kernels are clustered once with k-means. During fine-tuning the weights
+    move freely for a batch, then every cluster is snapped back to the mean
+    of its members, so the centroids are what gets trained. Zeros left by
+    pruning stay zero (sparsity-preserving clustering).
+    """
+
+    def __init__(self, layers, num_clusters=16):
+        super().__init__()
+        self.layers = layers
+        self.num_clusters = num_clusters
+        self.assignments = []
+        self.nonzero = []
+
+        for layer in layers:
+            kernel = layer.kernel.numpy()
+            nonzero = kernel != 0
+            _, assignments = kmeans_1d(kernel[nonzero], num_clusters)
+            full = np.full(kernel.shape, -1, dtype=np.int32)
+            full[nonzero] = assignments
+            self.assignments.append(full)
+            self.nonzero.append(nonzero)
+        self.snap()
+
+    def snap(self):
+        for layer, assignments, nonzero in zip(self.layers, self.assignments, self.nonzero):
+            kernel = layer.kernel.numpy()
+            values = kernel[nonzero]
+            flat_assignments = assignments[nonzero]
+            sums = np.bincount(flat_assignments, weights=values, minlength=self.num_clusters)
+            counts = np.bincount(flat_assignments, minlength=self.num_clusters)
+            centroids = sums / np.maximum(counts, 1)
+            clustered = np.zeros_like(kernel)
+            clustered[nonzero] = centroids[flat_assignments]
+            layer.kernel.assign(clustered)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.snap()
+
+    def on_train_end(self, logs=None):
+        self.snap()
+
+
+def make_trainable_for_optimization(model, layers, train_all=False):
+    """Train only the pruned / clustered layers during the fine-tuning schedule
+
+    The rest of the network keeps its trained (frozen backbone) weights.
+    train_all unfreezes every layer except BatchNormalization instead,
+    which can recover more accuracy but also retrains the backbone.
+    """
+    optimized = {id(layer) for layer in layers}
+    for layer in model.layers:
+        if train_all:
+            layer.trainable = not isinstance(layer, BatchNormalization)
+        else:
+            layer.trainable = id(layer) in optimized
+
+
+def kernel_stats(layers):
+    """Overall sparsity and the largest number of distinct values per kernel"""
+    total, zeros, distinct = 0, 0, 0
+    for layer in layers:
+        kernel = layer.kernel.numpy()
+        total += kernel.size
+        zeros += int(np.sum(kernel == 0))
+        distinct = max(distinct, len(np.unique(kernel)))
+    return {'sparsity': zeros / max(total, 1), 'max_unique_values': distinct}
+
+
+def gzip_size(path):
+    """Size in bytes of a file after gzip compression, without writing it"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            size += len(compressor.compress(chunk))
+    return size + len(compressor.flush())
+
+
+def gzip_model(path):
+    """Gzip a saved model for transfer, returns (gz path, compressed bytes)"""
+    gz_path = path + '.gz'
+    with open(path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst)
+    return gz_path, os.path.getsize(gz_path)
+
+
+def optimize_model(model, train_ds, method='prune', sparsity=0.5, num_clusters=16,
+                   epochs=2, learning_rate=0.00001, steps_per_epoch=None, train_all=False):
+    """Prune and/or cluster a trained classifier with a short fine-tuning schedule
+
+    method is 'prune', 'cluster' or 'prune_cluster' (prune first, then
+    cluster the remaining weights). The model is modified in place and
+    stays a plain Keras model, ready to save. steps_per_epoch is needed
+    for repeated datasets and compiled shards, whose cardinality is
+    unknown; the pruning schedule is derived from it. Only the optimized
+    layers are fine-tuned unless train_all is set.
+    """
+    if method not in ('prune', 'cluster', 'prune_cluster'):
+        raise ValueError(f"Unknown optimization method: {method}")
+
+    # Cardinality is -1 (infinite) or -2 (unknown, e.g. from_generator shards) when it cannot be counted
+    steps = steps_per_epoch or int(tf.data.experimental.cardinality(train_ds).numpy())
+    if steps <= 0:
+        raise ValueError("Cannot count the batches of the training dataset, pass steps_per_epoch "
+                         "(ceil(train images / batch size))")
+
+    layers = optimizable_layers(model)
+    make_trainable_for_optimization(model, layers, train_all)
+    histories = {}
+
+    stages = []
+    if method in ('prune', 'prune_cluster'):
+        stages.append(('prune', lambda: MagnitudePruning(layers, sparsity, steps * epochs)))
+    if method in ('cluster', 'prune_cluster'):
+        stages.append(('cluster', lambda: WeightClustering(layers, num_clusters)))
+
+    for name, make_callback in stages:
+        callback = make_callback()
+        print(f"\n{name}: {len(layers)} layers, {epochs} fine-tuning epochs")
+        model.compile(
+            optimizer=Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        history = model.fit(train_ds, epochs=epochs, steps_per_epoch=steps_per_epoch,
+                            callbacks=[callback], verbose=2)
+        histories[name] = history.history
+        print(f"{name}: {kernel_stats(layers)}")
+
+    return model, histories
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Dense
+from tensorflow.keras.models import Model
+from dotenv import load_dotenv
+
+try:
+    from feature_cache import backbone_fingerprint, find_cached_features
+except ImportError:
+    from .feature_cache import backbone_fingerprint, find_cached_features
+
+load_dotenv()
+
+
+def head_accuracy(weights, features, labels):
+    """Accuracy of Dense head weights [kernel, bias] on pooled features"""
+    logits = features @ weights[0] + weights[1]
+    return float(np.mean(np.argmax(logits, axis=1) == labels))
+
+
+class OnlineHeadTrainer:
+    """Online update untuk classifier head dari sampel lapangan yang sudah dilabeli
+
+    Labeled images are embedded once with the frozen backbone of the served
+    model and kept in a bounded replay buffer. A background thread refits the
+    Dense head on the buffer plus the training features cached by
+    train_head_cached, and publishes it as a new model version that shares
+    the backbone layers, so nothing is reloaded and the swap is a single
+    reference assignment on ChiliDiseaseModel.model. A head that scores
+    worse than the served one on the held-out set is not published.
+    """
+
+    def __init__(self, chili_model, storage_dir=None):
+        self.chili_model = chili_model
+        self.storage_dir = storage_dir or os.getenv('ONLINE_STORAGE_DIR', 'models/online')
+        self.buffer_size = int(os.getenv('ONLINE_BUFFER_SIZE', 2000))
+        self.refit_interval = float(os.getenv('ONLINE_REFIT_INTERVAL', 300))
+        self.min_new_samples = int(os.getenv('ONLINE_MIN_NEW_SAMPLES', 10))
+        self.learning_rate = float(os.getenv('ONLINE_LEARNING_RATE', 0.001))
+        self.refit_epochs = int(os.getenv('ONLINE_REFIT_EPOCHS', 30))
+        self.cache_dir = os.getenv('ONLINE_FEATURE_CACHE', 'models/feature_cache')
+        self.seed_size = int(os.getenv('ONLINE_SEED_SIZE', 2000))
+        self.holdout_fraction = float(os.getenv('ONLINE_HOLDOUT_FRACTION', 0.2))
+        self.max_regression = float(os.getenv('ONLINE_MAX_REGRESSION', 0.0))
+
+        self.buffer = deque(maxlen=self.buffer_size)
+        self.lock = threading.Lock()
+        self.refit_lock = threading.Lock()
+        self.new_samples = 0
+        self.version = 0
+        self.history = []
+        self.running = False
+        self.worker = None
+        self.wake_event = threading.Event()
+        # Training-set features (never evicted by field samples) and the held-out set
+        self.seed = None
+        self.holdout = None
+
+        model = chili_model.model
+        # Pooled features feeding the final Dense layer (Dropout is identity at inference)
+        self.feature_tensor = model.layers[-1].input
+        self.extractor = Model(inputs=model.inputs, outputs=self.feature_tensor)
+        self.base_head_weights = model.layers[-1].get_weights()
+
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self._load_state()
+        self._seed_from_cache()
+
+        # Serve the last published head again after a restart
+        if self.version > 0:
+            try:
+                self.chili_model.swap_model(self._build_model(self._load_head(self.version), self.version))
+            except ValueError as e:
+                print(f"Online head not restored: {e}")
+
+    # ------------------------------------------------------------------
+    # Samples
+    # ------------------------------------------------------------------
+
+    def add_sample(self, image_path, label):
+        """Embed a labeled image and add it to the replay buffer"""
+        if label not in self.chili_model.classes:
+            raise ValueError(f"Unknown label '{label}', expected one of {self.chili_model.classes}")
+
+        img_array = self.chili_model.load_image_array(image_path)
+        embedding = self.extractor.predict_on_batch(img_array)[0].astype(np.float16)
+
+        with self.lock:
+            self.buffer.append((embedding, self.chili_model.classes.index(label), time.time()))
+            self.new_samples += 1
+            pending = self.new_samples
+
+        if pending >= self.min_new_samples:
+            self.wake_event.set()
+        return self.get_status()
+
+    def seed_from_features(self, features, labels):
+        """Seed every refit with features of the original training set
+
+        Keeps the refit from forgetting classes that are rare in field samples
+        (e.g. the cache written by train_head_cached). They are kept apart
+        from the replay buffer, so field samples never evict them, and
+        subsampled to ONLINE_SEED_SIZE.
+        """
+        features = np.asarray(features, dtype=np.float16)
+        labels = np.asarray(labels, dtype=np.int32)
+        if len(labels) > self.seed_size:
+            keep = np.random.default_rng(0).choice(len(labels), self.seed_size, replace=False)
+            features, labels = features[keep], labels[keep]
+        with self.lock:
+            self.seed = (features, labels)
+
+    def _seed_from_cache(self):
+        """Seed from the cached train split and hold out the cached val split
+
+        Only caches written by the served model's backbone are used (e.g.
+        train_head_cached, whose backbone stays frozen). After fine_tune the
+        backbone differs, its fingerprint does not match and refits use
+        field samples only.
+        """
+        img_size = self.chili_model.img_size
+        fingerprint = backbone_fingerprint(self.extractor)
+        train = find_cached_features(self.cache_dir, 'train', img_size, fingerprint)
+        if train is not None:
+            self.seed_from_features(*train)
+            print(f"Online refits seeded with {len(self.seed[1])} cached training features")
+        else:
+            print(f"No training features of the served backbone ({fingerprint}) in {self.cache_dir}, "
+                  f"refits use field samples only")
+        val = find_cached_features(self.cache_dir, 'val', img_size, fingerprint)
+        if val is not None:
+            self.holdout = (val[0].astype(np.float32), val[1].astype(np.int32))
+            print(f"Online heads checked on {len(val[1])} cached validation features")
+        else:
+            print(f"No cached validation features in {self.cache_dir}, "
+                  f"holding out {self.holdout_fraction:.0%} of the field samples instead")
+
+    # ------------------------------------------------------------------
+    # Refit and publish
+    # ------------------------------------------------------------------
+
+    def refit(self):
+        """Refit the Dense head and publish it as a new version unless it scores worse
+
+        The candidate and the served head are compared on the held-out set
+        (cached validation features, or a random share of the field samples).
+        A candidate more than ONLINE_MAX_REGRESSION below the served head is
+        recorded with rejected=True and not published.
+        """
+        with self.refit_lock:
+            with self.lock:
+                if not self.buffer:
+                    return None
+                samples = list(self.buffer)
+                seed = self.seed
+                self.new_samples = 0
+
+            features = np.stack([s[0] for s in samples]).astype(np.float32)
+            labels = np.array([s[1] for s in samples], dtype=np.int32)
+
+            holdout = self.holdout
+            if holdout is None:
+                held_out = np.random.default_rng().random(len(labels)) < self.holdout_fraction
+                if held_out.any() and not held_out.all():
+                    holdout = (features[held_out], labels[held_out])
+                    features, labels = features[~held_out], labels[~held_out]
+            if seed is not None:
+                features = np.concatenate([features, seed[0].astype(np.float32)])
+                labels = np.concatenate([labels, seed[1]])
+
+            # Balance classes so a burst of one disease does not dominate the head
+            counts = np.bincount(labels, minlength=self.chili_model.num_classes)
+            sample_weights = (len(labels) / (len(counts[counts > 0]) * counts[labels])).astype(np.float32)
+
+            start_time = time.time()
+            head = self.chili_model.create_head(features.shape[1])
+            head.layers[-1].set_weights(self.chili_model.model.layers[-1].get_weights())
+            head.optimizer.learning_rate.assign(self.learning_rate)
+            history = head.fit(
+                features,
+                tf.keras.utils.to_categorical(labels, self.chili_model.num_classes),
+                sample_weight=sample_weights,
+                batch_size=64,
+                epochs=self.refit_epochs,
+                verbose=0
+            )
+
+            weights = head.layers[-1].get_weights()
+            info = {
+                'samples': int(len(labels)),
+                'class_counts': counts.tolist(),
+                'train_accuracy': float(history.history['accuracy'][-1]),
+                'refit_seconds': round(time.time() - start_time, 2)
+            }
+            if holdout is not None:
+                info['holdout_samples'] = int(len(holdout[1]))
+                info['holdout_accuracy'] = head_accuracy(weights, *holdout)
+                info['served_holdout_accuracy'] = head_accuracy(
+                    self.chili_model.model.layers[-1].get_weights(), *holdout)
+
+                if info['holdout_accuracy'] < info['served_holdout_accuracy'] - self.max_regression:
+                    record = {'rejected': True, 'serving_version': self.version,
+                              'timestamp': datetime.now().isoformat()}
+                    record.update(info)
+                    self.history.append(record)
+                    self._save_state()
+                    print(f"Online head not published: held-out accuracy {info['holdout_accuracy']:.4f} "
+                          f"< served {info['served_holdout_accuracy']:.4f}")
+                    return record
+
+            record = self.publish(weights, info)
+            print(f"Online head v{record['version']} published "
+                  f"({record['samples']} samples, {record['refit_seconds']}s)")
+            return record
+
+    def _build_model(self, weights, version):
+        """Model with a new Dense head on top of the served backbone layers"""
+        head = Dense(self.chili_model.num_classes, activation='softmax',
+                     name=f"online_head_v{version}")
+        new_model = Model(inputs=self.extractor.inputs, outputs=head(self.feature_tensor))
+        head.set_weights(weights)
+        return new_model
+
+    def _load_head(self, version):
+        path = os.path.join(self.storage_dir, f"head_v{version}.npz")
+        if not os.path.exists(path):
+            raise ValueError(f"Head version {version} not found")
+        data = np.load(path)
+        return [data['kernel'], data['bias']]
+
+    def publish(self, weights, info=None):
+        """Swap in a new head version sharing the served backbone"""
+        new_model = self._build_model(weights, self.version + 1)
+
+        self.version += 1
+        np.savez(os.path.join(self.storage_dir, f"head_v{self.version}.npz"),
+                 kernel=weights[0], bias=weights[1])
+        record = {'version': self.version, 'timestamp': datetime.now().isoformat()}
+        record.update(info or {})
+        self.history.append(record)
+
+        # Traces the serving function before the swap so requests never pay for it
+        self.chili_model.swap_model(new_model)
+        self._save_state()
+        return record
+
+    def rollback(self, version):
+        """Publish the head weights of an earlier version (0 = original head)"""
+        weights = self.base_head_weights if version == 0 else self._load_head(version)
+        return self.publish(weights, {'rollback_of': version})
+
+    # ------------------------------------------------------------------
+    # Background worker
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the background refit thread"""
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self._worker)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout=5.0)
+
+    def _worker(self):
+        while self.running:
+            self.wake_event.wait(timeout=self.refit_interval)
+            self.wake_event.clear()
+            if not self.running:
+                break
+            if self.new_samples == 0:
+                continue
+            try:
+                self.refit()
+            except Exception as e:
+                print(f"Online refit error: {e}")
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _save_state(self):
+        with self.lock:
+            samples = list(self.buffer)
+        if samples:
+            np.savez(
+                os.path.join(self.storage_dir, 'replay_buffer.npz'),
+                features=np.stack([s[0] for s in samples]),
+                labels=np.array([s[1] for s in samples], dtype=np.int32),
+                timestamps=np.array([s[2] for s in samples])
+            )
+        with open(os.path.join(self.storage_dir, 'state.json'), 'w') as f:
+            json.dump({'version': self.version, 'history': self.history[-50:]}, f, indent=2)
+
+    def _load_state(self):
+        """Restore the replay buffer and version counter from a previous run"""
+        buffer_path = os.path.join(self.storage_dir, 'replay_buffer.npz')
+        if os.path.exists(buffer_path):
+            data = np.load(buffer_path)
+            for feature, label, ts in zip(data['features'], data['labels'], data['timestamps']):
+                self.buffer.append((feature, int(label), float(ts)))
+
+        state_path = os.path.join(self.storage_dir, 'state.json')
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            self.version = state.get('version', 0)
+            self.history = state.get('history', [])
+
+    def get_status(self):
+        """Get online learning status"""
+        with self.lock:
+            labels = [s[1] for s in self.buffer]
+            pending = self.new_samples
+        counts = np.bincount(labels, minlength=self.chili_model.num_classes) if labels else \
+            np.zeros(self.chili_model.num_classes, dtype=int)
+        return {
+            'running': self.running,
+            'version': self.version,
+            'buffer_size': len(labels),
+            'buffer_capacity': self.buffer_size,
+            'pending_samples': pending,
+            'seed_samples': len(self.seed[1]) if self.seed is not None else 0,
+            'holdout_samples': len(self.holdout[1]) if self.holdout is not None else 0,
+            'class_counts': dict(zip(self.chili_model.classes, counts.tolist())),
+            'last_refit': self.history[-1] if self.history else None
+        }
@@ -0,0 +1,105 @@
+import threading
+import cv2
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+RESAMPLE_FILTERS = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'box': Image.BOX,
+    'lanczos': Image.LANCZOS,
+}
+
+# Same filters for in-memory frames, INTER_NEAREST_EXACT picks the same pixels as PIL's nearest
+CV2_INTERPOLATION = {
+    'nearest': cv2.INTER_NEAREST_EXACT,
+    'bilinear': cv2.INTER_LINEAR,
+    'bicubic': cv2.INTER_CUBIC,
+    'box': cv2.INTER_AREA,
+    'lanczos': cv2.INTER_LANCZOS4,
+}
+
+# And for the tf.data pipeline; nearest picks the same pixels as PIL, the others are antialiased like PIL
+TF_RESIZE_METHODS = {
+    'nearest': 'nearest',
+    'bilinear': 'bilinear',
+    'bicubic': 'bicubic',
+    'box': 'area',
+    'lanczos': 'lanczos3',
+}
+
+
+def load_image(path, size, reduced_decode=True, resample='nearest'):
+    """Decode an image file to an RGB PIL image of size x size
+
+    With reduced_decode, JPEGs are decoded at the smallest DCT scale
+    (1/2, 1/4 or 1/8) that still covers size x size, so a 5 MP photo going
+    to 224x224 never exists at full resolution. The DCT scaling averages
+    whole blocks, so the remaining (< 2x) resize is done with `resample`.
+    Other formats are decoded in full.
+
+    After a DCT downscale the pixels no longer match load_img (full decode +
+    nearest), but nearest stays the default: the model is trained on
+    nearest-resized images, and on the test set (see README) smoother
+    filters flip more predictions without gaining accuracy. Use the filter
+    the training pipeline uses (DECODE_RESAMPLE covers both)
+    """
+    with Image.open(path) as img:
+        if reduced_decode:
+            img.draft('RGB', (size, size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if img.size == (size, size):
+            return img.copy()
+        return img.resize((size, size), RESAMPLE_FILTERS[resample])
+
+
+def aligned_empty(shape, dtype=np.uint8, alignment=64):
+    """Uninitialized array whose data starts on an `alignment`-byte boundary"""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+def resize_into(image, out, resample='nearest'):
+    """Resize an (H, W, 3) uint8 image straight into `out`, no temporary array"""
+    if image.shape == out.shape:
+        np.copyto(out, image)
+    else:
+        cv2.resize(image, (out.shape[1], out.shape[0]), dst=out, interpolation=CV2_INTERPOLATION[resample])
+    return out
+
+
+class InputBuffers:
+    """Preallocated uint8 (batch, size, size, 3) model inputs, one per batch size and thread"""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+
+    def get(self, batch_size=1):
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None:
+            buffers = self.local.buffers = {}
+        if batch_size not in buffers:
+            buffers[batch_size] = aligned_empty((batch_size, self.size, self.size, 3))
+        return buffers[batch_size]
+
+
+def serving_function(model):
+    """Inference graph that takes 0-255 images (uint8 or float) in RGB or BGR order
+
+    Channel swap and scaling to 0-1 run inside the graph, so frames go in
+    as they come from the decoder or camera without a float copy.
+    """
+    @tf.function(reduce_retracing=True)
+    def serve(images, bgr=False):
+        x = tf.cast(images, tf.float32) * (1.0 / 255.0)
+        if bgr:
+            x = tf.reverse(x, axis=[-1])
+        return model(x, training=False)
+    return serve
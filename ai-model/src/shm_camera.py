@@ -0,0 +1,495 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+# Header slots (int64): magic, slots, height, width, jpeg_capacity,
+# latest_seq, heartbeat_us, encode_request_us
+HEADER_FIELDS = 8
+MAGIC = 0x43484C49  # 'CHLI'
+H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_JPEG_CAP, H_LATEST, H_HEARTBEAT, H_ENCODE = range(HEADER_FIELDS)
+
+# Per-slot metadata (int64): seq, capture_us, jpeg_len
+SLOT_FIELDS = 3
+S_SEQ, S_CAPTURE, S_JPEG_LEN = range(SLOT_FIELDS)
+
+
+class SharedFrameRing:
+    """Ring buffer frame BGR di shared memory dengan nomor urut (sequence number)
+
+    The writer marks a slot invalid (seq -1) before overwriting it and
+    publishes the new sequence number last, so readers can detect torn or
+    lapped frames by checking the slot sequence before and after use.
+    """
+
+    def __init__(self, name=None, slots=8, height=480, width=640, jpeg_capacity=None, create=False):
+        if create:
+            jpeg_capacity = jpeg_capacity or height * width  # generous upper bound for a JPEG
+            size = self._layout_size(slots, height, width, jpeg_capacity)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+            header[:] = 0
+            header[H_MAGIC] = MAGIC
+            header[H_SLOTS] = slots
+            header[H_HEIGHT] = height
+            header[H_WIDTH] = width
+            header[H_JPEG_CAP] = jpeg_capacity
+        else:
+            self.shm = self._attach(name)
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+            if header[H_MAGIC] != MAGIC:
+                raise ValueError(f"Shared memory {name} is not a frame ring")
+            slots = int(header[H_SLOTS])
+            height = int(header[H_HEIGHT])
+            width = int(header[H_WIDTH])
+            jpeg_capacity = int(header[H_JPEG_CAP])
+
+        self.name = self.shm.name
+        self.slots = slots
+        self.height = height
+        self.width = width
+        self.jpeg_capacity = jpeg_capacity
+        self.owner = create
+
+        offset = HEADER_FIELDS * 8
+        self.header = header
+        self.meta = np.ndarray((slots, SLOT_FIELDS), dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        offset += slots * SLOT_FIELDS * 8
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+        offset += slots * height * width * 3
+        self.jpegs = np.ndarray((slots, jpeg_capacity), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+        if create:
+            self.meta[:, S_SEQ] = -1
+
+    @staticmethod
+    def _attach(name):
+        """Map an existing ring without handing it to this process's resource tracker
+
+        The capture child is a plain subprocess with its own tracker, which
+        would unlink the parent's ring when the child exits.
+        """
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 has no track argument
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            return shm
+
+    @staticmethod
+    def _layout_size(slots, height, width, jpeg_capacity):
+        return (HEADER_FIELDS * 8 + slots * SLOT_FIELDS * 8 +
+                slots * height * width * 3 + slots * jpeg_capacity)
+
+    # Writer side ------------------------------------------------------
+
+    def write(self, frame, capture_ts, jpeg=None):
+        """Publish a frame (and optionally its JPEG encoding) as the next sequence"""
+        seq = int(self.header[H_LATEST]) + 1
+        slot = seq % self.slots
+
+        self.meta[slot, S_SEQ] = -1
+        if frame.shape[0] != self.height or frame.shape[1] != self.width:
+            cv2.resize(frame, (self.width, self.height), dst=self.frames[slot])
+        else:
+            self.frames[slot][...] = frame
+
+        jpeg_len = 0
+        if jpeg is not None and len(jpeg) <= self.jpeg_capacity:
+            jpeg_len = len(jpeg)
+            self.jpegs[slot, :jpeg_len] = np.frombuffer(jpeg, dtype=np.uint8)
+
+        self.meta[slot, S_CAPTURE] = int(capture_ts * 1_000_000)
+        self.meta[slot, S_JPEG_LEN] = jpeg_len
+        self.meta[slot, S_SEQ] = seq
+        self.header[H_LATEST] = seq
+        return seq
+
+    def heartbeat(self):
+        self.header[H_HEARTBEAT] = int(time.time() * 1_000_000)
+
+    def encode_requested(self, within=2.0):
+        """Check whether a reader asked for JPEG frames recently"""
+        return time.time() * 1_000_000 - self.header[H_ENCODE] < within * 1_000_000
+
+    # Reader side ------------------------------------------------------
+
+    @property
+    def latest_seq(self):
+        return int(self.header[H_LATEST])
+
+    def request_encode(self):
+        self.header[H_ENCODE] = int(time.time() * 1_000_000)
+
+    def is_valid(self, seq):
+        """Check that the slot of seq has not been overwritten since it was read"""
+        return seq > 0 and int(self.meta[seq % self.slots, S_SEQ]) == seq
+
+    def read(self, seq=None, copy=False):
+        """Return (timing, frame) for seq (default: latest) or (None, None)
+
+        Without copy the frame is a zero-copy view into shared memory which
+        stays valid until the writer laps the ring; check is_valid(seq) after
+        use or pass copy=True when holding the frame longer.
+        """
+        seq = self.latest_seq if seq is None else seq
+        if not self.is_valid(seq):
+            return None, None
+
+        slot = seq % self.slots
+        capture_us = int(self.meta[slot, S_CAPTURE])
+        frame = self.frames[slot]
+        if copy:
+            frame = frame.copy()
+        if not self.is_valid(seq):
+            return None, None
+
+        return {'seq': seq, 'capture': capture_us / 1_000_000}, frame
+
+    def read_jpeg(self, seq=None):
+        """Return JPEG bytes for seq (default: latest) if the child encoded it"""
+        seq = self.latest_seq if seq is None else seq
+        if not self.is_valid(seq):
+            return None
+
+        slot = seq % self.slots
+        jpeg_len = int(self.meta[slot, S_JPEG_LEN])
+        if jpeg_len == 0:
+            return None
+        data = self.jpegs[slot, :jpeg_len].tobytes()
+        return data if self.is_valid(seq) else None
+
+    def recent(self, count=None, copy=False):
+        """Return (timing, frame) of the most recent valid frames, newest first (views unless copy)"""
+        latest = self.latest_seq
+        count = min(count or self.slots - 1, self.slots - 1)
+        entries = []
+        for seq in range(latest, max(latest - count, 0), -1):
+            timing, frame = self.read(seq, copy=copy)
+            if frame is not None:
+                entries.append((timing, frame))
+        return entries
+
+    def close(self):
+        # Drop numpy views before closing the mapping
+        self.header = self.meta = self.frames = self.jpegs = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A reader still holds a zero-copy view, the mapping goes away with it
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# Exit code of a capture child that could not open the camera
+EXIT_NO_CAMERA = 3
+
+
+def _capture_process_main(shm_name, camera_index, fps, low_latency, jpeg_quality):
+    """Child process: read the camera, publish frames and JPEGs into the ring until SIGTERM"""
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    ring = SharedFrameRing(name=shm_name)
+    ring.heartbeat()
+    cap = cv2.VideoCapture(camera_index)
+    try:
+        if not cap.isOpened():
+            print(f"[camera process] Cannot open camera {camera_index}")
+            return EXIT_NO_CAMERA
+
+        if low_latency:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, ring.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, ring.height)
+        cap.set(cv2.CAP_PROP_FPS, fps)
+        if low_latency:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        failures = 0
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            ring.heartbeat()
+            if not ret:
+                failures += 1
+                if failures > 30:
+                    print("[camera process] Camera frame not available, exiting")
+                    return EXIT_NO_CAMERA
+                time.sleep(0.05)
+                continue
+            failures = 0
+            capture_ts = time.time()
+
+            # JPEG encoding only happens while someone streams
+            jpeg = None
+            if ring.encode_requested():
+                ret, buffer = cv2.imencode('.jpg', frame, encode_params)
+                if ret:
+                    jpeg = buffer.tobytes()
+
+            ring.write(frame, capture_ts, jpeg)
+        return 0
+    finally:
+        cap.release()
+        ring.close()
+
+
+class ProcessCamera:
+    """Camera capture in a child process with a supervisor that restarts it
+
+    Frames are exchanged through a SharedFrameRing so the API process only
+    maps them; a crashed or hung camera driver only takes down the child.
+    The child runs this file as a script, so it imports OpenCV and numpy
+    only, never the API (TensorFlow, the model) that started it. After
+    CAMERA_MAX_OPEN_FAILURES children in a row exit without a frame, the
+    supervisor gives up instead of restarting forever.
+    """
+
+    def __init__(self, camera_index=0, width=640, height=480, fps=30, low_latency=False,
+                 slots=None, idle_timeout=None):
+        self.camera_index = camera_index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.low_latency = low_latency
+        self.slots = int(slots or os.getenv('CAMERA_RING_SLOTS', 8))
+        self.idle_timeout = float(idle_timeout or os.getenv('CAMERA_IDLE_TIMEOUT', 60))
+        self.heartbeat_timeout = float(os.getenv('CAMERA_HEARTBEAT_TIMEOUT', 5.0))
+        self.jpeg_quality = int(os.getenv('STREAM_JPEG_QUALITY', 80))
+        self.max_open_failures = int(os.getenv('CAMERA_MAX_OPEN_FAILURES', 5))
+
+        self.ring = None
+        self.process = None
+        self.spawn_seq = 0
+        self.open_failures = 0
+        self.supervisor = None
+        self.running = False
+        self.restarts = 0
+        self.last_access = 0
+        self.lock = threading.Lock()
+        # Reads in progress; _shutdown waits for them before unmapping the ring
+        self.readers = 0
+        self.readers_cond = threading.Condition()
+
+    @contextmanager
+    def _reading(self):
+        """The ring, or None once stopped, kept mapped until the block ends"""
+        with self.readers_cond:
+            ring = self.ring
+            if ring is not None:
+                self.readers += 1
+        try:
+            yield ring
+        finally:
+            if ring is not None:
+                with self.readers_cond:
+                    self.readers -= 1
+                    self.readers_cond.notify_all()
+
+    def _latest_seq(self):
+        with self._reading() as ring:
+            return ring.latest_seq if ring is not None else 0
+
+    def start(self):
+        """Start the capture process (no-op if running), return True when frames flow"""
+        with self.lock:
+            self.last_access = time.time()
+            if self.running:
+                return True
+
+            self.ring = SharedFrameRing(
+                slots=self.slots, height=self.height, width=self.width, create=True
+            )
+            self.open_failures = 0
+            self._spawn()
+            self.running = True
+            self.supervisor = threading.Thread(target=self._supervise)
+            self.supervisor.daemon = True
+            self.supervisor.start()
+
+        # Wait for the first frame so callers can read right away
+        deadline = time.time() + 5.0
+        while self.running and self._latest_seq() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        return self._latest_seq() > 0
+
+    def _spawn(self):
+        command = [sys.executable, os.path.abspath(__file__), '--shm', self.ring.name,
+                   '--camera-index', str(self.camera_index), '--fps', str(self.fps),
+                   '--jpeg-quality', str(self.jpeg_quality)]
+        if self.low_latency:
+            command.append('--low-latency')
+        self.process = subprocess.Popen(command)
+        self.spawn_seq = self.ring.latest_seq
+        self.ring.heartbeat()
+        print(f"Camera process started (pid {self.process.pid})")
+
+    def _alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _kill_child(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait(timeout=2.0)
+        self.process = None
+
+    def _supervise(self):
+        """Restart a dead or hung child, stop it after the idle timeout"""
+        backoff = 1.0
+        while self.running:
+            time.sleep(0.5)
+            with self.lock:
+                if not self.running:
+                    break
+
+                if time.time() - self.last_access > self.idle_timeout:
+                    print("Camera idle, stopping camera process")
+                    self._shutdown()
+                    break
+
+                heartbeat_age = time.time() - self.ring.header[H_HEARTBEAT] / 1_000_000
+                alive = self._alive()
+                if self.ring.latest_seq > self.spawn_seq:
+                    self.open_failures = 0
+                healthy = alive and heartbeat_age <= self.heartbeat_timeout
+                if healthy:
+                    if heartbeat_age < 1.0:
+                        backoff = 1.0
+                    continue
+
+                # A child that never published a frame could not open the camera
+                if self.ring.latest_seq == self.spawn_seq:
+                    self.open_failures += 1
+                    if self.open_failures >= self.max_open_failures:
+                        print(f"Camera {self.camera_index} could not be opened {self.open_failures} times "
+                              f"in a row, giving up")
+                        self._shutdown()
+                        break
+
+                print(f"Camera process unhealthy (alive={alive}, "
+                      f"heartbeat {heartbeat_age:.1f}s ago), restarting in {backoff:.0f}s")
+                self._kill_child()
+
+            # Back off without holding the lock so API calls are not blocked
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+            with self.lock:
+                if self.running and self.process is None:
+                    self._spawn()
+                    self.restarts += 1
+
+    def _shutdown(self):
+        self.running = False
+        self._kill_child()
+        ring = self.ring
+        if ring is not None:
+            # Readers never block, so in-flight reads finish right away
+            with self.readers_cond:
+                self.ring = None
+                self.readers_cond.wait_for(lambda: self.readers == 0)
+            ring.close()
+
+    def stop(self):
+        """Stop the capture process and free the shared memory"""
+        with self.lock:
+            if self.running:
+                self._shutdown()
+        if self.supervisor is not None and self.supervisor is not threading.current_thread():
+            self.supervisor.join(timeout=2.0)
+            self.supervisor = None
+
+    def restart(self):
+        """Restart the capture process, e.g. after a driver hang"""
+        with self.lock:
+            if not self.running:
+                return False
+            self._kill_child()
+            self._spawn()
+            self.restarts += 1
+            return True
+
+    def wait_for_frame(self, last_seq=0, timeout=2.0):
+        """Return (timing, frame view) of the newest frame after last_seq"""
+        self.last_access = time.time()
+        deadline = time.time() + timeout
+        while self.running and time.time() < deadline:
+            with self._reading() as ring:
+                if ring is None:
+                    break
+                if ring.latest_seq > last_seq:
+                    timing, frame = ring.read()
+                    if frame is not None:
+                        timing['dequeue'] = time.time()
+                        return timing, frame
+            time.sleep(0.002)
+        return None, None
+
+    def recent_frames(self):
+        """Return (timing, frame) copies of the buffered frames, oldest first like the warm-camera pre-roll
+
+        Copied out of the ring and validated after the copy, so the writer
+        lapping the ring cannot change a frame after it was picked.
+        """
+        self.last_access = time.time()
+        with self._reading() as ring:
+            return ring.recent(copy=True)[::-1] if ring is not None else []
+
+    def latest_jpeg(self):
+        """Return the newest JPEG encoded by the child (encoding starts on first call)"""
+        self.last_access = time.time()
+        with self._reading() as ring:
+            if ring is None:
+                return None
+            ring.request_encode()
+            return ring.read_jpeg()
+
+    def get_status(self):
+        """Get capture process status"""
+        latest_seq = self._latest_seq()
+        alive = self._alive()
+        return {
+            'status': 'connected' if self.running and alive else 'disconnected',
+            'backend': 'process',
+            'pid': self.process.pid if alive else None,
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'ring_slots': self.slots,
+            'latest_seq': latest_seq,
+            'restarts': self.restarts,
+            'open_failures': self.open_failures
+        }
+
+
+if __name__ == "__main__":
+    # Entry point of the capture child started by ProcessCamera._spawn
+    parser = argparse.ArgumentParser(description='Camera capture process writing into a shared frame ring')
+    parser.add_argument('--shm', required=True, help='Name of the shared memory ring')
+    parser.add_argument('--camera-index', default='0', help='Device index, or a video file / stream URL')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--jpeg-quality', type=int, default=80)
+    parser.add_argument('--low-latency', action='store_true')
+    args = parser.parse_args()
+    camera = int(args.camera_index) if args.camera_index.isdigit() else args.camera_index
+    sys.exit(_capture_process_main(args.shm, camera, args.fps, args.low_latency, args.jpeg_quality))
@@ -0,0 +1,313 @@
+import os
+import gc
+import csv
+import json
+import time
+import resource
+import threading
+import tracemalloc
+import cv2
+import numpy as np
+
+# Allocation sites in these files are the harness itself, not the code under test
+IGNORED_FILES = (tracemalloc.__file__, __file__, '<frozen importlib._bootstrap>', '<unknown>')
+
+
+def rss_mb():
+    """Current resident memory of this process (peak RSS where /proc is not available)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_fds():
+    """Number of open file descriptors, None where /proc is not available"""
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def count_files(path):
+    return len(os.listdir(path)) if path and os.path.isdir(path) else 0
+
+
+class MemorySampler:
+    """Samples RSS, traced Python memory, open files and temp files during a soak run
+
+    Python allocations are traced with tracemalloc. Snapshots are taken at
+    the end of the warmup (baseline), halfway and at the end, so allocation
+    sites can be ranked by growth and told apart from one-off caches (which
+    grow in the first half only). RSS growth that tracemalloc does not see
+    comes from native code (TensorFlow, OpenCV).
+    """
+
+    def __init__(self, temp_dirs=(), traceback_frames=10):
+        self.temp_dirs = list(temp_dirs)
+        self.traceback_frames = traceback_frames
+        self.samples = []
+        self.snapshots = {}
+        self.start_time = None
+
+    def start(self):
+        tracemalloc.start(self.traceback_frames)
+        self.start_time = time.time()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def sample(self, iterations):
+        gc.collect()
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        record = {
+            'elapsed_s': round(time.time() - self.start_time, 2),
+            'iterations': iterations,
+            'rss_mb': round(rss_mb(), 2),
+            'traced_mb': round(traced / (1024 * 1024), 3),
+            'traced_peak_mb': round(traced_peak / (1024 * 1024), 3),
+            'gc_objects': len(gc.get_objects()),
+            'threads': threading.active_count(),
+            'open_fds': open_fds(),
+            'temp_files': sum(count_files(path) for path in self.temp_dirs),
+        }
+        self.samples.append(record)
+        return record
+
+    def snapshot(self, name):
+        gc.collect()
+        self.snapshots[name] = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, path) for path in IGNORED_FILES]
+        )
+
+    def top_growth(self, limit=15, key_type='traceback'):
+        """Allocation sites ranked by growth from the baseline to the final snapshot"""
+        baseline, final = self.snapshots.get('baseline'), self.snapshots.get('final')
+        if baseline is None or final is None:
+            return []
+        middle = self.snapshots.get('middle')
+        second_half = {}
+        if middle is not None:
+            for stat in final.compare_to(middle, key_type):
+                second_half[stat.traceback] = stat.size_diff
+
+        sites = []
+        for stat in final.compare_to(baseline, key_type)[:limit]:
+            if stat.size_diff <= 0:
+                break
+            frames = [f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)]
+            sites.append({
+                'site': frames[0],
+                'traceback': frames,
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'size_kb': round(stat.size / 1024, 1),
+                'count_diff': stat.count_diff,
+                # Still growing in the second half: a leak rather than a cache warming up
+                'growing': second_half.get(stat.traceback, 0) > 0 if middle is not None else None,
+            })
+        return sites
+
+
+def growth_rate(samples, key, warmup_iterations=0):
+    """Linear growth of a sample field after the warmup: per 1000 iterations and per hour"""
+    points = [s for s in samples if s['iterations'] >= warmup_iterations and s.get(key) is not None]
+    if len(points) < 3:
+        return {'per_1k_iterations': None, 'per_hour': None, 'total': None}
+    iterations = np.array([s['iterations'] for s in points], dtype=np.float64)
+    elapsed = np.array([s['elapsed_s'] for s in points], dtype=np.float64)
+    values = np.array([s[key] for s in points], dtype=np.float64)
+    per_iteration = np.polyfit(iterations, values, 1)[0]
+    per_second = np.polyfit(elapsed, values, 1)[0] if np.ptp(elapsed) > 0 else 0.0
+    return {
+        'per_1k_iterations': float(per_iteration * 1000),
+        'per_hour': float(per_second * 3600),
+        'total': float(values[-1] - values[0]),
+    }
+
+
+class FakeVideoSource:
+    """Stands in for cv2.VideoCapture: loops over frames at a fixed frame rate"""
+
+    def __init__(self, frames, fps=30):
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+        self.opened = True
+        self.next_frame_time = time.perf_counter()
+        self.properties = {}
+
+    @classmethod
+    def from_images(cls, image_paths, width=640, height=480, fps=30, limit=50):
+        frames = []
+        for path in image_paths[:limit]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(cv2.resize(frame, (width, height)))
+        if not frames:
+            rng = np.random.default_rng(0)
+            frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+        return cls(frames, fps)
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        delay = self.next_frame_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame_time = max(self.next_frame_time + 1.0 / self.fps, time.perf_counter() - 1.0)
+        frame = self.frames[self.index % len(self.frames)].copy()
+        self.index += 1
+        return True, frame
+
+    def set(self, prop, value):
+        self.properties[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.properties.get(prop, 0)
+
+    def release(self):
+        self.opened = False
+
+
+def soak(step, iterations, sampler, warmup=200, sample_every=500, progress=None):
+    """Call step(i) `iterations` times after `warmup` unmeasured calls, sampling memory along the way"""
+    for i in range(warmup):
+        step(i)
+    sampler.sample(0)
+    sampler.snapshot('baseline')
+
+    for i in range(1, iterations + 1):
+        step(warmup + i)
+        if i == iterations // 2:
+            sampler.snapshot('middle')
+        if i % sample_every == 0 or i == iterations:
+            record = sampler.sample(i)
+            if progress:
+                progress(record)
+    sampler.snapshot('final')
+
+
+def soak_camera(manager, iterations, sampler, warmup=20, sample_every=500, progress=None, timeout=None):
+    """Run headless detection on the manager's (fake) source until `iterations` frames were predicted
+
+    The manager has to count finished predictions in `predictions`
+    (see SoakCameraManager).
+    """
+    thread = threading.Thread(target=manager.start_headless_detection,
+                              kwargs={'prediction_interval': 0.0}, daemon=True)
+    thread.start()
+    deadline = time.time() + timeout if timeout else None
+
+    def wait_for(count):
+        while manager.predictions < count:
+            if not thread.is_alive() or (deadline and time.time() > deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+    try:
+        wait_for(warmup)
+        start = manager.predictions
+        sampler.sample(0)
+        sampler.snapshot('baseline')
+        done = 0
+        while done < iterations:
+            finished = wait_for(start + min(done + sample_every, iterations))
+            done = manager.predictions - start
+            if done >= iterations // 2 and 'middle' not in sampler.snapshots:
+                sampler.snapshot('middle')
+            record = sampler.sample(done)
+            if progress:
+                progress(record)
+            if not finished:
+                break
+        sampler.snapshot('final')
+    finally:
+        manager.is_running = False
+        thread.join(timeout=10)
+    return manager.predictions
+
+
+def summarize_target(name, sampler, warmup_iterations=0, top=15):
+    samples = sampler.samples
+    return {
+        'target': name,
+        'iterations': samples[-1]['iterations'] if samples else 0,
+        'duration_s': samples[-1]['elapsed_s'] if samples else 0,
+        'rss_start_mb': samples[0]['rss_mb'] if samples else None,
+        'rss_end_mb': samples[-1]['rss_mb'] if samples else None,
+        'growth': {key: growth_rate(samples, key, warmup_iterations)
+                   for key in ('rss_mb', 'traced_mb', 'gc_objects', 'open_fds', 'temp_files', 'threads')},
+        'top_allocations': sampler.top_growth(top),
+        'samples': samples,
+    }
+
+
+def leak_verdict(result, max_rss_mb_per_100k=50.0, max_traced_mb_per_100k=10.0):
+    """Flag a target whose RSS or traced memory would grow past the limits over 100k iterations"""
+    reasons = []
+    rss = result['growth']['rss_mb']['per_1k_iterations']
+    traced = result['growth']['traced_mb']['per_1k_iterations']
+    if rss is not None and rss * 100 > max_rss_mb_per_100k:
+        reasons.append(f"RSS +{rss * 100:.0f} MB per 100k iterations")
+    if traced is not None and traced * 100 > max_traced_mb_per_100k:
+        reasons.append(f"traced Python memory +{traced * 100:.1f} MB per 100k iterations")
+    for key in ('open_fds', 'temp_files', 'threads'):
+        total = result['growth'][key]['total']
+        if total is not None and total > 0 and result['growth'][key]['per_1k_iterations'] > 0:
+            reasons.append(f"{key} grew by {total:.0f}")
+    return reasons
+
+
+def write_report(results, output_dir):
+    """Write report.json, samples.csv, top_allocations.txt and memory.png"""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+    columns = ['elapsed_s', 'iterations', 'rss_mb', 'traced_mb', 'traced_peak_mb', 'gc_objects',
+               'threads', 'open_fds', 'temp_files']
+    with open(os.path.join(output_dir, 'samples.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['target'] + columns)
+        for name, result in results['targets'].items():
+            for sample in result['samples']:
+                writer.writerow([name] + [sample[c] for c in columns])
+
+    with open(os.path.join(output_dir, 'top_allocations.txt'), 'w') as f:
+        for name, result in results['targets'].items():
+            f.write(f"== {name}: allocation growth from the end of warmup to the end of the run ==\n")
+            for site in result['top_allocations']:
+                trend = {True: 'growing', False: 'flat in 2nd half', None: ''}[site['growing']]
+                f.write(f"+{site['size_diff_kb']:.1f} KB ({site['count_diff']:+d} blocks) {trend}\n")
+                for frame in site['traceback']:
+                    f.write(f"    {frame}\n")
+            f.write("\n")
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+    for name, result in results['targets'].items():
+        iterations = [s['iterations'] for s in result['samples']]
+        ax1.plot(iterations, [s['rss_mb'] for s in result['samples']], marker='.', label=name)
+        ax2.plot(iterations, [s['traced_mb'] for s in result['samples']], marker='.', label=name)
+    ax1.set_title('Resident memory')
+    ax1.set_xlabel('Iterations after warmup')
+    ax1.set_ylabel('RSS (MB)')
+    ax1.legend()
+    ax2.set_title('Traced Python memory')
+    ax2.set_xlabel('Iterations after warmup')
+    ax2.set_ylabel('tracemalloc (MB)')
+    ax2.legend()
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'memory.png'))
+    plt.close(fig)
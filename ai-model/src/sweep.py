@@ -0,0 +1,279 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import itertools
+import subprocess
+from tensorflow.keras.callbacks import Callback
+
+# Hyperparameters a trial can set and the train_model.py flag for each
+SWEEP_FLAGS = {
+    'learning_rate': '--learning-rate',
+    'batch_size': '--batch-size',
+    'dropout': '--dropout',
+    'fine_tune_at': '--fine-tune-at',
+}
+
+
+class EpochMetricsLogger(Callback):
+    """Append the metrics of every epoch to a JSONL file
+
+    The epoch counter keeps running across several fits (training and
+    fine-tuning), so a sweep sees one continuous curve per trial.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.epoch = 0
+        self.epoch_start = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch += 1
+        record = {'epoch': self.epoch, 'epoch_seconds': round(time.time() - self.epoch_start, 2)}
+        record.update({key: float(value) for key, value in (logs or {}).items()})
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def _sample(spec, rng):
+    """Draw one value: a list is a choice, a dict a (log-)uniform range"""
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if not isinstance(spec, dict):
+        return spec
+    if 'log_uniform' in spec:
+        low, high = spec['log_uniform']
+        return float(math.exp(rng.uniform(math.log(low), math.log(high))))
+    if 'uniform' in spec:
+        low, high = spec['uniform']
+        return round(rng.uniform(low, high), 4)
+    if 'int' in spec:
+        low, high = spec['int']
+        return rng.randint(low, high)
+    raise ValueError(f"Unknown search space entry: {spec}")
+
+
+def generate_trials(params, method='grid', num_trials=20, seed=42):
+    """Expand a search space into a list of trial configs
+
+    grid takes every combination of the listed values, random draws
+    num_trials configs (lists are choices, {"uniform": [a, b]},
+    {"log_uniform": [a, b]} and {"int": [a, b]} are ranges).
+    """
+    unknown = set(params) - set(SWEEP_FLAGS)
+    if unknown:
+        raise ValueError(f"Unknown hyperparameters {sorted(unknown)}, expected {sorted(SWEEP_FLAGS)}")
+
+    if method == 'grid':
+        names = list(params)
+        values = [spec if isinstance(spec, list) else [spec] for spec in params.values()]
+        if any(isinstance(v, dict) for options in values for v in options):
+            raise ValueError("Grid search needs lists of values, use random for ranges")
+        return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+    if method == 'random':
+        rng = random.Random(seed)
+        return [{name: _sample(spec, rng) for name, spec in params.items()} for _ in range(num_trials)]
+
+    raise ValueError(f"Unknown sweep method: {method}")
+
+
+def read_metrics(path):
+    """Per-epoch records written by EpochMetricsLogger"""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # Line still being written
+    return records
+
+
+def best_so_far(records, metric, epoch=None):
+    values = [r[metric] for r in records[:epoch] if metric in r]
+    return max(values) if values else None
+
+
+class SweepRunner:
+    """Run trials of scripts/train_model.py as separate processes
+
+    At most `concurrency` trials run at once, each pinned to its own set of
+    CPU cores with matching TensorFlow thread limits. A running trial is
+    stopped when, after `prune_warmup` epochs, its best validation accuracy
+    is below the median of the other trials at the same epoch.
+    """
+
+    def __init__(self, train_script, output_dir, train_args, concurrency=2,
+                 prune_warmup=3, prune_min_trials=3, metric='val_accuracy'):
+        # Trials run with their own directory as cwd, so every path handed to them is absolute
+        self.train_script = os.path.abspath(train_script)
+        self.output_dir = os.path.abspath(output_dir)
+        self.train_args = list(train_args)
+        self.metric = metric
+        self.prune_warmup = prune_warmup
+        self.prune_min_trials = prune_min_trials
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+            else list(range(os.cpu_count() or 1))
+        self.concurrency = max(1, min(concurrency, len(cores)))
+        per_trial = len(cores) // self.concurrency
+        # Disjoint core sets, one per concurrent slot
+        self.core_slots = [cores[i * per_trial:(i + 1) * per_trial] for i in range(self.concurrency)]
+
+        self.trials = []
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _launch(self, trial, cores):
+        trial_dir = trial['dir']
+        os.makedirs(trial_dir, exist_ok=True)
+        with open(os.path.join(trial_dir, 'params.json'), 'w') as f:
+            json.dump(trial['params'], f, indent=2)
+
+        command = [sys.executable, self.train_script] + self.train_args
+        command += ['--metrics-log', trial['metrics_path']]
+        for name, value in trial['params'].items():
+            command += [SWEEP_FLAGS[name], str(value)]
+
+        threads = str(len(cores))
+        env = os.environ.copy()
+        env.update({
+            'TF_NUM_INTRAOP_THREADS': threads,
+            'TF_NUM_INTEROP_THREADS': '2',
+            'OMP_NUM_THREADS': threads,
+            'MPLBACKEND': 'Agg',
+        })
+
+        def pin_cores():
+            if hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(0, cores)
+
+        log_file = open(os.path.join(trial_dir, 'train.log'), 'w')
+        # Each trial runs in its own directory so models/ is not shared
+        trial['process'] = subprocess.Popen(
+            command, cwd=trial_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+            preexec_fn=pin_cores
+        )
+        trial['log_file'] = log_file
+        trial['cores'] = cores
+        trial['start_time'] = time.time()
+        trial['status'] = 'running'
+        print(f"Trial {trial['id']} started on cores {cores[0]}-{cores[-1]}: {trial['params']}")
+
+    def _should_prune(self, trial):
+        records = read_metrics(trial['metrics_path'])
+        epoch = len(records)
+        if epoch < self.prune_warmup:
+            return False
+        current = best_so_far(records, self.metric)
+        others = []
+        for other in self.trials:
+            if other is trial or other['status'] == 'pending':
+                continue
+            other_records = read_metrics(other['metrics_path'])
+            if len(other_records) >= epoch:
+                others.append(best_so_far(other_records, self.metric, epoch))
+        others = sorted(v for v in others if v is not None)
+        if current is None or len(others) < self.prune_min_trials:
+            return False
+        median = others[len(others) // 2] if len(others) % 2 else \
+            (others[len(others) // 2 - 1] + others[len(others) // 2]) / 2
+        return current < median
+
+    def _finish(self, trial, status):
+        trial['status'] = status
+        trial['wall_time'] = time.time() - trial['start_time']
+        trial['log_file'].close()
+        records = read_metrics(trial['metrics_path'])
+        trial['epochs'] = len(records)
+        trial['best_metric'] = best_so_far(records, self.metric)
+
+        model_files = [os.path.join(trial['dir'], 'models', name)
+                       for name in ('chili_disease_model_finetuned.h5', 'chili_disease_model.h5')]
+        model_files = [path for path in model_files if os.path.exists(path)]
+        trial['model_size_mb'] = os.path.getsize(model_files[0]) / (1024 * 1024) if model_files else None
+
+        best = f"{trial['best_metric']:.4f}" if trial['best_metric'] is not None else '-'
+        print(f"Trial {trial['id']} {status}: {self.metric}={best}, "
+              f"{trial['epochs']} epochs, {trial['wall_time']:.0f}s")
+
+    def run(self, trial_params, poll_interval=5.0):
+        """Run all trials and return them sorted by the metric"""
+        self.trials = [{
+            'id': index,
+            'params': params,
+            'dir': os.path.join(self.output_dir, f"trial_{index:03d}"),
+            'metrics_path': os.path.join(self.output_dir, f"trial_{index:03d}", 'metrics.jsonl'),
+            'status': 'pending',
+            'process': None,
+        } for index, params in enumerate(trial_params)]
+
+        pending = list(self.trials)
+        running = {}  # slot -> trial
+
+        try:
+            while pending or running:
+                for slot in range(self.concurrency):
+                    if slot not in running and pending:
+                        trial = pending.pop(0)
+                        self._launch(trial, self.core_slots[slot])
+                        running[slot] = trial
+
+                time.sleep(poll_interval)
+
+                for slot, trial in list(running.items()):
+                    return_code = trial['process'].poll()
+                    if return_code is not None:
+                        self._finish(trial, 'done' if return_code == 0 else 'failed')
+                        del running[slot]
+                    elif self._should_prune(trial):
+                        trial['process'].terminate()
+                        trial['process'].wait()
+                        self._finish(trial, 'pruned')
+                        del running[slot]
+
+                self.write_results()
+        except KeyboardInterrupt:
+            for trial in running.values():
+                trial['process'].terminate()
+                trial['process'].wait()
+                self._finish(trial, 'stopped')
+            self.write_results()
+            raise
+
+        return self.ranked()
+
+    def ranked(self):
+        finished = [t for t in self.trials if t['status'] not in ('pending', 'running')]
+        return sorted(finished, key=lambda t: t.get('best_metric') or -1, reverse=True)
+
+    def write_results(self):
+        """Write the results table of finished trials (results.csv)"""
+        path = os.path.join(self.output_dir, 'results.csv')
+        names = list(SWEEP_FLAGS)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['trial', 'status'] + names +
+                            [self.metric, 'epochs', 'wall_time_s', 'model_size_mb'])
+            for trial in self.ranked():
+                writer.writerow(
+                    [trial['id'], trial['status']] +
+                    [trial['params'].get(name, '') for name in names] +
+                    [
+                        f"{trial['best_metric']:.4f}" if trial['best_metric'] is not None else '',
+                        trial['epochs'],
+                        f"{trial['wall_time']:.1f}",
+                        f"{trial['model_size_mb']:.2f}" if trial['model_size_mb'] else ''
+                    ]
+                )
+        return path
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import resource
+import threading
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+
+
+def parse_step_range(value):
+    """'10,20' -> (10, 20): global training steps to capture in a profiler trace"""
+    if not value:
+        return None
+    start, end = (int(part) for part in value.split(','))
+    if start < 0 or end < start:
+        raise ValueError(f"Invalid profile step range: {value}")
+    return start, end
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process, plus the GPU peak when there is a GPU"""
+    usage = {'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    for index, _ in enumerate(tf.config.list_physical_devices('GPU')):
+        try:
+            info = tf.config.experimental.get_memory_info(f'GPU:{index}')
+            usage[f'gpu{index}_peak_mb'] = info['peak'] / (1024 * 1024)
+            tf.config.experimental.reset_memory_stats(f'GPU:{index}')
+        except (ValueError, RuntimeError):
+            pass
+    return usage
+
+
+class TrainingTelemetry(Callback):
+    """Per-epoch training telemetry written to a JSONL file
+
+    Each record has images/sec, the mean and p95 step time, the time a step
+    spent waiting for its input batch, the share of step time that was
+    input wait, peak memory and the learning rate. A high input_wait_ratio
+    means the run is input-bound, a low one compute-bound.
+
+    Input wait needs the training dataset wrapped with instrument(): the
+    last map of the pipeline stamps when a batch comes out of it, the wait
+    is the time from the start of the step until then. Datasets that are
+    not tf.data (ImageDataGenerator) only get step times.
+
+    With profile_steps=(start, end) a tf.profiler trace of those global
+    steps is written to profile_dir (open it in TensorBoard's Profile tab).
+    """
+
+    def __init__(self, path, profile_steps=None, profile_dir='models/profile'):
+        super().__init__()
+        self.path = path
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+        self.profiling = False
+        self.global_step = 0
+        self.lock = threading.Lock()
+        self.batch_start = None
+        self.ready_times = []
+        self.ready_images = 0
+        self.step_times = []
+        self.input_waits = []
+        self.epoch_start = None
+        self.train_end = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def instrument(self, dataset):
+        """Stamp every batch as it leaves the tf.data pipeline"""
+        if not isinstance(dataset, tf.data.Dataset):
+            return dataset
+
+        def mark_ready(batch_size):
+            with self.lock:
+                self.ready_times.append(time.perf_counter())
+                self.ready_images += int(batch_size)
+            return np.float32(0)
+
+        def stamp(images, labels):
+            marker = tf.py_function(mark_ready, [tf.shape(images)[0]], tf.float32)
+            with tf.control_dependencies([marker]):
+                return tf.identity(images), labels
+
+        return dataset.map(stamp)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        with self.lock:
+            self.ready_times = []
+            self.ready_images = 0
+        self.step_times = []
+        self.input_waits = []
+        self.epoch_start = time.perf_counter()
+        self.train_end = None
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.profile_steps and self.global_step == self.profile_steps[0] and not self.profiling:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            tf.profiler.experimental.start(self.profile_dir)
+            self.profiling = True
+            print(f"Profiling steps {self.profile_steps[0]}-{self.profile_steps[1]} to {self.profile_dir}")
+        self.batch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        self.step_times.append(now - self.batch_start)
+        with self.lock:
+            # The batch this step consumed was stamped after the step began
+            ready = [t for t in self.ready_times if t >= self.batch_start]
+            self.ready_times = []
+        if ready:
+            self.input_waits.append(min(ready[0], now) - self.batch_start)
+        self.train_end = now
+
+        if self.profiling and self.global_step >= self.profile_steps[1]:
+            self.stop_profiler()
+        self.global_step += 1
+
+    def stop_profiler(self):
+        tf.profiler.experimental.stop()
+        self.profiling = False
+        print(f"Profiler trace written to {self.profile_dir}")
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self.step_times:
+            return
+        logs = logs if logs is not None else {}
+        train_time = (self.train_end or time.perf_counter()) - self.epoch_start
+        step_ms = np.array(self.step_times) * 1000
+
+        record = {
+            'epoch': epoch + 1,
+            'steps': len(self.step_times),
+            'train_seconds': round(train_time, 3),
+            'step_time_ms': float(step_ms.mean()),
+            'step_time_p95_ms': float(np.percentile(step_ms, 95)),
+        }
+        with self.lock:
+            images = self.ready_images
+        if images:
+            record['images_per_sec'] = images / train_time if train_time > 0 else 0.0
+        elif 'images_per_sec' in logs:
+            record['images_per_sec'] = float(logs['images_per_sec'])
+        if self.input_waits:
+            wait_ms = np.array(self.input_waits) * 1000
+            record['input_wait_ms'] = float(wait_ms.mean())
+            record['input_wait_ratio'] = float(wait_ms.sum() / step_ms.sum())
+
+        record['learning_rate'] = float(np.array(self.model.optimizer.learning_rate))
+        record.update(peak_memory_mb())
+        record.update({key: float(value) for key, value in logs.items()
+                       if key not in record and np.isscalar(value)})
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        summary = f"Epoch {epoch + 1}: step {record['step_time_ms']:.0f} ms"
+        if 'input_wait_ratio' in record:
+            summary += f", input wait {record['input_wait_ms']:.0f} ms ({record['input_wait_ratio']:.0%})"
+        print(summary + f", peak RSS {record['peak_rss_mb']:.0f} MB")
+
+    def on_train_end(self, logs=None):
+        if self.profiling:
+            self.stop_profiler()
@@ -0,0 +1,144 @@
+import math
+import cv2
+import numpy as np
+from PIL import Image
+
+# The vegetation mask is computed on a subsample of at most this many pixels on the long side
+MASK_SIZE = 256
+
+
+def load_for_tiles(path, tile_size, input_size, reduced_decode=True):
+    """Decode an image so that a tile_size tile still has at least input_size pixels
+
+    Returns the RGB array and its scale relative to the original image.
+    JPEGs are decoded at the smallest DCT scale that allows this, so a
+    12 MP canopy photo cut into 1024 px tiles for a 224 px model is decoded
+    at 1/4 resolution.
+    """
+    with Image.open(path) as img:
+        width, height = img.size
+        # Tiles are clipped to the short side (see tile_grid)
+        tile_size = min(tile_size, width, height)
+        if reduced_decode and tile_size > input_size:
+            scale = input_size / tile_size
+            img.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return np.asarray(img), img.size[0] / width
+
+
+def tile_grid(width, height, tile_size, overlap=0.25):
+    """Square tiles covering a width x height image, as (x, y, size) rows and columns
+
+    Neighbouring tiles overlap by about `overlap` of a tile and the outer
+    tiles end on the image border. Tiles never exceed the short side.
+    """
+    size = max(1, min(int(tile_size), width, height))
+    stride = max(1.0, size * (1.0 - overlap))
+
+    def starts(length):
+        count = math.ceil((length - size) / stride) + 1 if length > size else 1
+        return np.linspace(0, length - size, count).round().astype(int).tolist()
+
+    return [[(x, y, size) for x in starts(width)] for y in starts(height)]
+
+
+def vegetation_mask(image, bgr=False, threshold=0.1, min_brightness=60):
+    """Excess-green mask (2g - r - b on chromaticity) of an (H, W, 3) uint8 image
+
+    Green and yellowing leaf tissue scores well above 0, soil, mulch, sky
+    and plastic around 0 or below. Very dark pixels are left out since
+    their chromaticity is mostly noise.
+    """
+    pixels = image.astype(np.float32)
+    blue, green, red = (pixels[..., 0], pixels[..., 1], pixels[..., 2]) if bgr else \
+        (pixels[..., 2], pixels[..., 1], pixels[..., 0])
+    total = red + green + blue
+    excess_green = (2.0 * green - red - blue) / np.maximum(total, 1.0)
+    return (excess_green > threshold) & (total > min_brightness)
+
+
+def vegetation_fractions(image, tiles, bgr=False, threshold=0.1):
+    """Share of vegetation pixels in each (x, y, size) tile, from a downsampled mask"""
+    # Every step-th pixel is plenty for a share of green, and a strided view costs no copy
+    step = max(1, math.ceil(max(image.shape[:2]) / MASK_SIZE))
+    scale = 1.0 / step
+    mask = vegetation_mask(image[::step, ::step], bgr, threshold).astype(np.uint8)
+    integral = cv2.integral(mask)
+    mask_height, mask_width = mask.shape
+    fractions = []
+    for x, y, size in tiles:
+        x0, y0 = min(int(x * scale), mask_width - 1), min(int(y * scale), mask_height - 1)
+        x1 = min(max(x0 + 1, round((x + size) * scale)), mask_width)
+        y1 = min(max(y0 + 1, round((y + size) * scale)), mask_height)
+        area = (x1 - x0) * (y1 - y0)
+        fractions.append(float(integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]) / area)
+    return fractions
+
+
+def aggregate_tiles(probabilities, weights, classes, threshold=0.5, healthy='healthy'):
+    """Verdict for the whole image from per-tile class probabilities (tiles, classes)
+
+    Tiles whose disease probability (1 - healthy) reaches `threshold` are
+    affected. Any affected tile outweighs a healthy majority, since lesions
+    and whiteflies cover only a few tiles of a bed; the disease is the one
+    with the most vegetation-weighted probability over the affected tiles.
+    Otherwise the vegetation-weighted mean over all tiles decides.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    weights = np.maximum(np.asarray(weights, dtype=np.float64), 1e-6)
+    mean = (probabilities * weights[:, None]).sum(axis=0) / weights.sum()
+    diseases = [i for i, name in enumerate(classes) if name != healthy]
+    affected = disease_probability(probabilities, classes, healthy) >= threshold
+
+    counts = {classes[i]: 0 for i in diseases}
+    if affected.any() and diseases:
+        tile_disease = np.asarray(diseases)[probabilities[:, diseases].argmax(axis=1)]
+        for i in tile_disease[affected]:
+            counts[classes[i]] += 1
+        mass = (probabilities[affected][:, diseases] * weights[affected, None]).sum(axis=0)
+        index = diseases[int(np.argmax(mass))]
+        confidence = float(np.average(probabilities[affected, index], weights=weights[affected]))
+    else:
+        index = int(np.argmax(mean))
+        confidence = float(mean[index])
+    return {
+        'prediction': classes[index],
+        'confidence': confidence,
+        'all_predictions': {name: float(mean[i]) for i, name in enumerate(classes)},
+        'affected_tiles': counts,
+    }
+
+
+def disease_probability(probabilities, classes, healthy='healthy'):
+    """Per-tile probability of any disease (1 - healthy), the value shown in the heatmap"""
+    probabilities = np.asarray(probabilities)
+    if healthy in classes:
+        return 1.0 - probabilities[:, classes.index(healthy)]
+    return probabilities.max(axis=1)
+
+
+def render_heatmap(image, result, alpha=0.45):
+    """Draw the tile heatmap of a predict_tiled result on a BGR image of the original size"""
+    canvas = image.copy()
+    heat = np.full(image.shape[:2], -1.0, dtype=np.float32)
+    for tile in result['tiles']['items']:
+        if tile.get('disease_probability') is None:
+            continue
+        x, y, w, h = tile['box']
+        region = heat[y:y + h, x:x + w]
+        np.maximum(region, tile['disease_probability'], out=region)
+
+    covered = heat >= 0
+    colors = cv2.applyColorMap((np.clip(heat, 0, 1) * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    blended = cv2.addWeighted(image, 1.0 - alpha, colors, alpha, 0)
+    canvas[covered] = blended[covered]
+
+    thickness = max(1, round(max(image.shape[:2]) / 400))
+    for tile in result['tiles']['items']:
+        if tile.get('disease_probability') is not None and tile['disease_probability'] >= result['tiles']['threshold']:
+            x, y, w, h = tile['box']
+            cv2.rectangle(canvas, (x, y), (x + w - 1, y + h - 1), (0, 0, 255), thickness)
+            cv2.putText(canvas, f"{tile['disease_probability']:.2f}", (x + 4 * thickness, y + 12 * thickness),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4 * thickness, (0, 0, 255), thickness)
+    return canvas
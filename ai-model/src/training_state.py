@@ -0,0 +1,217 @@
+import os
+import json
+import random
+import shutil
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback, History
+
+# Callback attributes that carry state between epochs (EarlyStopping,
+# ReduceLROnPlateau, ModelCheckpoint)
+CALLBACK_STATE_ATTRS = ('wait', 'best', 'best_epoch', 'stopped_epoch', 'cooldown_counter')
+
+
+def _to_json(value):
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    return value
+
+
+class TrainingCheckpoint(Callback):
+    """Checkpoint the full training state so an interrupted fit can resume
+
+    Every `every_epochs` epochs this writes the model and optimizer
+    variables (including the learning rate and Adam slots), the global TF
+    RNG and the input state variables (the seed generators of the tf.data
+    augmentation layers) through tf.train.Checkpoint, plus a state.json
+    with the next epoch, the history so far, the state of the other
+    callbacks, the NumPy/Python RNG state and the input position (batches
+    seen by an ImageDataGenerator iterator). tf.data shuffle orders are
+    derived from the epoch number (start_epoch), not stored.
+
+    Resume is epoch-granular and not bit-exact: the input pipeline
+    prefetches, so at the checkpoint the augmentation RNGs are already a
+    few batches into the next epoch. A resumed run gets the same shuffle
+    order and fresh augmentations, never a replay of earlier epochs.
+
+    Must be the last callback, so it saves after the others have updated
+    and restores after their on_train_begin has reset them. State is read
+    from checkpoint_dir and written to save_dir (the same unless a
+    distributed worker writes its own copy).
+    """
+
+    def __init__(self, checkpoint_dir, every_epochs=1, save_dir=None):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.save_dir = save_dir or checkpoint_dir
+        self.every_epochs = max(1, every_epochs)
+        self.tracked_callbacks = []
+        self.data = None
+        self.state_path = os.path.join(checkpoint_dir, 'state.json')
+        self.weights_path = os.path.join(checkpoint_dir, 'best_weights.npz')
+        self.pending_state = None
+        self.history = {}
+        self.manager = None
+        self.input_state = []
+
+    # ------------------------------------------------------------------
+    # State file
+    # ------------------------------------------------------------------
+
+    def load_state(self):
+        """state.json of the last checkpoint, None when there is none"""
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def clear(self):
+        """Remove the checkpoint to start a fresh run"""
+        shutil.rmtree(self.save_dir, ignore_errors=True)
+
+    def _write_state(self, state):
+        os.makedirs(self.save_dir, exist_ok=True)
+        state_path = os.path.join(self.save_dir, 'state.json')
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _checkpoint(self):
+        if self.manager is None:
+            checkpoint = tf.train.Checkpoint(
+                model=self.model,
+                optimizer=self.model.optimizer,
+                rng=tf.random.get_global_generator(),
+                input_state=[getattr(variable, 'value', variable) for variable in self.input_state]
+            )
+            self.manager = tf.train.CheckpointManager(checkpoint, self.save_dir, max_to_keep=2)
+        return self.manager
+
+    # ------------------------------------------------------------------
+    # Resume
+    # ------------------------------------------------------------------
+
+    def attach(self, model, data, tracked_callbacks, input_state=()):
+        """Bind the compiled model, training data, stateful callbacks and input state variables
+
+        Restores the model, optimizer and input state variables of an
+        unfinished run and returns the epoch to pass to fit as initial_epoch
+        (0 for a fresh run). Callback and RNG state is applied in
+        on_train_begin.
+        """
+        self.set_model(model)
+        self.data = data
+        self.tracked_callbacks = list(tracked_callbacks)
+        self.input_state = list(input_state)
+        return self.restore()
+
+    def restore(self):
+        """Restore model and optimizer variables, returns the epoch to resume at"""
+        state = self.load_state()
+        if state is None or state.get('completed'):
+            return 0
+
+        # Optimizer slots must exist before their values can be restored
+        optimizer = self.model.optimizer
+        if hasattr(optimizer, 'build') and not getattr(optimizer, 'built', True):
+            optimizer.build(self.model.trainable_variables)
+
+        manager = self._checkpoint()
+        manager.checkpoint.restore(tf.train.latest_checkpoint(self.checkpoint_dir)).expect_partial()
+
+        self.pending_state = state
+        self.history = state.get('history', {})
+        print(f"Resuming from {self.checkpoint_dir} at epoch {state['epoch']} "
+              f"(learning rate {state.get('learning_rate')})")
+        return state['epoch']
+
+    def completed_history(self):
+        """History of a phase that already finished, None otherwise"""
+        state = self.load_state()
+        if state is None or not state.get('completed'):
+            return None
+        history = History()
+        history.history = state.get('history', {})
+        return history
+
+    def set_model(self, model):
+        super().set_model(model)
+        self.manager = None
+
+    def on_train_begin(self, logs=None):
+        state = self.pending_state
+        if state is None:
+            return
+
+        for callback, saved in zip(self.tracked_callbacks, state.get('callbacks', [])):
+            for name, value in saved.items():
+                setattr(callback, name, value)
+            if hasattr(callback, 'best_weights') and os.path.exists(self.weights_path):
+                data = np.load(self.weights_path)
+                callback.best_weights = [data[f"w{i}"] for i in range(len(data.files))]
+
+        rng = state.get('rng', {})
+        if 'numpy' in rng:
+            name, keys, pos, has_gauss, cached = rng['numpy']
+            np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached))
+        if 'python' in rng:
+            version, internal, gauss = rng['python']
+            random.setstate((version, tuple(internal), gauss))
+
+        position = state.get('input', {})
+        if 'total_batches_seen' in position and hasattr(self.data, 'total_batches_seen'):
+            self.data.total_batches_seen = position['total_batches_seen']
+        self.pending_state = None
+
+    # ------------------------------------------------------------------
+    # Save
+    # ------------------------------------------------------------------
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(_to_json(value))
+
+        if (epoch + 1) % self.every_epochs == 0:
+            self.save(epoch + 1)
+
+    def on_train_end(self, logs=None):
+        state = self.load_state() or {}
+        state.update({'completed': True, 'history': self.history})
+        self._write_state(state)
+
+    def save(self, next_epoch):
+        """Write the checkpoint for resuming at next_epoch"""
+        self._checkpoint().save(checkpoint_number=next_epoch)
+
+        callbacks_state = []
+        for callback in self.tracked_callbacks:
+            callbacks_state.append({
+                name: _to_json(getattr(callback, name))
+                for name in CALLBACK_STATE_ATTRS
+                if isinstance(_to_json(getattr(callback, name, None)), (int, float))
+            })
+            best_weights = getattr(callback, 'best_weights', None)
+            if best_weights is not None:
+                np.savez(os.path.join(self.save_dir, 'best_weights.npz'),
+                         **{f"w{i}": w for i, w in enumerate(best_weights)})
+
+        numpy_state = np.random.get_state()
+        python_state = random.getstate()
+        position = {}
+        if hasattr(self.data, 'total_batches_seen'):
+            position['total_batches_seen'] = int(self.data.total_batches_seen)
+
+        self._write_state({
+            'epoch': next_epoch,
+            'completed': False,
+            'learning_rate': float(np.array(self.model.optimizer.learning_rate)),
+            'history': self.history,
+            'callbacks': callbacks_state,
+            'rng': {
+                'numpy': [numpy_state[0], numpy_state[1].tolist(), int(numpy_state[2]),
+                          int(numpy_state[3]), float(numpy_state[4])],
+                'python': [python_state[0], list(python_state[1]), python_state[2]],
+            },
+            'input': position,
+        })
@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+import numpy as np
+import tensorflow as tf
+
+# Named view sets for TTA_VIEWS / the tta argument of ChiliDiseaseModel.predict
+TTA_PRESETS = {
+    'flips': ['identity', 'hflip', 'vflip'],
+    'five_crop': ['crop_center', 'crop_tl', 'crop_tr', 'crop_bl', 'crop_br'],
+    'standard': ['identity', 'hflip', 'vflip', 'rot15', 'rot-15', 'crop_center'],
+    'full': ['identity', 'hflip', 'vflip', 'rot90', 'rot180', 'rot270', 'rot15', 'rot-15',
+             'crop_center', 'crop_tl', 'crop_tr', 'crop_bl', 'crop_br'],
+}
+
+# Crop views: anchor of the crop window as (x, y) fractions of the free margin
+CROP_ANCHORS = {
+    'crop_center': (0.5, 0.5),
+    'crop_tl': (0.0, 0.0),
+    'crop_tr': (1.0, 0.0),
+    'crop_bl': (0.0, 1.0),
+    'crop_br': (1.0, 1.0),
+}
+
+AGGREGATIONS = ('mean', 'geometric')
+
+
+def parse_views(spec):
+    """'identity,hflip,rot15' or a preset name (or a list of either) -> list of view names
+
+    Empty, 'none', 'false' or '0' turns TTA off. 'true' / '1' means the
+    standard preset.
+    """
+    if spec is None or spec is False:
+        return []
+    if spec is True:
+        spec = 'standard'
+    names = spec if isinstance(spec, (list, tuple)) else re.split(r'[,\s]+', str(spec).strip())
+    views = []
+    for name in filter(None, (n.strip().lower() for n in names)):
+        if name in ('none', 'false', '0', 'off'):
+            continue
+        if name in ('true', '1', 'on'):
+            name = 'standard'
+        expanded = TTA_PRESETS.get(name, [name])
+        for view in expanded:
+            view_matrix(view, 224)  # Raises on unknown views
+            if view not in views:
+                views.append(view)
+    return views
+
+
+def view_matrix(view, size, crop_fraction=0.875):
+    """3x3 matrix mapping output pixel (x, y, 1) to the input pixel it samples"""
+    last = size - 1.0
+    center = last / 2.0
+    if view == 'identity':
+        return np.eye(3)
+    if view == 'hflip':
+        return np.array([[-1.0, 0.0, last], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    if view == 'vflip':
+        return np.array([[1.0, 0.0, 0.0], [0.0, -1.0, last], [0.0, 0.0, 1.0]])
+    if view in CROP_ANCHORS:
+        anchor_x, anchor_y = CROP_ANCHORS[view]
+        margin = last * (1.0 - crop_fraction)
+        return np.array([[crop_fraction, 0.0, anchor_x * margin],
+                         [0.0, crop_fraction, anchor_y * margin],
+                         [0.0, 0.0, 1.0]])
+    match = re.fullmatch(r'rot(-?\d+(?:\.\d+)?)', view)
+    if match:
+        angle = np.deg2rad(float(match.group(1)))
+        cos, sin = np.cos(angle), np.sin(angle)
+        # Multiples of 90 degrees sample exact pixels
+        cos, sin = (round(cos), round(sin)) if float(match.group(1)) % 90 == 0 else (cos, sin)
+        return np.array([[cos, -sin, center - cos * center + sin * center],
+                         [sin, cos, center - sin * center - cos * center],
+                         [0.0, 0.0, 1.0]])
+    raise ValueError(f"Unknown TTA view: {view}, expected identity, hflip, vflip, rot<degrees>, "
+                     f"{', '.join(CROP_ANCHORS)} or a preset ({', '.join(TTA_PRESETS)})")
+
+
+@lru_cache(maxsize=32)
+def view_transforms(views, size, crop_fraction=0.875):
+    """(len(views), 8) float32 transforms for ImageProjectiveTransformV3"""
+    matrices = [view_matrix(view, size, crop_fraction) for view in views]
+    return tf.constant([m.flatten()[:8] for m in matrices], dtype=tf.float32)
+
+
+def make_views(image, views, crop_fraction=0.875):
+    """All views of one (1, size, size, 3) image as a (len(views), size, size, 3) batch
+
+    Every view (flip, rotation, crop) is an affine transform, so the whole
+    batch comes out of a single projective-transform op.
+    """
+    size = int(image.shape[1])
+    transforms = view_transforms(tuple(views), size, crop_fraction)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=tf.repeat(tf.cast(image, tf.float32), len(views), axis=0),
+        transforms=transforms,
+        output_shape=tf.constant([size, size], dtype=tf.int32),
+        fill_value=tf.constant(0.0),
+        interpolation='BILINEAR',
+        fill_mode='NEAREST',
+    )
+
+
+def aggregate(probabilities, method='mean'):
+    """Combine per-view class probabilities (views, classes) into one distribution"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if method == 'mean':
+        combined = probabilities.mean(axis=0)
+    elif method == 'geometric':
+        combined = np.exp(np.log(np.clip(probabilities, 1e-7, 1.0)).mean(axis=0))
+    else:
+        raise ValueError(f"Unknown TTA aggregation: {method}, expected one of {AGGREGATIONS}")
+    return combined / combined.sum()
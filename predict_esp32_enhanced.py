@@ -28,7 +28,8 @@ except ImportError:
         from model import ChiliDiseaseModel
         from disease_solutions import DiseaseSolutionProvider
 
-def predict_image(image_path, model_path=None, include_solution=True, verbose=False):
+def predict_image(image_path, model_path=None, include_solution=True, verbose=False, tta=None, tiled=False,
+                  tile_size=None, quality=None):
     """
     Predict disease from image path
     
@@ -37,6 +38,10 @@ def predict_image(image_path, model_path=None, include_solution=True, verbose=Fa
         model_path (str): Path to the trained model
         include_solution (bool): Whether to include treatment solutions
         verbose (bool): Whether to print detailed information
+        tta (str): Test-time augmentation views or preset (None: TTA_VIEWS)
+        tiled (bool): Classify overlapping tiles of a whole-plant photo (adds a tile heatmap)
+        tile_size (int): Tile size in image pixels for tiled mode (None: TILE_SIZE)
+        quality (str): Quality gate mode reject, flag or off (None: QUALITY_GATE)
     
     Returns:
         dict: Prediction results
@@ -78,7 +83,14 @@ def predict_image(image_path, model_path=None, include_solution=True, verbose=Fa
             raise FileNotFoundError(f"Image not found: {image_path}")
         
         # Predict
-        prediction = model.predict(image_path)
+        if tiled:
+            prediction = model.predict_tiled(image_path, tile_size=tile_size)
+        else:
+            prediction = model.predict(image_path, tta=tta, quality=quality)
+        
+        if prediction.get('rejected'):
+            prediction['error'] = f"Image rejected by quality check: {', '.join(prediction['quality']['reasons'])}"
+            return prediction
         
         # Add solution if requested and disease detected
         if include_solution and prediction['prediction'] != 'healthy':
@@ -108,6 +120,16 @@ def main():
     parser.add_argument('--no-solution', action='store_true', help='Don\'t include treatment solutions')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
     parser.add_argument('--output', '-o', help='Output file for results (JSON)')
+    parser.add_argument('--tta', nargs='?', const='standard',
+                        help='Test-time augmentation: views (identity,hflip,vflip,rot<deg>,crop_*) '
+                             'or a preset (flips, five_crop, standard, full); --tta alone uses standard')
+    parser.add_argument('--tiled', action='store_true',
+                        help='Whole-plant / bed photo: classify overlapping tiles and report a disease heatmap')
+    parser.add_argument('--tile-size', type=int, help='Tile size in image pixels for --tiled (default: TILE_SIZE)')
+    parser.add_argument('--heatmap', help='Save the tile heatmap drawn on the photo to this file (with --tiled)')
+    parser.add_argument('--quality', choices=['reject', 'flag', 'off'],
+                        help='Blur / exposure / foliage check before inference: reject unusable images, '
+                             'flag them or skip the check (default: QUALITY_GATE)')
     
     args = parser.parse_args()
     
@@ -116,9 +138,18 @@ def main():
         image_path=args.image_path,
         model_path=args.model,
         include_solution=not args.no_solution,
-        verbose=args.verbose
+        verbose=args.verbose,
+        tta=args.tta,
+        tiled=args.tiled or bool(args.heatmap),
+        tile_size=args.tile_size,
+        quality=args.quality
     )
     
+    if args.heatmap and 'tiles' in result:
+        import cv2
+        from tiling import render_heatmap
+        cv2.imwrite(args.heatmap, render_heatmap(cv2.imread(args.image_path), result))
+    
     # Output results
     if args.verbose:
         print("\n" + "="*50)
@@ -126,6 +157,19 @@ def main():
         print("="*50)
         print(f"Disease: {result.get('prediction', 'Unknown').replace('_', ' ').title()}")
         print(f"Confidence: {result.get('confidence', 0):.2f}")
+        if 'tta' in result:
+            print(f"TTA: {len(result['tta']['views'])} views, {result['tta']['agreement']:.0%} agree")
+        if 'quality' in result and result['quality']['reasons']:
+            print(f"Quality: {', '.join(result['quality']['reasons'])} ({result['quality']['action']})")
+        if 'tiles' in result:
+            tiles = result['tiles']
+            print(f"Tiles: {tiles['classified']} classified, {tiles['skipped']} background "
+                  f"({tiles['rows']}x{tiles['cols']} of {tiles['tile_size']}px)")
+            print("Disease heatmap (1 - healthy, . = background):")
+            for row in tiles['heatmap']:
+                print("  " + " ".join("  . " if value is None else f"{value:.2f}" for value in row))
+            if args.heatmap:
+                print(f"Heatmap saved to: {args.heatmap}")
         
         if 'solution' in result:
             print(f"\nTreatment Urgency: {result['solution']['urgency']}")